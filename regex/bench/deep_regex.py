@@ -0,0 +1,92 @@
+# nfa_from_regex on deep regexes, against the recursive construction it
+# replaced. The recursive one needs two Python frames per level, so it is
+# run under a raised recursion limit and reported as failing past it.
+#
+#   python -m regex.bench.deep_regex
+
+import random
+import sys
+import time
+
+from regex import regex, regex_nfa_convert
+from regex.nfa import NFA, EdgeType
+from regex.regex import RegexASCII, RegexOr, RegexSequence, StarRegex
+
+RECURSION_LIMIT = 20000
+DEPTHS = [100, 1000, 5000, 100000]
+
+
+def _recursive(r, nfa):
+    if isinstance(r, RegexASCII):
+        start = nfa.mk_node()
+        end = nfa.mk_node()
+        nfa.connect(start, EdgeType.mk_ascii_edge(r.char), end)
+        return (start, end)
+    elif isinstance(r, RegexOr):
+        (s1, e1) = _recursive(r.r1, nfa)
+        (s2, e2) = _recursive(r.r2, nfa)
+        sor = nfa.mk_node()
+        eor = nfa.mk_node()
+        nfa.connect(sor, EdgeType.mk_epsilon_edge(), s1)
+        nfa.connect(sor, EdgeType.mk_epsilon_edge(), s2)
+        nfa.connect(e1, EdgeType.mk_epsilon_edge(), eor)
+        nfa.connect(e2, EdgeType.mk_epsilon_edge(), eor)
+        return (sor, eor)
+    elif isinstance(r, RegexSequence):
+        (s1, e1) = _recursive(r.r1, nfa)
+        (s2, e2) = _recursive(r.r2, nfa)
+        nfa.connect(e1, EdgeType.mk_epsilon_edge(), s2)
+        return (s1, e2)
+    else:
+        (s, e) = _recursive(r.r, nfa)
+        nodestar = nfa.mk_node()
+        nfa.connect(nodestar, EdgeType.mk_epsilon_edge(), s)
+        nfa.connect(e, EdgeType.mk_epsilon_edge(), nodestar)
+        return (nodestar, nodestar)
+
+def recursive_nfa_from_regex(r):
+    nfa = NFA()
+    (nfa.start_node, nfa.end_node) = _recursive(r, nfa)
+    return nfa.compact()
+
+
+# a left-deep chain of `depth` literals, like the chunks regex_mk_random
+# makes, with a star every 50 literals
+def mk_deep(depth, rng):
+    chars = "abcdefghijklmnopqrstuvwxyz"
+    r = RegexASCII(rng.choice(chars))
+    for i in range(1, depth):
+        r = RegexSequence(r, RegexASCII(rng.choice(chars)))
+        if i % 50 == 0:
+            r = StarRegex(r)
+    return r
+
+
+def timed(f, *args):
+    t = time.perf_counter()
+    try:
+        f(*args)
+    except RecursionError:
+        return None
+    return time.perf_counter() - t
+
+
+def run():
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    rng = random.Random(0)
+    for depth in DEPTHS:
+        r = mk_deep(depth, rng)
+        t_iter = timed(regex_nfa_convert.nfa_from_regex, r, None)
+        t_rec = timed(recursive_nfa_from_regex, r)
+        t_rest = timed(lambda: (str(r), regex.regex_prune(r), r.generate_text(1, rng)))
+
+        if t_rec is None:
+            rec = "RecursionError"
+        else:
+            rec = "%.1f ms (%.1fx)" % (1e3 * t_rec, t_rec / t_iter)
+        print("depth %s: iterative %.1f ms, recursive %s; str + prune + generate_text %.1f ms" %
+              (depth, 1e3 * t_iter, rec, 1e3 * t_rest))
+
+
+if __name__ == "__main__":
+    run()
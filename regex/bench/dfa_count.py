@@ -0,0 +1,46 @@
+# DFACounter on corpus regexes: time to build the tables, their size, and
+# uniform samples per second (with int64 tables and with Python int ones).
+#
+#   python -m regex.bench.dfa_count [num_strings]
+
+import random
+import sys
+import time
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.dfa_count import DFACounter
+
+NUM_REGEXES = 20
+NUM_STRINGS = 200000
+MAX_LENS = [50, 200]
+
+
+def run(num_strings):
+    rng = random.Random(0)
+    nfas = [regex_nfa_convert.nfa_from_regex(DEFAULT_MK_REGEX(rng=rng))
+            for _ in range(NUM_REGEXES)]
+
+    for max_len in MAX_LENS:
+        t = time.perf_counter()
+        counters = [DFACounter(n, max_len) for n in nfas]
+        t_build = time.perf_counter() - t
+        # regexes whose shortest string is longer than max_len have none
+        counters = [c for c in counters if c.total > 0]
+
+        per_regex = num_strings // NUM_REGEXES
+        t = time.perf_counter()
+        for (i, c) in enumerate(counters):
+            c.sample_codes(per_regex, i)
+        t_sample = time.perf_counter() - t
+
+        big = sum(c._count.dtype == object for c in counters)
+        print("max_len %s: build %.1f ms / regex, table %.0f cells mean, %s of %s with "
+              "Python int counts; %.0f uniform strings / s" %
+              (max_len, 1e3 * t_build / NUM_REGEXES,
+               sum(c._count.size for c in counters) / float(len(counters)), big, len(counters),
+               per_regex * len(counters) / t_sample))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_STRINGS)
@@ -0,0 +1,91 @@
+# ShiftAndMatcher against LazyDFA and NFAMatcher, on small random regexes
+# on the corpus regexes that fit in a word, and on one whose DFA is
+# exponential: time to build a matcher, and strings matched per second.
+# Also how many corpus regexes fit.
+#
+#   python -m regex.bench.glushkov [num_strings]
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from regex import regex, regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.glushkov import MAX_POSITIONS, ShiftAndMatcher, _num_positions
+from regex.nfa_dfa import LazyDFA
+from regex.nfa_match import NFAMatcher, encode_strings
+from regex.nfa_negative import mutate_codes
+from regex.nfa_sample import NFASampler, decode_strings
+from regex.regex_parse import parse_regex
+
+NUM_REGEXES = 20
+NUM_STRINGS = 100000
+MAX_LEN = 100
+BLOWUP_K = 16
+
+
+def run(num_strings):
+    rng = random.Random(0)
+    corpus = [DEFAULT_MK_REGEX(rng=rng) for _ in range(1000)]
+    print("corpus regexes with at most %d positions: %.1f%%" %
+          (MAX_POSITIONS, 100 * np.mean([_num_positions(r) <= MAX_POSITIONS for r in corpus])))
+
+    random.seed(0)
+    small = [regex.regex_mk_random(2, 1, 1, 1, 3) for _ in range(NUM_REGEXES)]
+    fitting = [r for r in corpus if _num_positions(r) <= MAX_POSITIONS][:NUM_REGEXES]
+    for (what, regexes) in (("small random regexes", small),
+                            ("corpus regexes that fit", fitting)):
+        print(what)
+        compare(regexes, num_strings)
+
+    # (a|b)*a(a|b){k}: linear in positions, 2^k DFA states
+    print("(a|b)*a(a|b){%d} on random strings over ab" % (BLOWUP_K, ))
+    r = parse_regex("<(a|b)>* a" + "(a|b)" * BLOWUP_K)
+    strings = ["".join(random.choice("ab") for _ in range(MAX_LEN)) for _ in range(num_strings)]
+    (codes, lengths) = encode_strings(strings)
+    results = []
+    for (name, m) in (("shift-and", ShiftAndMatcher(r)),
+                      ("lazy dfa", LazyDFA(regex_nfa_convert.nfa_from_regex(r)))):
+        t = time.perf_counter()
+        results.append(m.match_codes(codes, lengths))
+        print("  %-12s %.0f strings / s" % (name, len(strings) / (time.perf_counter() - t)))
+    assert (results[0] == results[1]).all()
+
+
+def compare(regexes, num_strings):
+    rng = np.random.default_rng(0)
+    totals = {}
+    for r in regexes:
+        n = regex_nfa_convert.nfa_from_regex(r)
+        # half matching strings, half one edit away
+        (codes, lengths) = NFASampler(n, MAX_LEN).sample_codes(num_strings // len(regexes), rng)
+        half = len(lengths) // 2
+        (mutated, mutated_lengths) = mutate_codes(codes[half:], lengths[half:],
+                                                  np.unique(codes[codes > 0]), rng)
+        strings = decode_strings(codes[:half], lengths[:half]) + \
+            decode_strings(mutated, mutated_lengths)
+        (codes, lengths) = encode_strings(strings)
+
+        results = []
+        for (name, mk) in (("shift-and", lambda: ShiftAndMatcher(r)),
+                           ("lazy dfa", lambda: LazyDFA(regex_nfa_convert.nfa_from_regex(r))),
+                           ("nfa matcher", lambda: NFAMatcher(regex_nfa_convert.nfa_from_regex(r)))):
+            t = time.perf_counter()
+            m = mk()
+            t_build = time.perf_counter() - t
+            t = time.perf_counter()
+            results.append(m.match_codes(codes, lengths))
+            t_match = time.perf_counter() - t
+            (b, s, k) = totals.get(name, (0, 0, 0))
+            totals[name] = (b + t_build, s + t_match, k + len(lengths))
+        assert all((x == results[0]).all() for x in results)
+
+    for (name, (t_build, t_match, count)) in totals.items():
+        print("  %-12s %.2f ms to build, %.0f strings / s" %
+              (name, 1e3 * t_build / len(regexes), count / t_match))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_STRINGS)
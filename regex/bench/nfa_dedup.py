@@ -0,0 +1,61 @@
+# Fingerprints per second on corpus NFAs, the duplicates found among them
+# and among renumbered copies, and fingerprints per second into a
+# FingerprintIndex grown from empty to num_keys.
+#
+#   python -m regex.bench.nfa_dedup [num_keys]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa_dedup import FingerprintIndex, nfa_fingerprints
+from regex.nfa_order import nfa_relabel
+
+NUM_NFAS = 20000
+NUM_KEYS = 10 ** 7
+CHUNK = 100000
+
+
+def fingerprint(name, nfas):
+    t = time.perf_counter()
+    fps = np.concatenate([nfa_fingerprints(nfas[lo:lo + 1024])
+                          for lo in range(0, len(nfas), 1024)])
+    t_fp = time.perf_counter() - t
+    print("%s: %.0f fingerprints / s, %.1f%% of %d NFAs are duplicates" %
+          (name, len(nfas) / t_fp, 100 * (1 - len(np.unique(fps)) / len(fps)), len(nfas)))
+
+
+def run(num_keys):
+    rng = random.Random(0)
+    nfas = [regex_nfa_convert.nfa_from_regex(DEFAULT_MK_REGEX(rng=rng))
+            for _ in range(NUM_NFAS)]
+    fingerprint("corpus", nfas)
+    half = nfas[:NUM_NFAS // 2]
+    fingerprint("half corpus, half renumbered copies",
+                half + [nfa_relabel(n, "rcm") for n in half])
+
+    keys = np.random.default_rng(0).integers(0, 1 << 63, size=num_keys, dtype=np.uint64)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "bench.fpi")
+        t = time.perf_counter()
+        with FingerprintIndex(path) as index:
+            for lo in range(0, num_keys, CHUNK):
+                index.add_many(keys[lo:lo + CHUNK])
+            t_add = time.perf_counter() - t
+            t = time.perf_counter()
+            for lo in range(0, num_keys, CHUNK):
+                index.add_many(keys[lo:lo + CHUNK])
+            t_again = time.perf_counter() - t
+            size = os.path.getsize(path)
+    print("index: %d fingerprints, %.0f MB on disk; %.0f new / s, %.0f seen / s" %
+          (num_keys, size / 1e6, num_keys / t_add, num_keys / t_again))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_KEYS)
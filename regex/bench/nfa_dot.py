@@ -0,0 +1,47 @@
+# DOT text written per second: one big NFA (the union of many corpus NFAs)
+# to a file, and many corpus NFAs to a file each, in this process and on
+# worker processes.
+#
+#   python -m regex.bench.nfa_dot [num_nfas]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa_dot import write_dot, write_dots
+from regex.nfa_multi import nfa_union
+
+NUM_NFAS = 1000
+NUM_WORKERS = 2
+
+
+def run(num_nfas):
+    rng = random.Random(0)
+    nfas = [regex_nfa_convert.nfa_from_regex(DEFAULT_MK_REGEX(rng=rng)) for _ in range(num_nfas)]
+    big = nfa_union(nfas)[0]
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "big.dot")
+        t = time.perf_counter()
+        write_dot(big, path)
+        t_big = time.perf_counter() - t
+        print("one NFA, %d nodes, %d edges: %.2f s, %.0f edges / s, %.1f MB / s" %
+              (big.numnodes, big.numedges, t_big, big.numedges / t_big,
+               os.path.getsize(path) / t_big / 1e6))
+
+        for num_workers in (None, NUM_WORKERS):
+            paths = [os.path.join(d, "%d.dot" % (i, )) for i in range(num_nfas)]
+            t = time.perf_counter()
+            write_dots(nfas, paths, num_workers)
+            t_many = time.perf_counter() - t
+            print("%d NFAs, %s: %.2f s, %.0f NFAs / s" %
+                  (num_nfas, "in process" if num_workers is None else
+                   "%d workers" % (num_workers, ), t_many, num_nfas / t_many))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_NFAS)
@@ -0,0 +1,60 @@
+# Size and speed of nfa_io files against pickling a list of NFAs, for
+# corpus NFAs.
+#
+#   python -m regex.bench.nfa_io [num_nfas]
+
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa_io import NFAFile, write_nfas
+
+NUM_NFAS = 20000
+
+
+def timed(f):
+    t = time.perf_counter()
+    result = f()
+    return (result, time.perf_counter() - t)
+
+
+def run(num_nfas):
+    rng = random.Random(0)
+    nfas = [regex_nfa_convert.nfa_from_regex(DEFAULT_MK_REGEX(rng=rng))
+            for _ in range(num_nfas)]
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "nfas.bin")
+        (_, t_write) = timed(lambda: write_nfas(path, nfas))
+        size = os.path.getsize(path)
+        (_, t_load) = timed(lambda: sum(n.numedges for n in NFAFile(path)))
+        f = NFAFile(path)
+        order = list(range(num_nfas))
+        rng.shuffle(order)
+        (_, t_random) = timed(lambda: [f[i] for i in order])
+
+        pickled_path = os.path.join(d, "nfas.pickle")
+        def dump():
+            with open(pickled_path, "wb") as out:
+                pickle.dump(nfas, out, protocol=pickle.HIGHEST_PROTOCOL)
+        def load():
+            with open(pickled_path, "rb") as inp:
+                return pickle.load(inp)
+        (_, t_pickle_write) = timed(dump)
+        pickle_size = os.path.getsize(pickled_path)
+        (_, t_pickle_load) = timed(load)
+
+    print("nfa_io: %.0f bytes / NFA; write %.0f NFAs / s, load all %.0f NFAs / s, "
+          "random access %.0f NFAs / s" %
+          (size / num_nfas, num_nfas / t_write, num_nfas / t_load, num_nfas / t_random))
+    print("pickle: %.0f bytes / NFA; write %.0f NFAs / s, load all %.0f NFAs / s" %
+          (pickle_size / num_nfas, num_nfas / t_pickle_write, num_nfas / t_pickle_load))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_NFAS)
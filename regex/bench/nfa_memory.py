@@ -0,0 +1,47 @@
+# Memory and construction throughput of nfa_from_regex over a corpus.
+#
+#   python -m regex.bench.nfa_memory [num_nfas]
+
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from regex import regex, regex_nfa_convert
+
+NUM_NFAS = 100000
+NUM_DISTINCT_REGEXES = 1000
+
+def mk_regexes(n):
+    random.seed(0)
+    distinct = [regex.regex_mk_random(2, 1, 1, 4, 8)
+                for _ in range(NUM_DISTINCT_REGEXES)]
+    return [distinct[i % len(distinct)] for i in range(n)]
+
+
+def run(num_nfas):
+    rs = mk_regexes(num_nfas)
+
+    gc.collect()
+    t = time.perf_counter()
+    nfas = [regex_nfa_convert.nfa_from_regex(r) for r in rs]
+    dt = time.perf_counter() - t
+    num_edges = sum(len(n.connections) for n in nfas[:NUM_DISTINCT_REGEXES])
+
+    del nfas
+    gc.collect()
+    tracemalloc.start()
+    nfas = [regex_nfa_convert.nfa_from_regex(r) for r in rs]
+    (mem, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("nfas: %s" % num_nfas)
+    print("edges / nfa: %.1f" % (num_edges / min(num_nfas, NUM_DISTINCT_REGEXES)))
+    print("resident: %.1f MB (%.0f bytes / nfa)" % (mem / 1e6, mem / num_nfas))
+    print("throughput: %.0f nfas / s" % (num_nfas / dt))
+    return nfas
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_NFAS)
@@ -0,0 +1,63 @@
+# MultiPatternMatcher on 10, 1k and 10k corpus regexes: time to build, time
+# for the first batch (which determinizes the states it needs), and strings
+# per second after, against one LazyDFA per pattern.
+#
+#   python -m regex.bench.nfa_multi [num_strings]
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa_dfa import LazyDFA
+from regex.nfa_multi import MultiPatternMatcher
+from regex.nfa_sample import NFASampler
+
+NUM_PATTERNS = [10, 1000, 10000]
+NUM_STRINGS = 10000
+MAX_LEN = 60
+# per pattern matchers timed on this many patterns, and scaled up
+NUM_EACH = 100
+
+
+def run(num_strings):
+    rng = random.Random(0)
+    for num_patterns in NUM_PATTERNS:
+        regexes = [DEFAULT_MK_REGEX(rng=rng) for _ in range(num_patterns)]
+
+        t = time.perf_counter()
+        m = MultiPatternMatcher(regexes)
+        t_build = time.perf_counter() - t
+
+        # strings of random patterns, then one edit away from them
+        picks = np.random.default_rng(0).integers(0, num_patterns, size=num_strings // 10)
+        strings = []
+        for i in picks.tolist():
+            strings += NFASampler(m._nfas[i], MAX_LEN).sample(10, i)
+        strings = strings[:num_strings // 2] + [s[1:] + "a" for s in strings[num_strings // 2:]]
+
+        t = time.perf_counter()
+        m.match_ids(strings)
+        t_first = time.perf_counter() - t
+        t = time.perf_counter()
+        ids = m.match_ids(strings)
+        t_match = time.perf_counter() - t
+
+        each = [LazyDFA(n) for n in m._nfas[:NUM_EACH]]
+        for d in each:
+            d.match_batch(strings)
+        t = time.perf_counter()
+        for d in each:
+            d.match_batch(strings)
+        t_each = (time.perf_counter() - t) * num_patterns / len(each)
+
+        print("%5d patterns: %.2f s to build, %.2f s first batch, %d states, "
+              "%.0f strings / s (%.1f ids each); one LazyDFA per pattern %.0f strings / s" %
+              (num_patterns, t_build, t_first, m.num_states, len(strings) / t_match,
+               np.mean([len(x) for x in ids]), len(strings) / t_each))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_STRINGS)
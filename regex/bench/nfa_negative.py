@@ -0,0 +1,45 @@
+# Labelled strings per second from LabelledSampler on corpus regexes, and
+# negatives per second from each source of NegativeSampler.
+#
+#   python -m regex.bench.nfa_negative [num_strings]
+
+import random
+import sys
+import time
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa_negative import LabelledSampler, NegativeSampler
+
+NUM_REGEXES = 10
+NUM_STRINGS = 1000000
+MAX_LEN = 100
+
+
+def rate(samplers, num_strings):
+    per_regex = num_strings // len(samplers)
+    t = time.perf_counter()
+    for (i, s) in enumerate(samplers):
+        s.sample_codes(per_regex, i)
+    return per_regex * len(samplers) / (time.perf_counter() - t)
+
+
+def run(num_strings):
+    rng = random.Random(0)
+    nfas = [regex_nfa_convert.nfa_from_regex(DEFAULT_MK_REGEX(rng=rng))
+            for _ in range(NUM_REGEXES)]
+
+    for (name, fraction) in (("mutate", 1.0), ("walk", 0.0)):
+        samplers = [NegativeSampler(n, MAX_LEN, mutate_fraction=fraction) for n in nfas]
+        print("negatives, %s: %.0f / s" % (name, rate(samplers, num_strings // 4)))
+
+    t = time.perf_counter()
+    samplers = [LabelledSampler(n, MAX_LEN) for n in nfas]
+    t_build = (time.perf_counter() - t) / NUM_REGEXES
+    r = rate(samplers, num_strings)
+    print("labelled, half negative: %.1f ms to build, %.0f / s (%.1fM / minute)" %
+          (1e3 * t_build, r, 60 * r / 1e6))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_STRINGS)
@@ -0,0 +1,45 @@
+# Node counts of corpus NFAs before and after nfa_optimize, the num_nodes
+# they need, and what that does to the size of an adjacency tensor.
+#
+#   python -m regex.bench.nfa_optimize [num_nfas]
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa_optimize import nfa_optimize
+
+NUM_NFAS = 2000
+
+
+def describe(name, nodes, edges):
+    nodes = np.array(nodes)
+    p99 = int(np.percentile(nodes, 99))
+    print("%s: nodes mean %.1f, p99 %s, max %s; edges mean %.1f; "
+          "num_nodes covering 99%%: %s (%s bytes / sample)" %
+          (name, nodes.mean(), p99, nodes.max(), np.mean(edges), p99, p99 * p99))
+    return p99
+
+
+def run(num_nfas):
+    rng = random.Random(0)
+    nfas = [regex_nfa_convert.nfa_from_regex(DEFAULT_MK_REGEX(rng=rng))
+            for _ in range(num_nfas)]
+
+    t = time.perf_counter()
+    optimized = [nfa_optimize(n) for n in nfas]
+    dt = time.perf_counter() - t
+
+    before = describe("thompson ", [n.numnodes for n in nfas], [n.numedges for n in nfas])
+    after = describe("optimized", [n.numnodes for n in optimized],
+                     [n.numedges for n in optimized])
+    print("adjacency tensors %.1fx smaller; nfa_optimize: %.0f NFAs / s" %
+          (before * before / float(after * after), num_nfas / dt))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_NFAS)
@@ -0,0 +1,53 @@
+# Bandwidth of corpus NFAs in construction order and after nfa_relabel, and
+# what a batch of them costs as a dense adjacency tensor, as a banded one,
+# and both again after zlib.
+#
+#   python -m regex.bench.nfa_order [num_nfas]
+
+import random
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa import adj_banded_from_nfas, adj_tensor_from_nfas, nfa_bandwidth
+from regex.nfa_optimize import nfa_optimize
+from regex.nfa_order import nfa_relabel
+
+NUM_NFAS = 1000
+
+
+def describe(name, nfas, order):
+    t = time.perf_counter()
+    if order is not None:
+        nfas = [nfa_relabel(n, order) for n in nfas]
+    dt = time.perf_counter() - t
+
+    num_nodes = max(n.numnodes for n in nfas)
+    bw = np.array([nfa_bandwidth(n) for n in nfas])
+    dense = adj_tensor_from_nfas(nfas, num_nodes)
+    band = adj_banded_from_nfas(nfas, num_nodes, int(bw.max()))
+    print("%s %-5s: bandwidth mean %5.1f, max %3s; dense %8s bytes (zlib %6s), "
+          "banded %8s (zlib %6s)%s" %
+          (name, order or "-", bw.mean(), bw.max(), dense.nbytes,
+           len(zlib.compress(dense.tobytes())), band.nbytes,
+           len(zlib.compress(band.tobytes())),
+           "" if order is None else "; %.0f NFAs / s" % (len(nfas) / dt)))
+
+
+def run(num_nfas):
+    rng = random.Random(0)
+    nfas = [regex_nfa_convert.nfa_from_regex(DEFAULT_MK_REGEX(rng=rng))
+            for _ in range(num_nfas)]
+    optimized = [nfa_optimize(n) for n in nfas]
+
+    for (name, batch) in (("thompson ", nfas), ("optimized", optimized)):
+        for order in (None, "bfs", "rcm"):
+            describe(name, batch, order)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_NFAS)
@@ -0,0 +1,55 @@
+# Strings per second from NFASampler against Regex.generate_text, for
+# corpus regexes, and how long building a sampler takes.
+#
+#   python -m regex.bench.nfa_sample [num_strings]
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa_sample import NFASampler
+
+NUM_REGEXES = 20
+NUM_STRINGS = 1000000
+NUM_GENERATE_TEXT = 20000
+MAX_LEN = 100
+
+
+def run(num_strings):
+    rng = random.Random(0)
+    regexes = [DEFAULT_MK_REGEX(rng=rng) for _ in range(NUM_REGEXES)]
+    nfas = [regex_nfa_convert.nfa_from_regex(r) for r in regexes]
+
+    t = time.perf_counter()
+    samplers = [NFASampler(n, MAX_LEN) for n in nfas]
+    t_build = (time.perf_counter() - t) / NUM_REGEXES
+
+    per_regex = num_strings // NUM_REGEXES
+    t = time.perf_counter()
+    lengths = [s.sample_codes(per_regex, i)[1] for (i, s) in enumerate(samplers)]
+    t_codes = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for (i, s) in enumerate(samplers):
+        s.sample(per_regex, i)
+    t_strings = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for r in regexes:
+        for _ in range(NUM_GENERATE_TEXT // NUM_REGEXES):
+            r.generate_text(2, rng)
+    t_generate = time.perf_counter() - t
+
+    print("NFASampler: %.1f ms to build; %.0f strings / s as codes, %.0f as str "
+          "(mean length %.1f)" %
+          (1e3 * t_build, per_regex * NUM_REGEXES / t_codes,
+           per_regex * NUM_REGEXES / t_strings, np.concatenate(lengths).mean()))
+    print("generate_text: %.0f strings / s" % (NUM_GENERATE_TEXT / t_generate))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_STRINGS)
@@ -0,0 +1,66 @@
+# (NFA, string) pairs per second through run_nfa_tensors, hard and soft,
+# against building a LazyDFA for every pair.
+#
+#   python -m regex.bench.nfa_tensor [num_pairs]
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from regex import regex_nfa_convert
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.nfa import adj_tensor_from_nfas
+from regex.nfa_dfa import LazyDFA
+from regex.nfa_match import NUM_SYMBOLS, encode_strings
+from regex.nfa_sample import NFASampler
+from regex.nfa_tensor import run_nfa_tensors
+
+NUM_PAIRS = 1024
+NUM_NODES = 120
+BATCH_SIZE = 128
+MAX_LEN = 64
+
+
+def run(num_pairs):
+    rng = random.Random(0)
+    nfas = []
+    while len(nfas) < num_pairs:
+        n = regex_nfa_convert.nfa_from_regex(DEFAULT_MK_REGEX(rng=rng))
+        if n.numnodes <= NUM_NODES:
+            nfas.append(n)
+    strings = [NFASampler(n, MAX_LEN).sample(1, i)[0] for (i, n) in enumerate(nfas)]
+    strings = [s if i % 2 else s[1:] for (i, s) in enumerate(strings)]
+
+    adj = adj_tensor_from_nfas(nfas, NUM_NODES)
+    start = np.array([n.start_node.idx for n in nfas])
+    end = np.array([n.end_node.idx for n in nfas])
+    (codes, lengths) = encode_strings(strings)
+
+    t = time.perf_counter()
+    hard = np.concatenate([run_nfa_tensors(adj[lo:lo + BATCH_SIZE], start[lo:lo + BATCH_SIZE],
+                                           end[lo:lo + BATCH_SIZE], codes[lo:lo + BATCH_SIZE],
+                                           lengths[lo:lo + BATCH_SIZE])
+                           for lo in range(0, num_pairs, BATCH_SIZE)])
+    t_hard = time.perf_counter() - t
+
+    t = time.perf_counter()
+    expected = [LazyDFA(n).match(s) for (n, s) in zip(nfas, strings)]
+    t_dfa = time.perf_counter() - t
+    assert list(hard) == expected
+
+    # soft tensors are big, so only one batch
+    soft = np.eye(NUM_SYMBOLS, dtype=np.float32)[adj[:BATCH_SIZE]]
+    t = time.perf_counter()
+    run_nfa_tensors(soft, start[:BATCH_SIZE], end[:BATCH_SIZE], codes[:BATCH_SIZE],
+                    lengths[:BATCH_SIZE])
+    t_soft = time.perf_counter() - t
+
+    print("%d nodes, batches of %d: hard %.0f pairs / s, soft %.0f pairs / s; "
+          "a LazyDFA per pair %.0f pairs / s" %
+          (NUM_NODES, BATCH_SIZE, num_pairs / t_hard, BATCH_SIZE / t_soft, num_pairs / t_dfa))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_PAIRS)
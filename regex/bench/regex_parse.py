@@ -0,0 +1,55 @@
+# Parse throughput on a file of corpus regexes, one per line, and
+# compile_pattern with and without the pattern cache on a stream drawn from
+# a smaller pool of patterns, the way a training set repeats them.
+#
+#   python -m regex.bench.regex_parse [num_patterns]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from regex.corpus import DEFAULT_MK_REGEX
+from regex.regex_parse import PatternCache, compile_pattern, parse_regex
+
+NUM_PATTERNS = 100000
+POOL_SIZE = 2000
+NUM_COMPILES = 20000
+
+
+def parse_file(num_patterns):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "patterns.txt")
+        with open(path, "w") as f:
+            for _ in range(num_patterns):
+                f.write(str(DEFAULT_MK_REGEX(rng=rng)) + "\n")
+        size = os.path.getsize(path)
+
+        t = time.perf_counter()
+        with open(path) as f:
+            for line in f:
+                parse_regex(line[:-1])
+        dt = time.perf_counter() - t
+
+    print("parse %s patterns (%.1f MB): %.1f s, %.0f patterns / s, %.2f MB / s" %
+          (num_patterns, size / 1e6, dt, num_patterns / dt, size / 1e6 / dt))
+
+
+def compile_stream():
+    rng = random.Random(1)
+    pool = [str(DEFAULT_MK_REGEX(rng=rng)) for _ in range(POOL_SIZE)]
+    stream = [rng.choice(pool) for _ in range(NUM_COMPILES)]
+
+    for (name, cache) in (("uncached", None), ("cached", PatternCache())):
+        t = time.perf_counter()
+        for p in stream:
+            compile_pattern(p, cache=cache)
+        dt = time.perf_counter() - t
+        print("compile_pattern %s: %.0f patterns / s" % (name, NUM_COMPILES / dt))
+
+
+if __name__ == "__main__":
+    parse_file(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_PATTERNS)
+    compile_stream()
@@ -0,0 +1,33 @@
+# Samples / second of the random regex generators.
+#
+#   python -m regex.bench.regex_sampler
+
+import random
+import time
+
+from regex import regex
+
+SECONDS_PER_CASE = 2.0
+
+def samples_per_second(f):
+    random.seed(0)
+    t = time.perf_counter()
+    n = 0
+    while time.perf_counter() - t < SECONDS_PER_CASE:
+        f()
+        n += 1
+    return n / (time.perf_counter() - t)
+
+
+def run():
+    for args in [(2, 1, 1), (4, 3, 3)]:
+        rate = samples_per_second(lambda: regex.regex_mk_random(*(args + (4, 8))))
+        print("regex_mk_random%s: %.0f samples / s" % (args, rate))
+
+    for size in [10, 100, 1000]:
+        rate = samples_per_second(lambda: regex.regex_mk_random_sized(size, 4, 8))
+        print("regex_mk_random_sized(%s): %.0f samples / s" % (size, rate))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,248 @@
+# Benchmark suite for the regex -> NFA -> adjacency pipeline: regex
+# generation, compiling, encoding to and decoding from adjacency matrices,
+# pruning and matching, swept over regex size and num_nodes.
+#
+#   python -m regex.bench.suite [-o results.json] [-b baseline.json]
+#                               [--save-baseline] [--quick] [-k filter]
+#
+# Every case records, in the JSON written with -o:
+#
+#   seconds           best of the timed repeats
+#   median_seconds    median of them
+#   per_item_us       seconds per item, items being regexes, NFAs or strings
+#   alloc_peak_bytes  peak of the memory traced by tracemalloc in one run
+#   alloc_blocks      memory blocks still allocated after that run
+#   peak_rss_bytes    peak resident set size of the process after the case;
+#                     cases run in order of size, so this is the high-water
+#                     mark up to and including the case
+#
+# Against a baseline (by default BASELINE, next to this file, when it
+# exists) every case that got slower than `threshold` times its baseline
+# time, or allocates more than `threshold` times the memory, is reported,
+# and the exit status is 1. --save-baseline writes the results as the new
+# baseline. Timings only compare on the same machine; the stored baseline
+# is from the machine of whoever last saved it.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from regex import nfa, regex, regex_nfa_convert
+from regex.nfa_dfa import LazyDFA
+from regex.nfa_match import NFAMatcher
+from regex.nfa_sample import NFASampler
+
+FORMAT_VERSION = 1
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+REGEX_SIZES = [4, 16, 64]
+# (num_ors, num_stars, num_seq) of the regex_mk_random cases
+MK_RANDOM_BUDGETS = [(1, 1, 1), (2, 1, 1), (2, 2, 2)]
+NUM_NODES = [128, 512]
+NUM_REGEXES = 200
+NUM_STRINGS = 2000
+# longest sampled string, on top of 4 symbols per unit of regex size
+STRING_LEN = 16
+REPEATS = 5
+QUICK_REPEATS = 2
+DEFAULT_THRESHOLD = 1.5
+
+
+def mk_regexes(size, seed=0):
+    rng = random.Random(seed)
+    return [regex.regex_mk_random_sized(size, 1, 3, rng=rng) for _ in range(NUM_REGEXES)]
+
+
+# regex_mk_random's regexes grow exponentially with its operator budgets
+def mk_random_regexes(num_ors, num_stars, num_seq, seed=1):
+    rng = random.Random(seed)
+    return [regex.regex_mk_random(num_ors, num_stars, num_seq, 1, 3, rng=rng)
+            for _ in range(NUM_REGEXES)]
+
+
+def mk_nfas(size, num_nodes=None):
+    nfas = [regex_nfa_convert.nfa_from_regex(r, cache=None) for r in mk_regexes(size)]
+    return [n for n in nfas if num_nodes is None or n.numnodes <= num_nodes]
+
+
+# a few NFAs, and strings sampled from all of them
+def mk_match_input(size):
+    nfas = mk_nfas(size)[:10]
+    rng = np.random.default_rng(0)
+    strings = []
+    for n in nfas:
+        strings += NFASampler(n, 4 * size + STRING_LEN).sample(NUM_STRINGS // len(nfas), rng)
+    return (nfas, strings)
+
+
+def match_all(matcher, nfas, strings):
+    for n in nfas:
+        matcher(n).match_batch(strings)
+    return len(nfas) * len(strings)
+
+
+# (name, params, setup, fn): setup() builds the input once, untimed, and
+# fn(input) is timed and returns the number of items it processed.
+def cases():
+    for (ors, stars, seqs) in MK_RANDOM_BUDGETS:
+        yield ("regex_mk_random", {"num_ors": ors, "num_stars": stars, "num_seq": seqs},
+               lambda budget=(ors, stars, seqs): budget,
+               lambda budget: len(mk_random_regexes(*budget)))
+
+    for size in REGEX_SIZES:
+        p = {"regex_size": size}
+        yield ("regex_mk_random_sized", p, lambda size=size: size,
+               lambda size: len(mk_regexes(size, seed=1)))
+        yield ("nfa_from_regex", p, lambda size=size: mk_regexes(size),
+               lambda rs: len([regex_nfa_convert.nfa_from_regex(r, cache=None) for r in rs]))
+        yield ("nfa_prune", p, lambda size=size: mk_nfas(size),
+               lambda nfas: len([nfa.nfa_prune(n) for n in nfas]))
+        yield ("match_lazy_dfa", p, lambda size=size: mk_match_input(size),
+               lambda x: match_all(LazyDFA, *x))
+        yield ("match_nfa_matcher", p, lambda size=size: mk_match_input(size),
+               lambda x: match_all(NFAMatcher, *x))
+
+        for num_nodes in NUM_NODES:
+            p = {"regex_size": size, "num_nodes": num_nodes}
+            yield ("adj_matrix_from_nfa", p, lambda size=size, n=num_nodes: mk_nfas(size, n),
+                   lambda nfas, n=num_nodes: len([nfa.adj_matrix_from_nfa(x, n) for x in nfas]))
+            yield ("adj_tensor_from_nfas", p, lambda size=size, n=num_nodes: mk_nfas(size, n),
+                   lambda nfas, n=num_nodes: len(nfa.adj_tensor_from_nfas(nfas, n)))
+            yield ("nfa_from_adjacency_matrix", p,
+                   lambda size=size, n=num_nodes: [nfa.adj_matrix_from_nfa(x, n)
+                                                   for x in mk_nfas(size, n)],
+                   lambda adjs: len([nfa.nfa_from_adjacency_matrix(a) for a in adjs]))
+
+
+def measure(setup, fn, repeats):
+    x = setup()
+    if fn(x) == 0:
+        return {"items": 0}
+
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        t = time.perf_counter()
+        items = fn(x)
+        times.append(time.perf_counter() - t)
+
+    gc.collect()
+    tracemalloc.start()
+    fn(x)
+    (_, peak) = tracemalloc.get_traced_memory()
+    blocks = sum(s.count for s in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+
+    # ru_maxrss is in kB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss *= 1 if sys.platform == "darwin" else 1024
+    return {
+        "items": items,
+        "seconds": min(times),
+        "median_seconds": statistics.median(times),
+        "per_item_us": 1e6 * min(times) / max(1, items),
+        "alloc_peak_bytes": peak,
+        "alloc_blocks": blocks,
+        "peak_rss_bytes": rss,
+    }
+
+
+def case_key(name, params):
+    return "/".join([name] + ["%s=%s" % kv for kv in sorted(params.items())])
+
+
+def run_suite(repeats=REPEATS, only=None):
+    results = {}
+    for (name, params, setup, fn) in cases():
+        key = case_key(name, params)
+        if only is not None and only not in key:
+            continue
+        r = measure(setup, fn, repeats)
+        if r["items"] == 0:
+            # e.g. no NFA of that regex size fits in num_nodes
+            print("%-55s skipped, nothing to run on" % (key, ))
+            continue
+        r["params"] = params
+        results[key] = r
+        print("%-55s %10.1f us / item %10.1f kB peak alloc" %
+              (key, r["per_item_us"], r["alloc_peak_bytes"] / 1e3), flush=True)
+    return {
+        "version": FORMAT_VERSION,
+        "machine": {"python": platform.python_version(), "numpy": np.__version__,
+                    "platform": platform.platform(), "processor": platform.processor()},
+        "results": results,
+    }
+
+
+# list of (key, what, ratio) for the cases that regressed
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    if baseline.get("version") != FORMAT_VERSION:
+        raise RuntimeError("baseline version %s, expected %s" %
+                           (baseline.get("version"), FORMAT_VERSION))
+    regressions = []
+    for (key, r) in sorted(results["results"].items()):
+        b = baseline["results"].get(key)
+        if b is None:
+            continue
+        for what in ("per_item_us", "alloc_peak_bytes"):
+            ratio = r[what] / b[what] if b[what] > 0 else 1.0
+            if ratio > threshold:
+                regressions.append((key, what, ratio))
+    return regressions
+
+
+def write_json(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="regex / NFA pipeline benchmarks")
+    parser.add_argument("-o", "--output", help="write the results as JSON here")
+    parser.add_argument("-b", "--baseline", default=BASELINE,
+                        help="compare against this JSON (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write the results to the baseline file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="ratio to the baseline that counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats")
+    parser.add_argument("-k", dest="only", help="only the cases whose key contains this")
+    args = parser.parse_args(argv)
+
+    results = run_suite(QUICK_REPEATS if args.quick else REPEATS, args.only)
+    if args.output:
+        write_json(results, args.output)
+    if args.save_baseline:
+        write_json(results, args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline at %s" % (args.baseline, ))
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for (key, what, ratio) in regressions:
+        print("REGRESSION %s: %s x%.2f of baseline" % (key, what, ratio))
+    if not regressions:
+        print("no regressions against %s (threshold x%.2f)" % (args.baseline, args.threshold))
+    return 1 if regressions else 0
+
+
+def run(argv=()):
+    return main(list(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
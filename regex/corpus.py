@@ -0,0 +1,117 @@
+import concurrent.futures
+import functools
+import os
+import random
+import sys
+
+import numpy as np
+
+from . import regex
+from . import regex_nfa_convert
+from .dataset import write_index, write_shard
+from .nfa_optimize import nfa_optimize
+from .nfa_order import nfa_relabel
+
+DEFAULT_SHARD_SIZE = 10000
+
+# what a corpus is made of unless told otherwise: uniformly drawn shapes
+# with 10 operators over chunks of 4 to 8 characters. That is
+# regex_mk_random_sized rather than regex_mk_random, whose operator budgets
+# give a wide spread of sizes that are often too big for num_nodes and get
+# redrawn; pass mk_regex=functools.partial(regex.regex_mk_random, ...) to
+# build a corpus from that instead.
+DEFAULT_MK_REGEX = functools.partial(regex.regex_mk_random_sized, 10, 4, 8)
+
+# a sample whose NFA does not fit in num_nodes is redrawn, at most this many
+# times in a row
+_MAX_REDRAWS = 1000
+
+
+# The random stream of a shard depends only on the corpus seed and the shard
+# index, never on which worker runs it, so a corpus is the same bit for bit
+# whatever the number of workers.
+def shard_rng(seed, shard_idx):
+    state = np.random.SeedSequence(seed, spawn_key=(shard_idx, )).generate_state(4)
+    return random.Random(int.from_bytes(state.tobytes(), "little"))
+
+
+def shard_name(shard_idx):
+    return "shard-%05d" % shard_idx
+
+
+# with optimize, the NFAs go through nfa_optimize.nfa_optimize first, so
+# fewer regexes are redrawn for being too big. With order, their nodes are
+# renumbered by nfa_order.nfa_relabel.
+def mk_samples(rng, num_samples, num_nodes, mk_regex=DEFAULT_MK_REGEX, optimize=False,
+               order=None):
+    regexes = []
+    nfas = []
+    while len(nfas) < num_samples:
+        for _ in range(_MAX_REDRAWS):
+            r = mk_regex(rng=rng)
+            n = regex_nfa_convert.nfa_from_regex(r)
+            if optimize:
+                n = nfa_optimize(n)
+            if order is not None:
+                n = nfa_relabel(n, order)
+            if n.numnodes <= num_nodes:
+                break
+        else:
+            raise RuntimeError("no regex with an NFA of <= %s nodes in %s draws" %
+                               (num_nodes, _MAX_REDRAWS))
+        regexes.append(r)
+        nfas.append(n)
+    return (regexes, nfas)
+
+
+def _mk_shard(out_dir, seed, shard_idx, num_samples, num_nodes, mk_regex, optimize, order):
+    (regexes, nfas) = mk_samples(shard_rng(seed, shard_idx), num_samples, num_nodes, mk_regex,
+                                 optimize, order)
+    write_shard(os.path.join(out_dir, shard_name(shard_idx)), regexes, nfas, num_nodes)
+    return (shard_idx, num_samples)
+
+
+# Writes num_samples (regex, NFA) samples to out_dir as a ShardedDataset
+# of shards of shard_size samples, built in parallel by num_workers
+# processes (all cores by default, none with num_workers=1). Yields (shard
+# index, number of samples) as shards are finished, in completion order.
+# The index is rewritten after every shard, so the finished part of a
+# corpus can be read while the rest is being generated.
+#
+# mk_regex is called as mk_regex(rng=rng) and must be picklable, e.g. a
+# functools.partial of regex_mk_random.
+def generate_corpus(out_dir, num_samples, num_nodes, seed=0,
+                    shard_size=DEFAULT_SHARD_SIZE, num_workers=None,
+                    mk_regex=DEFAULT_MK_REGEX, optimize=False, order=None):
+    os.makedirs(out_dir, exist_ok=True)
+
+    jobs = [(out_dir, seed, i, min(shard_size, num_samples - lo), num_nodes, mk_regex,
+             optimize, order)
+            for (i, lo) in enumerate(range(0, num_samples, shard_size))]
+
+    done = {}
+    def finished(result):
+        (shard_idx, n) = result
+        done[shard_idx] = n
+        write_index(out_dir, num_nodes, [(shard_name(i), done[i]) for i in sorted(done)])
+        return result
+
+    if num_workers == 1:
+        for job in jobs:
+            yield finished(_mk_shard(*job))
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(num_workers) as pool:
+        futures = [pool.submit(_mk_shard, *job) for job in jobs]
+        for f in concurrent.futures.as_completed(futures):
+            yield finished(f.result())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("usage: %s <out dir> <num samples> <num nodes> [seed]" % sys.argv[0])
+        sys.exit(1)
+
+    for (shard_idx, n) in generate_corpus(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]),
+                                          seed=int(sys.argv[4]) if len(sys.argv) > 4 else 0):
+        print("shard %s: %s samples" % (shard_idx, n))
@@ -0,0 +1,191 @@
+import json
+import os
+import random
+
+import numpy as np
+
+from .nfa import _NO_NODE, adj_tensor_from_nfas
+from .regex_parse import parse_regex
+
+# On-disk layout of a dataset directory:
+#
+#   index.json                 {"version", "num_nodes", "shards": [{"name", "num_samples"}]}
+#   <shard>.adj.npy            uint8 (num_samples, num_nodes, num_nodes) adjacency tensors
+#   <shard>.nodes.npy          int32 (num_samples, 2) start / end node ids, -1 if unknown
+#   <shard>.regex.bin          ascii text of all the regexes, back to back
+#   <shard>.regex_offsets.npy  int64 (num_samples + 1) where each regex starts in .regex.bin
+#
+# Everything is a plain .npy or raw buffer, so readers np.load(mmap_mode="r")
+# them and slice without reading a whole shard.
+FORMAT_VERSION = 1
+INDEX_FILE = "index.json"
+
+
+def _write_atomic(path, write):
+    with open(path + ".tmp", "wb") as f:
+        write(f)
+    os.replace(path + ".tmp", path)
+
+
+def write_shard(path, regexes, nfas, num_nodes):
+    adj = adj_tensor_from_nfas(nfas, num_nodes)
+
+    nodes = np.full((len(nfas), 2), _NO_NODE, dtype=np.int32)
+    for (i, n) in enumerate(nfas):
+        if n.start_node is not None:
+            nodes[i, 0] = n.start_node.idx
+        if n.end_node is not None:
+            nodes[i, 1] = n.end_node.idx
+
+    texts = [str(r).encode("ascii") for r in regexes]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in texts], out=offsets[1:])
+
+    # each file is written under a temporary name and renamed, so a file
+    # that exists is complete. The index, written by write_index once all
+    # the shards are, is what makes them part of a dataset.
+    _write_atomic(path + ".adj.npy", lambda f: np.save(f, adj))
+    _write_atomic(path + ".nodes.npy", lambda f: np.save(f, nodes))
+    _write_atomic(path + ".regex.bin", lambda f: f.write(b"".join(texts)))
+    _write_atomic(path + ".regex_offsets.npy", lambda f: np.save(f, offsets))
+
+
+# shards: list of (shard name, number of samples), in dataset order
+def write_index(out_dir, num_nodes, shards):
+    index = {
+        "version": FORMAT_VERSION,
+        "num_nodes": num_nodes,
+        "shards": [{"name": name, "num_samples": n} for (name, n) in shards],
+    }
+    _write_atomic(os.path.join(out_dir, INDEX_FILE),
+                  lambda f: f.write(json.dumps(index, indent=1).encode("ascii")))
+
+
+class Batch:
+    __slots__ = ("_adj", "_nodes", "_regex_bytes", "_regex_offsets")
+
+    def __init__(self, adj, nodes, regex_bytes, regex_offsets):
+        self._adj = adj
+        self._nodes = nodes
+        self._regex_bytes = regex_bytes
+        self._regex_offsets = regex_offsets
+
+    def __len__(self):
+        return len(self._adj)
+
+    # (batch, num_nodes, num_nodes) uint8, a read-only view into the shard
+    @property
+    def adj(self):
+        return self._adj
+
+    @property
+    def start_nodes(self):
+        return self._nodes[:, 0]
+
+    @property
+    def end_nodes(self):
+        return self._nodes[:, 1]
+
+    # decoded on access
+    @property
+    def regexes(self):
+        base = self._regex_offsets[0]
+        text = self._regex_bytes[base:self._regex_offsets[-1]].tobytes().decode("ascii")
+        return [text[lo - base:hi - base] for (lo, hi) in
+                zip(self._regex_offsets[:-1].tolist(), self._regex_offsets[1:].tolist())]
+
+    # the regexes as Regex objects, parsed on access
+    @property
+    def parsed_regexes(self):
+        return [parse_regex(t) for t in self.regexes]
+
+
+class _Shard:
+    def __init__(self, path, num_samples):
+        self.adj = np.load(path + ".adj.npy", mmap_mode="r")
+        self.nodes = np.load(path + ".nodes.npy", mmap_mode="r")
+        self.regex_offsets = np.load(path + ".regex_offsets.npy", mmap_mode="r")
+        if os.path.getsize(path + ".regex.bin") > 0:
+            self.regex_bytes = np.memmap(path + ".regex.bin", dtype=np.uint8, mode="r")
+        else:
+            self.regex_bytes = np.zeros(0, dtype=np.uint8)
+
+        assert len(self.adj) == num_samples, "%s: index says %s samples, found %s" % \
+            (path, num_samples, len(self.adj))
+
+    def batch(self, lo, hi):
+        return Batch(self.adj[lo:hi], self.nodes[lo:hi],
+                     self.regex_bytes, self.regex_offsets[lo:hi + 1])
+
+
+# Read side of the format above. Nothing is loaded up front: shards are
+# memory mapped, and batches are views into them, so a dataset much bigger
+# than RAM can be iterated over every epoch.
+class ShardedDataset:
+    def __init__(self, path):
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            index = json.load(f)
+        if index["version"] != FORMAT_VERSION:
+            raise RuntimeError("%s: dataset version %s, expected %s" %
+                               (path, index["version"], FORMAT_VERSION))
+
+        self._num_nodes = index["num_nodes"]
+        self._shards = [_Shard(os.path.join(path, s["name"]), s["num_samples"])
+                        for s in index["shards"]]
+        self._bounds = np.cumsum([0] + [len(s.adj) for s in self._shards])
+
+    def __len__(self):
+        return int(self._bounds[-1])
+
+    @property
+    def num_nodes(self):
+        return self._num_nodes
+
+    @property
+    def num_shards(self):
+        return len(self._shards)
+
+    # samples [lo, hi); zero-copy when they are all in one shard
+    def batch(self, lo, hi):
+        assert 0 <= lo <= hi <= len(self)
+        if not self._shards:
+            return Batch(np.zeros((0, self._num_nodes, self._num_nodes), dtype=np.uint8),
+                         np.zeros((0, 2), dtype=np.int32), np.zeros(0, dtype=np.uint8),
+                         np.zeros(1, dtype=np.int64))
+
+        s = int(np.searchsorted(self._bounds, lo, side="right")) - 1
+        s = min(s, len(self._shards) - 1)
+        if hi <= self._bounds[s + 1]:
+            base = self._bounds[s]
+            return self._shards[s].batch(lo - base, hi - base)
+
+        parts = [self.batch(max(lo, self._bounds[i]), min(hi, self._bounds[i + 1]))
+                 for i in range(s, len(self._shards))
+                 if self._bounds[i] < hi]
+        texts = "".join("".join(p.regexes) for p in parts).encode("ascii")
+        lengths = [len(r) for p in parts for r in p.regexes]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return Batch(np.concatenate([p.adj for p in parts]),
+                     np.concatenate([np.stack([p.start_nodes, p.end_nodes], axis=1)
+                                     for p in parts]),
+                     np.frombuffer(texts, dtype=np.uint8), offsets)
+
+    # Batches of batch_size samples that never straddle two shards, so
+    # every batch is a view. With shuffle the batches come in a random
+    # order, but the samples inside a batch stay contiguous.
+    def iter_batches(self, batch_size, shuffle=False, seed=None, drop_last=False):
+        rng = random.Random(seed)
+
+        spans = []
+        for (i, shard) in enumerate(self._shards):
+            for lo in range(0, len(shard.adj), batch_size):
+                hi = min(lo + batch_size, len(shard.adj))
+                if hi - lo == batch_size or not drop_last:
+                    spans.append((i, lo, hi))
+
+        if shuffle:
+            rng.shuffle(spans)
+
+        for (i, lo, hi) in spans:
+            yield self._shards[i].batch(lo, hi)
@@ -0,0 +1,179 @@
+import random
+
+import numpy as np
+
+from .lru import LRUCache
+from .nfa_minimize import minimal_dfa_from_nfa
+from .nfa_sample import decode_strings
+from .regex import Regex
+from .regex_nfa_convert import nfa_from_regex
+from .regex_parse import parse_regex
+
+# Counters kept by the default cache.
+DEFAULT_CACHE_COUNTERS = 256
+
+# counts below this fit the int64 tables; bigger ones use Python ints
+_MAX_INT64_COUNT = 1 << 62
+
+
+# Counts the strings of an NFA's language by length, up to max_len, on its
+# minimal DFA (nfa_minimize.minimal_dfa_from_nfa), and uses the counts to
+# draw strings uniformly at random and to list them.
+#
+# count[l, q] is the number of strings of length l the DFA accepts starting
+# from state q:
+#
+#   count[0, q] = 1 if q accepts else 0
+#   count[l, q] = sum of count[l - 1, t] over the transitions q -c-> t
+#
+# which is a (max_len + 1, num states) table and nothing else. Strings are
+# ranked by length, then by symbol codes, and string number k is found by
+# walking the DFA from the start: the first symbol is the one whose
+# transitions before it have fewer than k strings left, and so on, one
+# state lookup per symbol. Uniform sampling is unranking uniform ranks. The
+# minimal DFA has no dead states, so every walk ends where it should.
+#
+# Counts grow exponentially with max_len; when they don't fit in int64 the
+# tables hold Python ints, which is exact but slower.
+class DFACounter:
+    def __init__(self, nfa, max_len):
+        assert max_len >= 0
+        dfa = minimal_dfa_from_nfa(nfa)
+        n = dfa.numstates
+
+        # transitions by state, then symbol
+        edges = [(q, c, t) for q in range(n) for (c, t) in sorted(dfa.delta[q].items())]
+        (src, code, dest) = np.array(edges, dtype=np.int64).reshape(-1, 3).T
+        self._code = code.astype(np.uint8)
+        self._dest = dest
+        self._indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self._indptr[1:])
+
+        count = np.zeros((max_len + 1, n), dtype=object)
+        count[0] = [1 if a else 0 for a in dfa.accepting]
+        for l in range(1, max_len + 1):
+            count[l] = 0
+            np.add.at(count[l], src, count[l - 1][dest])
+
+        self._start = dfa.start
+        self._max_len = max_len
+        by_length = count[:, self._start] if self._start is not None \
+            else np.zeros(max_len + 1, dtype=object)
+        self._total = int(by_length.sum())
+        if self._total < _MAX_INT64_COUNT:
+            count = count.astype(np.int64)
+            by_length = by_length.astype(np.int64)
+        self._count = count
+        self._by_length = by_length
+        self._cum_by_length = np.cumsum(by_length)
+
+    @property
+    def max_len(self):
+        return self._max_len
+
+    # number of strings of at most max_len symbols
+    @property
+    def total(self):
+        return self._total
+
+    # number of strings of exactly `length` symbols
+    def count(self, length):
+        assert 0 <= length <= self._max_len
+        return int(self._by_length[length])
+
+    # (codes, lengths) of the strings with the given ranks, in the layout of
+    # nfa_match.encode_strings
+    def unrank_codes(self, ranks):
+        ranks = np.asarray(ranks, dtype=self._count.dtype).reshape(-1)
+        assert len(ranks) == 0 or (min(ranks) >= 0 and max(ranks) < self._total), \
+            "ranks out of range [0, %s)" % (self._total, )
+
+        lengths = np.searchsorted(self._cum_by_length, ranks, side="right")
+        k = ranks - (self._cum_by_length[lengths] - self._by_length[lengths])
+        lengths = lengths.astype(np.int64)
+        codes = np.zeros((len(ranks), int(lengths.max()) if len(ranks) else 0), dtype=np.uint8)
+        state = np.full(len(ranks), self._start if self._start is not None else 0,
+                        dtype=np.int64)
+
+        for t in range(codes.shape[1]):
+            live = np.flatnonzero(lengths > t)
+            live = live[np.argsort(state[live], kind="stable")]
+            (states, first) = np.unique(state[live], return_index=True)
+            for (q, lo, hi) in zip(states.tolist(), first.tolist(),
+                                   first[1:].tolist() + [len(live)]):
+                idx = live[lo:hi]
+                (e0, e1) = (self._indptr[q], self._indptr[q + 1])
+                # strings left after each transition of q, for every string
+                left = self._count[(lengths[idx] - t - 1)[:, None], self._dest[None, e0:e1]]
+                upto = np.cumsum(left, axis=1)
+                j = (upto <= k[idx][:, None]).sum(axis=1)
+                rows = np.arange(len(idx))
+                k[idx] -= upto[rows, j] - left[rows, j]
+                codes[idx, t] = self._code[e0 + j]
+                state[idx] = self._dest[e0 + j]
+        return (codes, lengths)
+
+    def unrank(self, rank):
+        return decode_strings(*self.unrank_codes([rank]))[0]
+
+    def _uniform_ranks(self, num_strings, rng):
+        if self._total == 0:
+            raise RuntimeError("no strings of at most %s symbols" % (self._max_len, ))
+        rng = np.random.default_rng(rng)
+        if self._count.dtype == np.int64:
+            return rng.integers(0, self._total, size=num_strings, dtype=np.int64)
+        big = random.Random(int(rng.integers(1 << 62)))
+        return np.array([big.randrange(self._total) for _ in range(num_strings)], dtype=object)
+
+    # num_strings strings drawn uniformly, with replacement, from all the
+    # strings of at most max_len symbols. rng is a numpy Generator, or a
+    # seed for one.
+    def sample_codes(self, num_strings, rng=None):
+        return self.unrank_codes(self._uniform_ranks(num_strings, rng))
+
+    def sample(self, num_strings, rng=None):
+        return decode_strings(*self.sample_codes(num_strings, rng))
+
+    # every string of at most max_len (or the given max_len) symbols, in rank
+    # order, generated as they are asked for
+    def strings(self, max_len=None):
+        max_len = self._max_len if max_len is None else max_len
+        assert max_len <= self._max_len
+        if self._start is None:
+            return
+        for length in range(max_len + 1):
+            if self._by_length[length] == 0:
+                continue
+            # (state, symbols left, prefix), the smallest symbol on top
+            todo = [(self._start, length, "")]
+            while todo:
+                (q, left, prefix) = todo.pop()
+                if left == 0:
+                    yield prefix
+                    continue
+                for e in range(self._indptr[q + 1] - 1, self._indptr[q] - 1, -1):
+                    t = self._dest[e]
+                    if self._count[left - 1, t] > 0:
+                        todo.append((t, left - 1, prefix + chr(self._code[e])))
+
+
+COUNTER_CACHE = LRUCache(DEFAULT_CACHE_COUNTERS)
+
+
+# The DFACounter of a Regex, or of a pattern in regex_parse syntax, kept in
+# `cache` so repeated draws from the same pattern reuse its tables.
+def dfa_counter(r, max_len, syntax="repo", cache=COUNTER_CACHE):
+    if isinstance(r, Regex):
+        key = (r, max_len)
+    else:
+        key = (syntax, r, max_len)
+
+    counter = cache.get(key) if cache is not None else None
+    if counter is None:
+        if not isinstance(r, Regex):
+            r = parse_regex(r, syntax)
+        counter = DFACounter(nfa_from_regex(r), max_len)
+        if cache is not None:
+            cache.put(key, counter)
+    return counter
+
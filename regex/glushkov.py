@@ -0,0 +1,183 @@
+import numpy as np
+
+from .nfa_dfa import LazyDFA
+from .nfa_match import NUM_SYMBOLS, encode_strings
+from .regex import Regex, RegexASCII, RegexOr, StarRegex
+from .regex_nfa_convert import _label, nfa_from_regex
+from .regex_parse import parse_regex
+
+# Positions a regex can have and still fit ShiftAndMatcher's 64 bit words:
+# one bit per position, and bit 0 for the initial state.
+MAX_POSITIONS = 63
+
+# state bits looked up per table, see ShiftAndMatcher. Wider chunks are
+# fewer gathers per step but bigger tables: 2 KB per 8 bits, 512 KB per 16
+# bits, so at most 2 MB for a full word.
+_MIN_CHUNK_BITS = 8
+_MAX_CHUNK_BITS = 16
+
+
+# The Glushkov (position) automaton of a regex. Every use of a literal is a
+# position, numbered 1, 2, ... from the left, and the automaton has a state
+# per position, "just read this position", plus the initial state 0. It is
+# epsilon free: the transitions out of p on symbol c go to the positions in
+# follow[p] that read c.
+#
+# Returns (codes, follow, last): codes[p - 1] the symbol code of position
+# p, follow[p] the positions that can come right after p as a bitmask
+# (follow[0] those that can come first), and last the mask of accepting
+# states (bit 0 too when the regex matches the empty string). Raises
+# RuntimeError past max_positions positions.
+def glushkov(r, max_positions=MAX_POSITIONS):
+    codes = []
+    follow = [0]
+    # (nullable, first, last) of every finished subtree
+    built = []
+    todo = [(r, False)]
+    while todo:
+        (x, children_done) = todo.pop()
+        cls = type(x)
+        if cls is RegexASCII:
+            p = len(follow)
+            if p > max_positions:
+                raise RuntimeError("regex has more than %s positions" % (max_positions, ))
+            codes.append(_label(x.char))
+            follow.append(0)
+            built.append((False, 1 << p, 1 << p))
+        elif not children_done:
+            todo.append((x, True))
+            if cls is StarRegex:
+                todo.append((x.r, False))
+            else:
+                todo.append((x.r2, False))
+                todo.append((x.r1, False))
+        elif cls is StarRegex:
+            (_, first, last) = built.pop()
+            _add_follow(follow, last, first)
+            built.append((True, first, last))
+        elif cls is RegexOr:
+            (n2, f2, l2) = built.pop()
+            (n1, f1, l1) = built.pop()
+            built.append((n1 or n2, f1 | f2, l1 | l2))
+        else:
+            (n2, f2, l2) = built.pop()
+            (n1, f1, l1) = built.pop()
+            _add_follow(follow, l1, f2)
+            built.append((n1 and n2, f1 | (f2 if n1 else 0), l2 | (l1 if n2 else 0)))
+
+    (nullable, first, last) = built[0]
+    follow[0] = first
+    return (codes, follow, (last | 1) if nullable else last)
+
+
+def _add_follow(follow, positions, mask):
+    while positions:
+        low = positions & -positions
+        follow[low.bit_length() - 1] |= mask
+        positions ^= low
+
+
+# Matches a regex of at most MAX_POSITIONS positions by simulating its
+# Glushkov automaton bit-parallel, in the style of Shift-And: the state of
+# a string is one uint64 with a bit per active position, and a step is
+#
+#   state = follow(state) & reads[c]
+#
+# with reads[c] the positions that read symbol c. Unlike the positions of
+# a plain string, those of a regex don't just follow the previous one, so
+# follow(state), the OR of follow[p] over the bits p of state, is looked up
+# in tables of 8 or 16 state bits at a time: an OR of a handful of
+# gathers. No epsilon closures and no per string branches; every step is a
+# few numpy passes over all the strings at once.
+class ShiftAndMatcher:
+    def __init__(self, r):
+        (codes, follow, last) = glushkov(r)
+        num_states = len(follow)
+
+        self._reads = np.zeros(NUM_SYMBOLS, dtype=np.uint64)
+        for (p, c) in enumerate(codes, 1):
+            self._reads[c] |= np.uint64(1 << p)
+
+        cb = _MIN_CHUNK_BITS if num_states <= _MIN_CHUNK_BITS else _MAX_CHUNK_BITS
+        num_chunks = -(-num_states // cb)
+        follow += [0] * (num_chunks * cb - num_states)
+        # table[k, v]: the OR of follow[k * cb + j] over the bits j of v,
+        # filled a bit at a time: the values with bit j set are the ones
+        # below 1 << j, plus follow of that bit
+        table = np.zeros((num_chunks, 1 << cb), dtype=np.uint64)
+        rows = np.array(follow, dtype=np.uint64).reshape(num_chunks, cb)
+        for j in range(cb):
+            table[:, 1 << j:2 << j] = table[:, :1 << j] | rows[:, j:j + 1]
+        self._table = table
+        self._chunk_bits = cb
+
+        self._num_positions = len(codes)
+        self._last = np.uint64(last)
+
+    @property
+    def num_positions(self):
+        return self._num_positions
+
+    def _follow(self, state):
+        cb = self._chunk_bits
+        mask = np.uint64((1 << cb) - 1)
+        out = self._table[0][state & mask]
+        for k in range(1, len(self._table)):
+            out |= self._table[k][(state >> np.uint64(k * cb)) & mask]
+        return out
+
+    def match_codes(self, codes, lengths):
+        codes = np.asarray(codes)
+        lengths = np.asarray(lengths)
+
+        # longest strings first, so the strings still running are a prefix
+        order = np.argsort(-lengths, kind="stable")
+        (codes, lengths) = (codes[order], lengths[order])
+
+        state = np.ones(len(lengths), dtype=np.uint64)
+        for t in range(codes.shape[1]):
+            k = int(np.count_nonzero(lengths > t))
+            if k == 0:
+                break
+            state[:k] = self._follow(state[:k]) & self._reads[codes[:k, t]]
+            if not state[:k].any():
+                break
+
+        matched = np.empty(len(lengths), dtype=bool)
+        matched[order] = (state & self._last) != 0
+        return matched
+
+    def match_batch(self, strings):
+        return self.match_codes(*encode_strings(strings))
+
+    def match(self, s):
+        return bool(self.match_batch([s])[0])
+
+
+# A matcher for a Regex, or a pattern in regex_parse syntax: a
+# ShiftAndMatcher when the regex fits in a word, which most generated ones
+# do, and a LazyDFA of nfa_from_regex otherwise. Both have match_codes,
+# match_batch and match.
+def regex_matcher(r, syntax="repo"):
+    if not isinstance(r, Regex):
+        r = parse_regex(r, syntax)
+    if _num_positions(r) <= MAX_POSITIONS:
+        return ShiftAndMatcher(r)
+    return LazyDFA(nfa_from_regex(r))
+
+
+# number of literal uses, counted up to one past MAX_POSITIONS
+def _num_positions(r):
+    count = 0
+    todo = [r]
+    while todo and count <= MAX_POSITIONS:
+        x = todo.pop()
+        cls = type(x)
+        if cls is RegexASCII:
+            count += 1
+        elif cls is StarRegex:
+            todo.append(x.r)
+        else:
+            todo.append(x.r2)
+            todo.append(x.r1)
+    return count
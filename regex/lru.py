@@ -0,0 +1,82 @@
+import collections
+import os
+import threading
+import weakref
+
+# Every live LRUCache. A child forked while another thread held a cache's
+# lock would never see it released, so the locks are replaced in the child.
+_caches = weakref.WeakSet()
+
+def _reset_locks():
+    for cache in list(_caches):
+        cache._reset_lock()
+
+os.register_at_fork(after_in_child=_reset_locks)
+
+
+# Thread safe LRU cache, bounded by the total size of its values. size(value)
+# is the size of one value, 1 if size is None, so by default max_size is the
+# number of entries. Values bigger than max_size on their own aren't kept.
+# Values can't be None: get returns None on a miss.
+class LRUCache:
+    def __init__(self, max_size, size=None):
+        self._max_size = max_size
+        self._size_of = size
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    # total size of the cached values
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _value_size(self, value):
+        return 1 if self._size_of is None else self._size_of(value)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._value_size(value)
+        if size > self._max_size:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= self._value_size(old)
+            self._entries[key] = value
+            self._size += size
+            while self._size > self._max_size:
+                (_, old) = self._entries.popitem(last=False)
+                self._size -= self._value_size(old)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
@@ -1,7 +1,11 @@
 import string
 import pprint
 
+import numpy as np
+
 class EdgeType:
+    __slots__ = ("_int_val", )
+
     _NONE_EDGE_VAL = 0
     _EPSILON_EDGE_VAL = 1
 
@@ -22,6 +26,9 @@ class EdgeType:
     def __eq__(self, other):
         return self._int_val == other._int_val
 
+    def __hash__(self):
+        return hash(self._int_val)
+
     @staticmethod
     def from_int(val):
         assert isinstance(val, int)
@@ -56,12 +63,17 @@ class EdgeType:
 
 
 class NFANode:
+    __slots__ = ("_idx", )
+
     def __init__(self, idx):
         self._idx = idx
 
     def __eq__(self, other):
         return self._idx == other._idx
 
+    def __hash__(self):
+        return hash(self._idx)
+
     @property
     def idx(self):
         return self._idx
@@ -73,6 +85,8 @@ class NFANode:
         return self.__str__()
 
 class Connection:
+    __slots__ = ("_src", "_dest", "_edge")
+
     def __init__(self, src, edge, dest):
         assert isinstance(src, NFANode)
         assert isinstance(dest, NFANode)
@@ -110,62 +124,222 @@ class Connection:
     def __repr__(self):
         return self.__str__()
 
+
+# Edges live in one (capacity, 3) int32 array whose columns are
+# (src, label, dest); label is EdgeType.to_int. Connection / NFANode /
+# EdgeType objects are only materialised when someone asks for them
+# through `connections`, so an NFA costs 12 bytes per edge plus a
+# constant, instead of a handful of heap objects per edge.
+_EDGE_SRC = 0
+_EDGE_LABEL = 1
+_EDGE_DEST = 2
+
+_NO_NODE = -1
+
+
+def _sorted_rows(a):
+    return a[np.lexsort(a.T[::-1])]
+
+
 class NFA:
+    __slots__ = ("_edges", "_numedges", "_numnodes",
+                 "_start_idx", "_end_idx", "_csr", "_signature")
+
+    _MIN_CAPACITY = 8
+
     def __init__(self):
-        self._connections = set()
+        self._edges = np.empty((0, 3), dtype=np.int32)
+        self._numedges = 0
         self._numnodes = 0
-        self._start_node = None
-        self._end_node = None
+        self._start_idx = _NO_NODE
+        self._end_idx = _NO_NODE
+        self._csr = None
+        self._signature = None
+
+    @staticmethod
+    def from_edges(numnodes, src, label, dest, start=None, end=None):
+        edges = np.empty((len(src), 3), dtype=np.int32)
+        edges[:, _EDGE_SRC] = src
+        edges[:, _EDGE_LABEL] = label
+        edges[:, _EDGE_DEST] = dest
+        return NFA.from_edge_array(numnodes, edges, start, end)
+
+    # Takes over `edges`, a (num edges, 3) int32 array of (src, label, dest)
+    # rows, without copying it. It can be a read-only view, e.g. into a
+    # memory mapped file: nothing writes to the edges of an NFA without
+    # first growing them into a new array.
+    @staticmethod
+    def from_edge_array(numnodes, edges, start=None, end=None):
+        assert edges.dtype == np.int32 and edges.ndim == 2 and edges.shape[1] == 3
+        nfa = NFA()
+        if len(edges) > 0:
+            # the src and dest columns, as a view
+            nodes = edges[:, _EDGE_SRC::_EDGE_DEST - _EDGE_SRC]
+            assert nodes.min() >= 0 and nodes.max() < numnodes
+
+        nfa._edges = edges
+        nfa._numedges = len(edges)
+        nfa._numnodes = numnodes
+        if start is not None:
+            nfa._start_idx = int(start)
+        if end is not None:
+            nfa._end_idx = int(end)
+        return nfa
 
     @property
     def connections(self):
-        return self._connections
+        nodes = [NFANode(i) for i in range(self._numnodes)]
+        return [Connection(nodes[s], EdgeType(l), nodes[d])
+                for (s, l, d) in self._edges[:self._numedges].tolist()]
+
+    # (src, label, dest) views, in insertion order
+    @property
+    def edges(self):
+        e = self._edges[:self._numedges]
+        return (e[:, _EDGE_SRC], e[:, _EDGE_LABEL], e[:, _EDGE_DEST])
+
+    # the same as one (num edges, 3) view of rows
+    @property
+    def edge_array(self):
+        return self._edges[:self._numedges]
+
+    # (indptr, label, dest): the outgoing edges of node i are
+    # label[indptr[i]:indptr[i + 1]], dest[indptr[i]:indptr[i + 1]]
+    def csr(self):
+        if self._csr is None:
+            (src, label, dest) = self.edges
+            order = np.argsort(src, kind="stable")
+            indptr = np.zeros(self._numnodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(src, minlength=self._numnodes),
+                      out=indptr[1:])
+            self._csr = (indptr, label[order], dest[order])
+        return self._csr
 
     @property
     def numnodes(self):
         return self._numnodes
 
+    @property
+    def numedges(self):
+        return self._numedges
+
     @property
     def start_node(self):
-        return self._start_node
+        if self._start_idx == _NO_NODE:
+            return None
+        return NFANode(self._start_idx)
 
     @start_node.setter
     def start_node(self, node):
         assert isinstance(node, NFANode)
-        self._start_node = node
+        self._start_idx = node.idx
+        self._signature = None
 
     @property
     def end_node(self):
-        return self._end_node
+        if self._end_idx == _NO_NODE:
+            return None
+        return NFANode(self._end_idx)
 
     @end_node.setter
     def end_node(self, node):
         assert isinstance(node, NFANode)
-        self._end_node = node
+        self._end_idx = node.idx
+        self._signature = None
 
+    # Canonical form of the minimal DFA of the language, see
+    # nfa_minimize.canonical_signature. Computed once and kept until the NFA
+    # is changed.
+    @property
+    def signature(self):
+        if self._signature is None:
+            from .nfa_minimize import canonical_signature
+            self._signature = canonical_signature(self)
+        return self._signature
+
+    # two NFAs are equal when they have the same nodes, start and end node,
+    # and the same edges in any order. Whether they accept the same
+    # language is nfa_minimize.nfa_equivalent.
     def __eq__(self, other):
-        return self.numnodes == other.numnodes
+        if not isinstance(other, NFA):
+            return NotImplemented
+        if (self._numnodes, self._numedges, self._start_idx, self._end_idx) != \
+                (other._numnodes, other._numedges, other._start_idx, other._end_idx):
+            return False
+        return np.array_equal(_sorted_rows(self.edge_array), _sorted_rows(other.edge_array))
 
-        # TODO: write a check that they have the same connections
-        # on performing BFS / DFS, we should find same shape
-        # fuck, is this graph isomorphism?
-        # OR: convert to minimal DFA. Ack, exponential :/
+    # NFAs are mutable
+    __hash__ = None
 
     def __str__(self):
-        return "numNodes: %s\n%s" % (self._numnodes, pprint.pformat(self._connections))
+        return "numNodes: %s\n%s" % (self._numnodes, pprint.pformat(self.connections))
 
     def __repr__(self):
         return self.__str__()
 
     def connect(self, src, edge, dest):
-        self._connections.add(Connection(src, edge, dest))
+        assert isinstance(src, NFANode)
+        assert isinstance(dest, NFANode)
+        assert isinstance(edge, EdgeType)
+        self.connect_idx(src.idx, edge.to_int, dest.idx)
+
+    def _reserve(self, num_edges):
+        n = self._numedges
+        if n + num_edges > len(self._edges):
+            grown = np.empty((max(NFA._MIN_CAPACITY, 2 * len(self._edges), n + num_edges), 3),
+                             dtype=np.int32)
+            grown[:n] = self._edges[:n]
+            self._edges = grown
+
+    # same as connect, but on raw node indices and EdgeType ints
+    def connect_idx(self, src, label, dest):
+        n = self._numedges
+        if n == len(self._edges):
+            self._reserve(1)
+
+        self._edges[n] = (src, label, dest)
+        self._numedges = n + 1
+        self._csr = None
+        self._signature = None
+
+    # connect_idx for arrays of edges
+    def connect_many(self, src, label, dest):
+        if len(src) == 0:
+            return
+        n = self._numedges
+        self._reserve(len(src))
+
+        self._edges[n:n + len(src), _EDGE_SRC] = src
+        self._edges[n:n + len(src), _EDGE_LABEL] = label
+        self._edges[n:n + len(src), _EDGE_DEST] = dest
+        self._numedges = n + len(src)
+        self._csr = None
+        self._signature = None
 
     def mk_node(self):
         node = NFANode(self._numnodes)
         self._numnodes += 1
+        self._csr = None
+        self._signature = None
 
         return node
 
+    # adds num_nodes nodes, returns the index of the first one
+    def mk_nodes(self, num_nodes):
+        first = self._numnodes
+        self._numnodes += num_nodes
+        self._csr = None
+        self._signature = None
+
+        return first
+
+    # drop the spare capacity left over from connect(). Call once an
+    # NFA is finished if it is going to be kept around in bulk.
+    def compact(self):
+        if len(self._edges) != self._numedges:
+            self._edges = self._edges[:self._numedges].copy()
+        return self
+
 
 def nfa_to_dot(nfa):
     from graphviz import Digraph
@@ -180,81 +354,295 @@ def nfa_to_dot(nfa):
     dot.attr("node", fontname="Courier")
     dot.attr("edge", fontname="Courier")
     
-    for i in range(nfa.numnodes):
-        attrs = {}
-
-        if (i == nfa.start_node.idx):
-            attrs["shape"] = "doublecircle"
-        if (i == nfa.end_node.idx):
-            attrs["style"] = "filled"
-            attrs["color"] = "#CCCCCC"
-            
-        dot.node(str(i), **attrs)
-
-
-    for connect in nfa.connections:
-        dot.edge(str(connect.src.idx), str(connect.dest.idx), xlabel=str(connect.edge))
+    # the nodes and edges as DOT text, see nfa_dot
+    from .nfa_dot import dot_body
+    dot.body.extend(dot_body(nfa))
 
     return dot
 
 
-def adj_matrix_from_nfa(nfa, num_nodes):
+def _check_fits(nfa, num_nodes):
     if nfa.numnodes > num_nodes:
         raise RuntimeError("NFA has %s nodes, > expected (%s)" %
                            (nfa.numnodes, num_nodes))
 
-    adj = [[EdgeType.mk_none_edge().to_int for _ in range(num_nodes)]
-            for _ in range(num_nodes)]
-
-    for c in nfa.connections:
-        adj[c.src.idx][c.dest.idx] = c.edge.to_int
-
-    return adj
-
-
-# TODO: how do we know what the start node is from the adjacency matrix?
-def nfa_from_adjacency_matrix(adj):
-    assert len(adj) > 0
-    assert len(adj[0]) > 0
-    assert len(adj) == len(adj[0])
-
-    for row in adj[1:]:
-        assert len(adj[0]) == len(row)
 
-    nfa = NFA()
+# (batch index, src, label, dest) of every edge of every NFA, as one int64
+# array per column
+def _batch_edges(nfas):
+    counts = [n.numedges for n in nfas]
+    edges = np.concatenate([n._edges[:n.numedges] for n in nfas] +
+                           [np.empty((0, 3), dtype=np.int32)]).astype(np.int64)
+    batch = np.repeat(np.arange(len(nfas)), counts)
+    return (batch, edges[:, _EDGE_SRC], edges[:, _EDGE_LABEL], edges[:, _EDGE_DEST])
+
+
+# Encodes a list of NFAs into a (batch, num_nodes, num_nodes) uint8 tensor
+# of EdgeType ints. `out` can be a preallocated tensor to fill, e.g. a
+# slice of a bigger buffer. When an NFA has several edges between the same
+# pair of nodes, the last one connected wins.
+def adj_tensor_from_nfas(nfas, num_nodes, out=None):
+    for n in nfas:
+        _check_fits(n, num_nodes)
+
+    if out is None:
+        out = np.zeros((len(nfas), num_nodes, num_nodes), dtype=np.uint8)
+    else:
+        assert out.shape == (len(nfas), num_nodes, num_nodes), \
+            "out has shape %s, expected %s" % (out.shape, (len(nfas), num_nodes, num_nodes))
+        out.fill(EdgeType._NONE_EDGE_VAL)
+
+    (batch, src, label, dest) = _batch_edges(nfas)
+    out[batch, src, dest] = label
+    return out
+
+
+# Sparse form of adj_tensor_from_nfas, without the None cells.
+#
+# format="coo": (batch, src, dest, label) arrays, sorted by
+#   (batch, src, dest).
+# format="csr": (indptr, dest, label) of the tensor viewed as a
+#   (batch * num_nodes, num_nodes) matrix; the edges of node i of NFA b are
+#   at indptr[b * num_nodes + i]:indptr[b * num_nodes + i + 1].
+def adj_sparse_from_nfas(nfas, num_nodes, format="coo"):
+    assert format in ("coo", "csr"), "unknown sparse format %s" % (format, )
+    for n in nfas:
+        _check_fits(n, num_nodes)
+
+    (batch, src, label, dest) = _batch_edges(nfas)
+
+    # one entry per cell, keeping the last edge like the dense encoding
+    cell = (batch * num_nodes + src) * num_nodes + dest
+    (cell, last) = np.unique(cell[::-1], return_index=True)
+    keep = len(label) - 1 - last
+    (batch, src, label, dest) = (batch[keep], src[keep], label[keep], dest[keep])
+
+    label = label.astype(np.uint8)
+    if format == "coo":
+        return (batch, src, dest, label)
+
+    indptr = np.zeros(len(nfas) * num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(batch * num_nodes + src, minlength=len(nfas) * num_nodes),
+              out=indptr[1:])
+    return (indptr, dest, label)
+
+
+# max |src - dest| over the edges of an NFA, 0 when it has none
+def nfa_bandwidth(nfa):
+    (src, _, dest) = nfa.edges
+    if len(src) == 0:
+        return 0
+    return int(np.abs(src.astype(np.int64) - dest).max())
+
+
+# Banded form of adj_tensor_from_nfas, for NFAs whose edges all stay within
+# `bandwidth` of the diagonal (see nfa_order for orderings that make that
+# hold): a (batch, num_nodes, 2 * bandwidth + 1) uint8 tensor where
+# out[b, i, k] is the edge from node i to node i + k - bandwidth. That is
+# num_nodes * (2 * bandwidth + 1) cells per NFA instead of num_nodes^2.
+def adj_banded_from_nfas(nfas, num_nodes, bandwidth, out=None):
+    width = 2 * bandwidth + 1
+    for n in nfas:
+        _check_fits(n, num_nodes)
+        if nfa_bandwidth(n) > bandwidth:
+            raise RuntimeError("NFA has bandwidth %s, > expected (%s)" %
+                               (nfa_bandwidth(n), bandwidth))
+
+    if out is None:
+        out = np.zeros((len(nfas), num_nodes, width), dtype=np.uint8)
+    else:
+        assert out.shape == (len(nfas), num_nodes, width), \
+            "out has shape %s, expected %s" % (out.shape, (len(nfas), num_nodes, width))
+        out.fill(EdgeType._NONE_EDGE_VAL)
+
+    (batch, src, label, dest) = _batch_edges(nfas)
+    out[batch, src, dest - src + bandwidth] = label
+    return out
 
-    nodes = [nfa.mk_node() for _ in range(len(adj))]
 
-    for (si, row) in enumerate(adj):
-        for (ei, col) in enumerate(row):
-            edgeval = col
-            nfa.connect(nodes[si], EdgeType.from_int(edgeval), nodes[ei])
-
-    return nfa
-
-def nfa_prune(nfa):
-    used_nodes = set()
-
-    for c in nfa.connections:
-        if c.edge == EdgeType.mk_none_edge():
-            continue
-        used_nodes.add(c.src.idx)
-        used_nodes.add(c.dest.idx)
-
-    prunednfa = NFA()
-    old_id_to_new_node = dict([(idx, prunednfa.mk_node()) for idx in used_nodes])
-
-    for c in nfa.connections:
-        if c.edge == EdgeType.mk_none_edge():
+def adj_matrix_from_nfa(nfa, num_nodes):
+    return adj_tensor_from_nfas([nfa], num_nodes)[0].tolist()
+
+
+# The adjacency matrix has no slot for the start and end nodes. In a
+# Thompson NFA the start node is the only node with no incoming edge and the
+# end node the only one with no outgoing edge, so guess them that way.
+#
+# A regex that starts with a star has no such start: the star's node, where
+# the NFA starts, has the loop back edge coming in. Then every node is
+# reached from the strongly connected component of that star, and the star's
+# node is the one node in it with edges out of it. Likewise for the end,
+# with edges reversed. Gives None when that is ambiguous too, e.g. for a
+# regex that is a single star (the whole NFA one component), or a matrix
+# that isn't a Thompson NFA; pass start / end explicitly in that case.
+def _infer_start_end(numnodes, src, dest):
+    used = np.zeros(numnodes, dtype=bool)
+    used[src] = True
+    used[dest] = True
+
+    has_in = np.zeros(numnodes, dtype=bool)
+    has_in[dest] = True
+    has_out = np.zeros(numnodes, dtype=bool)
+    has_out[src] = True
+
+    starts = np.flatnonzero(used & ~has_in)
+    ends = np.flatnonzero(used & ~has_out)
+    start = int(starts[0]) if len(starts) == 1 else None
+    end = int(ends[0]) if len(ends) == 1 else None
+    if start is None and len(starts) == 0:
+        start = _component_exit(numnodes, used, src, dest)
+    if end is None and len(ends) == 0:
+        end = _component_exit(numnodes, used, dest, src)
+    return (start, end)
+
+
+# The node of the source strongly connected component, the one every used
+# node is reachable from, that has edges leaving the component, if there is
+# exactly one.
+def _component_exit(numnodes, used, src, dest):
+    root = _last_finished(numnodes, used, src, dest)
+    forward = _reachable(numnodes, root, src, dest)
+    if not forward[used].all():
+        return None
+    component = forward & _reachable(numnodes, root, dest, src)
+    exits = np.unique(src[component[src] & ~component[dest]])
+    return int(exits[0]) if len(exits) == 1 else None
+
+
+def _out_lists(numnodes, src, dest):
+    order = np.argsort(src, kind="stable")
+    bounds = np.searchsorted(src[order], np.arange(numnodes + 1))
+    succ = dest[order].tolist()
+    return [succ[lo:hi] for (lo, hi) in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+
+# The node a depth first search of the whole graph finishes last, which is
+# in a source component (the first pass of Kosaraju's algorithm).
+def _last_finished(numnodes, used, src, dest):
+    out = _out_lists(numnodes, src, dest)
+    seen = np.zeros(numnodes, dtype=bool)
+    last = None
+    for root in np.flatnonzero(used).tolist():
+        if seen[root]:
             continue
-
-        print("c: %s\n" % (c, ))
-        prunednfa.connect(old_id_to_new_node[c.src.idx],
-                          c.edge,
-                          old_id_to_new_node[c.dest.idx])
-
-    # TODO: start node is node with no incoming edge
-
-    # TODO: end node is node with no outgoing edge
-
-    return prunednfa
\ No newline at end of file
+        seen[root] = True
+        stack = [(root, iter(out[root]))]
+        while stack:
+            (v, it) = stack[-1]
+            for w in it:
+                if not seen[w]:
+                    seen[w] = True
+                    stack.append((w, iter(out[w])))
+                    break
+            else:
+                stack.pop()
+                last = v
+    return last
+
+
+def _reachable(numnodes, root, src, dest):
+    reached = np.zeros(numnodes, dtype=bool)
+    reached[root] = True
+    frontier = reached.copy()
+    while frontier.any():
+        step = np.zeros(numnodes, dtype=bool)
+        step[dest[frontier[src]]] = True
+        frontier = step & ~reached
+        reached |= step
+    return reached
+
+
+def _nfa_from_adj_edges(numnodes, src, label, dest, start, end):
+    (guessed_start, guessed_end) = _infer_start_end(numnodes, src, dest)
+    return NFA.from_edges(numnodes, src, label, dest,
+                          start if start is not None else guessed_start,
+                          end if end is not None else guessed_end)
+
+
+# Builds an NFA with one node per row of `adj` and one edge per cell that is
+# not a None edge, in time proportional to the number of edges. `adj` can be
+# a nested list, a 2d numpy array or a scipy.sparse matrix.
+def nfa_from_adjacency_matrix(adj, start=None, end=None):
+    if hasattr(adj, "tocoo"):
+        coo = adj.tocoo()
+        (numnodes, src, dest, label) = (coo.shape[0], coo.row, coo.col, coo.data)
+        real = label != EdgeType._NONE_EDGE_VAL
+        (src, dest, label) = (src[real], dest[real], label[real])
+    else:
+        adj = np.asarray(adj)
+        numnodes = len(adj)
+        (src, dest) = np.nonzero(adj)
+        label = adj[src, dest]
+
+    assert numnodes > 0
+    assert adj.shape == (numnodes, numnodes), "adjacency matrix is not square"
+
+    return _nfa_from_adj_edges(numnodes, src, label, dest, start, end)
+
+
+# Batch version of nfa_from_adjacency_matrix, for a (batch, N, N) tensor such
+# as the output of adj_tensor_from_nfas, for the (batch, N, 2 * bandwidth + 1)
+# output of adj_banded_from_nfas, or for the coo / csr output of
+# adj_sparse_from_nfas together with the batch size and N. starts / ends,
+# when given, are the start and end node of every NFA (None to infer it).
+def nfas_from_adj_tensor(adj, batch_size=None, num_nodes=None, format="dense",
+                         starts=None, ends=None):
+    if format == "dense":
+        adj = np.asarray(adj)
+        assert adj.ndim == 3 and adj.shape[1] == adj.shape[2], \
+            "expected a (batch, N, N) tensor, got %s" % (adj.shape, )
+        (batch_size, num_nodes) = adj.shape[:2]
+        (batch, src, dest) = np.nonzero(adj)
+        label = adj[batch, src, dest]
+    elif format == "banded":
+        adj = np.asarray(adj)
+        assert adj.ndim == 3 and adj.shape[2] % 2 == 1, \
+            "expected a (batch, N, 2 * bandwidth + 1) tensor, got %s" % (adj.shape, )
+        (batch_size, num_nodes) = adj.shape[:2]
+        (batch, src, k) = np.nonzero(adj)
+        label = adj[batch, src, k]
+        dest = src + k - adj.shape[2] // 2
+    elif format == "coo":
+        (batch, src, dest, label) = adj
+    elif format == "csr":
+        (indptr, dest, label) = adj
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        (batch, src) = np.divmod(rows, num_nodes)
+    else:
+        raise RuntimeError("unknown adjacency format %s" % (format, ))
+
+    assert batch_size is not None and num_nodes is not None
+    starts = [None] * batch_size if starts is None else list(starts)
+    ends = [None] * batch_size if ends is None else list(ends)
+    assert len(starts) == batch_size and len(ends) == batch_size, \
+        "one start and end per NFA"
+
+    # np.nonzero and both sparse formats are sorted by batch
+    bounds = np.searchsorted(batch, np.arange(batch_size + 1))
+    return [_nfa_from_adj_edges(num_nodes,
+                                src[lo:hi], label[lo:hi], dest[lo:hi],
+                                start, end)
+            for (lo, hi, start, end) in zip(bounds[:-1].tolist(), bounds[1:].tolist(),
+                                            starts, ends)]
+
+
+# Drops None edges and the nodes no edge touches, renumbering the rest in
+# increasing order. Start and end nodes are kept when set, and inferred when
+# not.
+def nfa_prune(nfa):
+    (src, label, dest) = nfa.edges
+    real = label != EdgeType._NONE_EDGE_VAL
+    (src, label, dest) = (src[real], label[real], dest[real])
+
+    used = np.zeros(nfa.numnodes, dtype=bool)
+    used[src] = True
+    used[dest] = True
+    new_idx = np.cumsum(used) - 1
+
+    def renumber(node):
+        if node is None or not used[node.idx]:
+            return None
+        return int(new_idx[node.idx])
+
+    return _nfa_from_adj_edges(int(used.sum()), new_idx[src], label, new_idx[dest],
+                               renumber(nfa.start_node), renumber(nfa.end_node))
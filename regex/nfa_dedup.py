@@ -0,0 +1,252 @@
+import os
+import struct
+
+import numpy as np
+
+from .nfa import _batch_edges
+
+# Structural fingerprints of NFAs, and an on-disk set of them, to drop
+# duplicate and isomorphic NFAs from a stream of generated ones.
+#
+# A fingerprint is a 64 bit Weisfeiler-Lehman hash. Every node starts with
+# a colour saying whether it is the start and / or end node; a round gives
+# every node a new colour from its old one, the multiset of (label, colour)
+# over its out edges and the multiset over its in edges; after the rounds,
+# the fingerprint hashes the multiset of colours with the numbers of nodes
+# and edges. Multisets are hashed as sums of mixed hashes, so nothing
+# depends on node ids: renumbered NFAs (say nfa_order.nfa_relabel) get the
+# same fingerprint. The converse does not hold, WL can't tell some
+# non-isomorphic graphs apart and hashes collide, so a fingerprint match is
+# "almost certainly the same automaton", not a proof.
+#
+# Unlike NFA.signature, which is the minimal DFA of the language and can be
+# exponential to compute, this is linear in the edges per round, and
+# computed for many NFAs at once.
+DEFAULT_WL_ROUNDS = 3
+
+_EDGE_OUT = np.uint64(0x9E3779B97F4A7C15)
+_EDGE_IN = np.uint64(0xC2B2AE3D27D4EB4F)
+_COLOUR = np.uint64(0x165667B19E3779F9)
+
+
+# splitmix64 finaliser, elementwise on uint64 arrays
+def _mix(x):
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+# uint64 fingerprint of every NFA
+def nfa_fingerprints(nfas, rounds=DEFAULT_WL_ROUNDS):
+    sizes = np.array([n.numnodes for n in nfas], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    num_nodes = int(offsets[-1])
+
+    (batch, src, label, dest) = _batch_edges(nfas)
+    src = src + offsets[batch]
+    dest = dest + offsets[batch]
+    label = _mix(label.astype(np.uint64) + np.uint64(1))
+
+    colour = np.ones(num_nodes, dtype=np.uint64)
+    for (i, n) in enumerate(nfas):
+        if n.start_node is not None:
+            colour[offsets[i] + n.start_node.idx] += np.uint64(2)
+        if n.end_node is not None:
+            colour[offsets[i] + n.end_node.idx] += np.uint64(4)
+    colour = _mix(colour)
+
+    for _ in range(rounds):
+        out_sum = np.zeros(num_nodes, dtype=np.uint64)
+        np.add.at(out_sum, src, _mix(colour[dest] ^ label ^ _EDGE_OUT))
+        in_sum = np.zeros(num_nodes, dtype=np.uint64)
+        np.add.at(in_sum, dest, _mix(colour[src] ^ label ^ _EDGE_IN))
+        colour = _mix(colour * _COLOUR + _mix(out_sum) + _mix(in_sum ^ _EDGE_IN))
+
+    graph = np.repeat(np.arange(len(nfas)), sizes)
+    total = np.zeros(len(nfas), dtype=np.uint64)
+    np.add.at(total, graph, _mix(colour ^ _COLOUR))
+    numedges = np.array([n.numedges for n in nfas], dtype=np.uint64)
+    return _mix(total + _mix(sizes.astype(np.uint64)) + _mix(numedges ^ _EDGE_OUT))
+
+
+def nfa_fingerprint(nfa, rounds=DEFAULT_WL_ROUNDS):
+    return int(nfa_fingerprints([nfa], rounds)[0])
+
+
+# Fingerprints kept by a new index before it first grows.
+DEFAULT_INDEX_CAPACITY = 1 << 20
+
+# the table doubles when it gets fuller than this
+_MAX_LOAD = 0.7
+
+# File layout, little endian:
+#
+#   8s magic, u32 version, u32 reserved (0), u64 capacity (a power of 2),
+#   u64 number of fingerprints
+#   u64 table[capacity], 0 for an empty slot
+#
+# An open addressing hash table with linear probing. Fingerprint 0 is
+# stored as 1, as 0 marks empty slots.
+INDEX_MAGIC = b"RGXFPIX\0"
+INDEX_FORMAT_VERSION = 1
+
+_INDEX_HEADER = struct.Struct("<8sIIQQ")
+
+# fingerprints moved per chunk when the table grows
+_GROW_CHUNK = 1 << 20
+
+
+# A set of fingerprints in a memory mapped file, that persists across runs:
+# a stream of any length is deduplicated with only the table's pages in
+# memory, and the OS decides how many of those. 10^7 fingerprints are a
+# table of 2^24 slots, 128 MB on disk.
+#
+# add_many is vectorised, a batch of fingerprints is a few numpy passes
+# rather than a Python loop. The count in the header is written by flush()
+# and close(); an index that was not closed reopens with a stale count but
+# the table intact.
+class FingerprintIndex:
+    def __init__(self, path, capacity=DEFAULT_INDEX_CAPACITY):
+        self._path = path
+        if os.path.exists(path):
+            self._open()
+        else:
+            assert capacity > 0 and capacity & (capacity - 1) == 0, \
+                "capacity %s is not a power of 2" % (capacity, )
+            _create_index(path, capacity)
+            self._open()
+
+    def _open(self):
+        with open(self._path, "rb") as f:
+            header = f.read(_INDEX_HEADER.size)
+        if len(header) < _INDEX_HEADER.size:
+            raise RuntimeError("%s: too short for a fingerprint index" % (self._path, ))
+        (magic, version, _, capacity, count) = _INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC:
+            raise RuntimeError("%s: not a fingerprint index" % (self._path, ))
+        if version != INDEX_FORMAT_VERSION:
+            raise RuntimeError("%s: fingerprint index version %s, expected %s" %
+                               (self._path, version, INDEX_FORMAT_VERSION))
+        self._table = np.memmap(self._path, dtype="<u8", mode="r+",
+                                offset=_INDEX_HEADER.size, shape=(capacity, ))
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def capacity(self):
+        return len(self._table)
+
+    def __contains__(self, fingerprint):
+        return bool(self.contains_many([fingerprint])[0])
+
+    # True for the fingerprints that are in the index
+    def contains_many(self, fingerprints):
+        keys = _keys(fingerprints)
+        (found, _) = self._probe(keys)
+        return found
+
+    # adds the fingerprints, and returns True for the ones that were new:
+    # not in the index, and not earlier in `fingerprints`
+    def add_many(self, fingerprints):
+        keys = _keys(fingerprints)
+        new = np.zeros(len(keys), dtype=bool)
+        (unique, first) = np.unique(keys, return_index=True)
+
+        if self._count + len(unique) > _MAX_LOAD * self.capacity:
+            self._grow(self._count + len(unique))
+
+        # probe for every distinct key; among the keys that reach the same
+        # empty slot the first takes it and the others probe on
+        (found, slot) = self._probe(unique)
+        pending = np.flatnonzero(~found)
+        mask = np.uint64(self.capacity - 1)
+        while len(pending) > 0:
+            (slots, take) = np.unique(slot[pending], return_index=True)
+            self._table[slots] = unique[pending[take]]
+            new[first[pending[take]]] = True
+            self._count += len(take)
+
+            rest = np.ones(len(pending), dtype=bool)
+            rest[take] = False
+            pending = pending[rest]
+            (found_rest, slot_rest) = self._probe(unique[pending],
+                                                  (slot[pending] + np.uint64(1)) & mask)
+            slot[pending] = slot_rest
+            pending = pending[~found_rest]
+        return new
+
+    def add(self, fingerprint):
+        return bool(self.add_many([fingerprint])[0])
+
+    # (found, slot): whether each key is in the table, and if not the
+    # first empty slot from `start` (by default its home slot) on
+    def _probe(self, keys, start=None):
+        mask = np.uint64(self.capacity - 1)
+        slot = _home(keys, mask) if start is None else start.copy()
+        found = np.zeros(len(keys), dtype=bool)
+        live = np.arange(len(keys))
+        while len(live) > 0:
+            at = self._table[slot[live]]
+            found[live[at == keys[live]]] = True
+            live = live[(at != 0) & (at != keys[live])]
+            slot[live] = (slot[live] + np.uint64(1)) & mask
+        return (found, slot)
+
+    # rehashes into a table with room for `count` fingerprints, through a
+    # temporary file, chunk by chunk
+    def _grow(self, count):
+        capacity = self.capacity
+        while count > _MAX_LOAD * capacity:
+            capacity *= 2
+
+        tmp = self._path + ".tmp"
+        _create_index(tmp, capacity)
+        bigger = FingerprintIndex(tmp)
+        for lo in range(0, self.capacity, _GROW_CHUNK):
+            keys = np.asarray(self._table[lo:lo + _GROW_CHUNK])
+            bigger.add_many(keys[keys != 0])
+        bigger.close()
+
+        self._table.flush()
+        del self._table
+        os.replace(tmp, self._path)
+        self._open()
+
+    def flush(self):
+        self._table.flush()
+        with open(self._path, "r+b") as f:
+            f.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_FORMAT_VERSION, 0,
+                                       self.capacity, self._count))
+
+    def close(self):
+        if self._table is None:
+            return
+        self.flush()
+        self._table = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _create_index(path, capacity):
+    with open(path, "wb") as f:
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_FORMAT_VERSION, 0, capacity, 0))
+        f.truncate(_INDEX_HEADER.size + 8 * capacity)
+
+
+def _keys(fingerprints):
+    keys = np.asarray(fingerprints, dtype=np.uint64).reshape(-1)
+    return np.where(keys == 0, np.uint64(1), keys)
+
+
+# fingerprints are hashes already, but nearby ones (say from a bad hash)
+# would cluster under linear probing; mix them once more
+def _home(keys, mask):
+    return _mix(keys ^ _EDGE_IN) & mask
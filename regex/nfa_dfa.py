@@ -0,0 +1,199 @@
+import numpy as np
+
+from .nfa import EdgeType
+from .nfa_match import NUM_SYMBOLS, NFAMatcher, encode_strings, epsilon_closures
+
+# DFA states kept in the cache before it is flushed.
+DEFAULT_MAX_STATES = 4096
+
+# A flush that comes after fewer than this many characters per cached state
+# counts as thrashing; after _MAX_THRASHING_RESETS of those the DFA gives up
+# and matching falls back to NFA simulation, like RE2 does.
+_MIN_CHARS_PER_STATE = 10
+_MAX_THRASHING_RESETS = 3
+
+_UNKNOWN = -1
+
+
+# The subset construction only has to track the nodes that a symbol edge
+# leaves from, plus the end node: the sets are epsilon closed, so every
+# other node is implied by these. Returns (start set, {node: {code: set}})
+# over those nodes.
+#
+# starts and ends replace the start and end node with several, for an NFA
+# that is a union of others; the start set is then the closure of all the
+# starts.
+def subset_moves(nfa, starts=None, ends=None):
+    if starts is None or ends is None:
+        assert nfa.start_node is not None and nfa.end_node is not None, \
+            "NFA has no start or end node"
+    starts = [nfa.start_node.idx] if starts is None else starts
+    ends = [nfa.end_node.idx] if ends is None else ends
+
+    closures = epsilon_closures(nfa)
+
+    (src, label, dest) = nfa.edges
+    on_symbol = label > EdgeType._EPSILON_EDGE_VAL
+    kept = set(src[on_symbol].tolist())
+    kept.update(ends)
+
+    def restrict(nodes):
+        return frozenset(j for j in nodes if j in kept)
+
+    moves = dict((i, {}) for i in kept)
+    for (s, c, d) in zip(src[on_symbol].tolist(), label[on_symbol].tolist(),
+                         dest[on_symbol].tolist()):
+        moves[s][c] = moves[s].get(c, frozenset()) | restrict(closures[d])
+
+    return (restrict(j for i in starts for j in closures[i]), moves)
+
+
+# On-the-fly subset construction, in the style of RE2.
+#
+# DFA states are built the first time some input reaches them, and their
+# transitions are memoised in a (num_states, NUM_SYMBOLS) table with
+# _UNKNOWN for the ones not computed yet. A batch of strings is advanced one
+# position at a time with a single gather into that table, so once the
+# states an input needs are cached, matching costs one table lookup per
+# character.
+#
+# The cache holds at most max_states states. When it overflows it is
+# flushed, keeping only the states that strings are currently in. If it
+# keeps overflowing without making progress the DFA stops and hands the
+# input to NFAMatcher instead.
+class LazyDFA:
+    def __init__(self, nfa, max_states=DEFAULT_MAX_STATES):
+        assert nfa.start_node is not None
+        assert nfa.end_node is not None
+        assert max_states is None or max_states >= 2
+
+        self._nfa = nfa
+        self._init_states(subset_moves(nfa), [nfa.end_node.idx], max_states)
+
+    # ends: the NFA nodes that make a state accepting
+    def _init_states(self, start_and_moves, ends, max_states):
+        self._max_states = max_states
+        (self._start_set, self._moves) = start_and_moves
+        self._ends = frozenset(ends)
+
+        self._nfa_matcher = None
+        self._num_resets = 0
+        self._num_thrashing_resets = 0
+        self._clear()
+
+    def _clear(self):
+        self._ids = {}
+        self._sets = []
+        self._next = np.full((16, NUM_SYMBOLS), _UNKNOWN, dtype=np.int32)
+        self._accepting = np.zeros(16, dtype=bool)
+        self._chars_since_reset = 0
+        self._start = self._intern(self._start_set)
+
+    @property
+    def num_states(self):
+        return len(self._sets)
+
+    @property
+    def num_resets(self):
+        return self._num_resets
+
+    # True once the cache thrashed and matching is done by NFA simulation
+    @property
+    def gave_up(self):
+        return self._nfa_matcher is not None
+
+    def _intern(self, nodes):
+        idx = self._ids.get(nodes)
+        if idx is not None:
+            return idx
+
+        idx = len(self._sets)
+        if idx == len(self._next):
+            self._next = np.concatenate([self._next, np.full_like(self._next, _UNKNOWN)])
+            self._accepting = np.concatenate([self._accepting,
+                                              np.zeros_like(self._accepting)])
+        self._ids[nodes] = idx
+        self._sets.append(nodes)
+        self._accepting[idx] = not self._ends.isdisjoint(nodes)
+        return idx
+
+    def _step_set(self, nodes, code):
+        out = set()
+        for i in nodes:
+            succs = self._moves[i].get(code)
+            if succs is not None:
+                out.update(succs)
+        return frozenset(out)
+
+    def _fill(self, states, codes):
+        pairs = np.unique(states.astype(np.int64) * NUM_SYMBOLS + codes)
+        for p in pairs.tolist():
+            (s, c) = divmod(p, NUM_SYMBOLS)
+            self._next[s, c] = self._intern(self._step_set(self._sets[s], c))
+
+    # flush the cache, keeping the states in `live`. Returns the new ids of
+    # `live`.
+    def _reset(self, live):
+        if self._chars_since_reset < _MIN_CHARS_PER_STATE * self._max_states:
+            self._num_thrashing_resets += 1
+        self._num_resets += 1
+
+        (old_ids, inverse) = np.unique(live, return_inverse=True)
+        live_sets = [self._sets[i] for i in old_ids.tolist()]
+        self._clear()
+        new_ids = np.array([self._intern(s) for s in live_sets], dtype=np.int32)
+        return new_ids[inverse]
+
+    def _run(self, codes, lengths):
+        states = np.full(len(codes), self._start, dtype=np.int32)
+
+        # rows are sorted by length, so the rows still running at position t
+        # are a suffix
+        first_running = np.searchsorted(lengths, np.arange(codes.shape[1]), side="right")
+        for t in range(codes.shape[1]):
+            lo = first_running[t]
+            (running, c) = (states[lo:], codes[lo:, t])
+
+            flat = running * NUM_SYMBOLS + c
+            nxt = np.take(self._next, flat)
+            missing = nxt == _UNKNOWN
+            if missing.any():
+                self._fill(running[missing], c[missing])
+                nxt = np.take(self._next, flat)
+            states[lo:] = nxt
+            self._chars_since_reset += len(running)
+
+            if self._max_states is not None and self.num_states > self._max_states:
+                states = self._reset(states)
+                if self._num_thrashing_resets >= _MAX_THRASHING_RESETS:
+                    return None
+
+        return states
+
+    # the state every string ends in, or None if the DFA gave up on the way
+    def _final_states(self, codes, lengths):
+        order = np.argsort(lengths, kind="stable")
+        states = self._run(codes[order], lengths[order])
+        if states is None:
+            return None
+        out = np.empty(len(codes), dtype=states.dtype)
+        out[order] = states
+        return out
+
+    def match_codes(self, codes, lengths):
+        codes = np.asarray(codes)
+        lengths = np.asarray(lengths)
+
+        if self._nfa_matcher is None:
+            states = self._final_states(codes, lengths)
+            if states is not None:
+                return self._accepting[states]
+            self._nfa_matcher = NFAMatcher(self._nfa)
+
+        return self._nfa_matcher.match_codes(codes, lengths)
+
+    def match_batch(self, strings):
+        return self.match_codes(*encode_strings(strings))
+
+    def match(self, s):
+        return bool(self.match_batch([s])[0])
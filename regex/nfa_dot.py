@@ -0,0 +1,112 @@
+import io
+import os
+
+import numpy as np
+
+from .nfa import EdgeType
+from .parallel import parallel_map
+
+# DOT text for NFAs, written straight from the edge arrays: a few string
+# joins per chunk of edges rather than a graphviz method call per node and
+# edge, and streamed to the output, so NFAs with any number of nodes are
+# cheap to dump. graphviz (the Python package, and its `dot` binary) is
+# only needed to turn the text into an image, and only imported then.
+#
+# The graph looks like nfa.nfa_to_dot's: left to right, the start node a
+# double circle, the end node filled grey, edge labels as in
+# str(EdgeType).
+
+# lines formatted per chunk, bounds the temporaries for huge NFAs
+_LINES_PER_CHUNK = 1 << 16
+
+_HEADER = ("// NFA\n"
+           "digraph {\n"
+           "\tgraph [rankdir=LR size=\"8,5\"]\n"
+           "\tgraph [overlap=false splines=true]\n"
+           "\tnode [shape=circle]\n"
+           "\tgraph [fontname=Courier]\n"
+           "\tnode [fontname=Courier]\n"
+           "\tedge [fontname=Courier]\n")
+_FOOTER = "}\n"
+
+
+def _quote(s):
+    return '"%s"' % (s.replace("\\", "\\\\").replace('"', '\\"'), )
+
+
+# the edge attribute of every label value
+_XLABELS = [" [xlabel=%s]\n" % (_quote(str(EdgeType(v))), ) for v in range(256)]
+
+
+# the lines between the header and footer, in chunks of text
+def dot_body(nfa):
+    start = None if nfa.start_node is None else nfa.start_node.idx
+    end = None if nfa.end_node is None else nfa.end_node.idx
+
+    for lo in range(0, nfa.numnodes, _LINES_PER_CHUNK):
+        yield "".join(["\t%d\n" % (i, ) for i in range(lo, min(lo + _LINES_PER_CHUNK,
+                                                              nfa.numnodes))])
+    # declared again with their attributes, which DOT merges
+    for i in sorted({start, end} - {None}):
+        yield "\t%d%s\n" % (i, _node_attrs(i, start, end))
+
+    edges = nfa.edge_array
+    for lo in range(0, len(edges), _LINES_PER_CHUNK):
+        (src, label, dest) = np.asarray(edges[lo:lo + _LINES_PER_CHUNK]).T.tolist()
+        yield "".join(["\t%d -> %d%s" % (s, d, _XLABELS[l])
+                       for (s, l, d) in zip(src, label, dest)])
+
+
+def _node_attrs(i, start, end):
+    attrs = []
+    if i == start:
+        attrs.append("shape=doublecircle")
+    if i == end:
+        attrs.append("color=\"#CCCCCC\" style=filled")
+    return " [%s]" % (" ".join(attrs), )
+
+
+# writes the DOT text of an NFA to `out`, a path or a text file object
+def write_dot(nfa, out):
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "w") as f:
+            write_dot(nfa, f)
+        return
+    out.write(_HEADER)
+    for chunk in dot_body(nfa):
+        out.write(chunk)
+    out.write(_FOOTER)
+
+
+def dot_source(nfa):
+    out = io.StringIO()
+    write_dot(nfa, out)
+    return out.getvalue()
+
+
+# Writes the DOT text of an NFA to `path` and renders it with graphviz to
+# path + "." + format next to it. Returns the path of the image.
+def render_nfa(nfa, path, format="svg"):
+    write_dot(nfa, path)
+    import graphviz
+    return graphviz.render("dot", format, path)
+
+
+def _write_one(job):
+    (nfa, path, format) = job
+    if format is None:
+        write_dot(nfa, path)
+        return path
+    return render_nfa(nfa, path, format)
+
+
+# Batch mode: the DOT text of nfas[i] to paths[i], rendered to `format`
+# when one is given, on num_workers worker processes (see
+# parallel.parallel_map) or in this one when num_workers is None. Returns
+# the paths of what was written, in order. `nfas` can be any iterable, say
+# an nfa_io.NFAFile, and is consumed as the workers keep up.
+def write_dots(nfas, paths, num_workers=None, format=None):
+    jobs = ((n, p, format) for (n, p) in zip(nfas, paths))
+    if num_workers is None:
+        return [_write_one(j) for j in jobs]
+    return list(parallel_map(_write_one, jobs, num_workers))
@@ -0,0 +1,145 @@
+import os
+import struct
+
+import numpy as np
+
+from .nfa import NFA, _NO_NODE
+
+# Binary format for NFAs, little endian throughout:
+#
+#   file header   8s magic, u32 version, u32 reserved (0)
+#   records       one per NFA:
+#                   i32 num nodes, i32 num edges, i32 start, i32 end
+#                   (-1 for no start / end), then num edges (src, label,
+#                   dest) rows of 3 x i32, the layout of NFA's own edge
+#                   array
+#   index         u64 offset of each record, then the offset the index
+#                 starts at
+#   footer        u64 offset of the index, u64 number of NFAs
+#
+# A single NFA (nfa_to_bytes) is the file header and one record, without
+# the index and footer. Records are multiples of 4 bytes long, so the edges
+# of every record are aligned for int32 and load as a view into the buffer,
+# a file that is memory mapped included: no copy, and no Python object per
+# edge.
+MAGIC = b"RGXNFA\0\0"
+FORMAT_VERSION = 1
+
+_FILE_HEADER = struct.Struct("<8sII")
+_RECORD_HEADER = struct.Struct("<iiii")
+_FOOTER = struct.Struct("<QQ")
+
+
+def _check_header(buf, what):
+    if len(buf) < _FILE_HEADER.size:
+        raise RuntimeError("%s: too short for an NFA file" % (what, ))
+    (magic, version, _) = _FILE_HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise RuntimeError("%s: not an NFA file" % (what, ))
+    if version != FORMAT_VERSION:
+        raise RuntimeError("%s: NFA format version %s, expected %s" %
+                           (what, version, FORMAT_VERSION))
+
+
+def _record(nfa):
+    start = _NO_NODE if nfa.start_node is None else nfa.start_node.idx
+    end = _NO_NODE if nfa.end_node is None else nfa.end_node.idx
+    return [_RECORD_HEADER.pack(nfa.numnodes, nfa.numedges, start, end),
+            nfa.edge_array.astype("<i4", copy=False).tobytes()]
+
+
+# the NFA of the record at `offset` in buf, and the offset after it
+def _read_record(buf, offset):
+    (numnodes, numedges, start, end) = _RECORD_HEADER.unpack_from(buf, offset)
+    offset += _RECORD_HEADER.size
+    edges = np.frombuffer(buf, dtype="<i4", count=3 * numedges, offset=offset)
+    nfa = NFA.from_edge_array(numnodes, edges.reshape(numedges, 3),
+                              None if start == _NO_NODE else start,
+                              None if end == _NO_NODE else end)
+    return (nfa, offset + 12 * numedges)
+
+
+def nfa_to_bytes(nfa):
+    return b"".join([_FILE_HEADER.pack(MAGIC, FORMAT_VERSION, 0)] + _record(nfa))
+
+
+# buf is anything with the buffer protocol. The NFA's edges are a read-only
+# view into it.
+def nfa_from_bytes(buf):
+    _check_header(buf, "buffer")
+    return _read_record(buf, _FILE_HEADER.size)[0]
+
+
+# Appends NFAs to a new file one at a time, without keeping them around;
+# the index is written by close(), and a file without one (say from a
+# writer that was never closed) can't be opened.
+class NFAWriter:
+    def __init__(self, path):
+        self._file = open(path, "wb")
+        self._file.write(_FILE_HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+        self._offsets = []
+        self._offset = _FILE_HEADER.size
+
+    def __len__(self):
+        return len(self._offsets)
+
+    # returns the index of the NFA in the file
+    def write(self, nfa):
+        self._offsets.append(self._offset)
+        for chunk in _record(nfa):
+            self._file.write(chunk)
+            self._offset += len(chunk)
+        return len(self._offsets) - 1
+
+    def close(self):
+        if self._file is None:
+            return
+        index = np.array(self._offsets + [self._offset], dtype="<u8")
+        self._file.write(index.tobytes())
+        self._file.write(_FOOTER.pack(self._offset, len(self._offsets)))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_nfas(path, nfas):
+    with NFAWriter(path) as w:
+        for n in nfas:
+            w.write(n)
+
+
+# Read side of NFAWriter. The file is memory mapped, and the NFAs it hands
+# out are views into it, loaded when they are asked for.
+class NFAFile:
+    def __init__(self, path):
+        self._path = path
+        if os.path.getsize(path) < _FILE_HEADER.size + _FOOTER.size:
+            raise RuntimeError("%s: too short for an NFA file" % (path, ))
+        self._buf = np.memmap(path, dtype=np.uint8, mode="r")
+        _check_header(self._buf, path)
+
+        (index_at, count) = _FOOTER.unpack_from(self._buf, len(self._buf) - _FOOTER.size)
+        if index_at + 8 * (count + 1) + _FOOTER.size != len(self._buf):
+            raise RuntimeError("%s: bad index, was the writer closed?" % (path, ))
+        self._offsets = np.frombuffer(self._buf, dtype="<u8", count=count + 1, offset=index_at)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("NFA %s of %s" % (i, len(self)))
+        return _read_record(self._buf, int(self._offsets[i]))[0]
+
+    def __iter__(self):
+        offset = _FILE_HEADER.size
+        for _ in range(len(self)):
+            (nfa, offset) = _read_record(self._buf, offset)
+            yield nfa
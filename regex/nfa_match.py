@@ -0,0 +1,219 @@
+import numpy as np
+
+from .nfa import EdgeType
+
+# Symbols are 7 bit ascii codes, anything else is mapped to a symbol that
+# has no transitions.
+NUM_SYMBOLS = 128
+
+_WORD_BITS = 64
+
+# upper bound on the size of the per-symbol transition tables. Bigger NFAs
+# use narrower chunks (fewer states per table lookup) to stay under it.
+_MAX_TABLE_BYTES = 64 * 1024 * 1024
+
+# number of strings advanced together. Bounds the (rows, chunks, words)
+# temporary built at every step.
+_ROWS_PER_BLOCK = 16384
+
+
+def encode_strings(strings):
+    lengths = np.fromiter((len(s) for s in strings), dtype=np.int64,
+                          count=len(strings))
+    maxlen = int(lengths.max()) if len(strings) > 0 else 0
+
+    flat = np.frombuffer("".join(strings).encode("utf-32-le"), dtype=np.uint32)
+    flat = np.where(flat < NUM_SYMBOLS, flat, EdgeType._NONE_EDGE_VAL)
+
+    codes = np.zeros((len(strings), maxlen), dtype=np.uint8)
+    codes[np.arange(maxlen)[None, :] < lengths[:, None]] = flat
+    return (codes, lengths)
+
+
+# for every node, the sorted tuple of nodes reachable from it through
+# epsilon edges, itself included. A BFS per node, linear in the size of the
+# closures rather than cubic in the number of nodes.
+def epsilon_closures(nfa):
+    (src, label, dest) = nfa.edges
+    eps = label == EdgeType._EPSILON_EDGE_VAL
+    eps_succs = [[] for _ in range(nfa.numnodes)]
+    for (s, d) in zip(src[eps].tolist(), dest[eps].tolist()):
+        eps_succs[s].append(d)
+
+    closures = []
+    for i in range(nfa.numnodes):
+        seen = {i}
+        todo = [i]
+        while todo:
+            for j in eps_succs[todo.pop()]:
+                if j not in seen:
+                    seen.add(j)
+                    todo.append(j)
+        closures.append(tuple(sorted(seen)))
+    return closures
+
+
+# (indptr, cols): closures as CSR over the kept states, the columns of node
+# i being cols[indptr[i]:indptr[i + 1]], with row_of_node mapping nodes to
+# states and -1 for the nodes that aren't kept
+def _kept_closures(closures, row_of_node):
+    lengths = np.fromiter((len(c) for c in closures), dtype=np.int64, count=len(closures))
+    flat = np.fromiter((j for c in closures for j in c), dtype=np.int64,
+                       count=int(lengths.sum()))
+    owner = np.repeat(np.arange(len(closures)), lengths)
+    cols = row_of_node[flat]
+    owner = owner[cols >= 0]
+    indptr = np.zeros(len(closures) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner, minlength=len(closures)), out=indptr[1:])
+    return (indptr, cols[cols >= 0])
+
+
+# the columns of every node in `nodes`, back to back, and how many each has
+def _gather(indptr, cols, nodes):
+    counts = indptr[nodes + 1] - indptr[nodes]
+    starts = np.repeat(indptr[nodes] - (np.cumsum(counts) - counts), counts)
+    return (cols[starts + np.arange(int(counts.sum()))], counts)
+
+
+# sets bit cols[i] of row rows[i] of the (num_rows, num_words) uint64 bitsets
+def _set_bits(out, rows, cols):
+    np.bitwise_or.at(out, (rows, cols // _WORD_BITS),
+                     np.left_shift(np.uint64(1), (cols % _WORD_BITS).astype(np.uint64)))
+
+
+# Runs an NFA over many strings at once.
+#
+# The state set of every string is a bitset of num_words uint64 words. A
+# step maps (state set, symbol) to the next state set with the epsilon
+# closure already applied. To avoid a loop over the set bits, the state set
+# is cut into chunks of chunk_bits states, and for every (symbol, chunk,
+# chunk value) the table holds the union of the successors of the states in
+# that chunk value. A step is then one gather + OR reduction over the
+# chunks, for the whole batch at once.
+#
+# Narrower chunks keep the tables under _MAX_TABLE_BYTES; an NFA whose
+# tables don't fit even with 1 bit chunks, some thousands of states that
+# symbols leave from, is a RuntimeError.
+class NFAMatcher:
+    def __init__(self, nfa):
+        assert nfa.start_node is not None
+        assert nfa.end_node is not None
+
+        (src, label, dest) = nfa.edges
+        on_symbol = label > EdgeType._EPSILON_EDGE_VAL
+
+        # The state sets are epsilon closed, so only the states a symbol
+        # can leave from, and the end node, decide what happens next.
+        # Everything else is dropped from the bitsets.
+        kept = np.union1d(src[on_symbol], [nfa.end_node.idx])
+        row_of_node = np.full(nfa.numnodes, -1, dtype=np.int64)
+        row_of_node[kept] = np.arange(len(kept))
+        (indptr, cols) = _kept_closures(epsilon_closures(nfa), row_of_node)
+
+        self._num_words = -(-len(kept) // _WORD_BITS)
+        num_states = self._num_words * _WORD_BITS
+
+        alphabet = np.unique(label[on_symbol])
+        # symbol ids: 0..len(alphabet) - 1 real symbols, then one symbol with
+        # no transitions, then padding which keeps the state as it is.
+        self._dead_symbol = len(alphabet)
+        self._pad_symbol = len(alphabet) + 1
+        self._symbol_of_code = np.full(NUM_SYMBOLS, self._dead_symbol, dtype=np.intp)
+        self._symbol_of_code[alphabet] = np.arange(len(alphabet))
+
+        num_symbols = len(alphabet) + 2
+        self._chunk_bits = 8
+        while self._chunk_bits > 1 and self._table_bytes(num_symbols) > _MAX_TABLE_BYTES:
+            self._chunk_bits //= 2
+        if self._table_bytes(num_symbols) > _MAX_TABLE_BYTES:
+            raise RuntimeError("NFA with %s states and %s symbols needs %s bytes of tables, "
+                               "more than %s" % (len(kept), len(alphabet),
+                                                 self._table_bytes(num_symbols),
+                                                 _MAX_TABLE_BYTES))
+
+        # bitset rows, row r of symbol i the union of the closures of where
+        # the edges on i out of the kept state r go. Built a symbol at a
+        # time, straight into bits: (num_symbols, num_states, num_words)
+        # uint64, at most half the size of the table.
+        rows = np.zeros((num_symbols, num_states, self._num_words), dtype=np.uint64)
+        for (i, c) in enumerate(alphabet):
+            on_c = label == c
+            (to, counts) = _gather(indptr, cols, dest[on_c])
+            _set_bits(rows[i], np.repeat(row_of_node[src[on_c]], counts), to)
+        _set_bits(rows[self._pad_symbol], np.arange(num_states), np.arange(num_states))
+        self._table = self._mk_table(rows)
+
+        (start, _) = _gather(indptr, cols, np.array([nfa.start_node.idx]))
+        self._start = np.zeros(self._num_words, dtype=np.uint64)
+        _set_bits(self._start[None, :], np.zeros(len(start), dtype=np.int64), start)
+        end = row_of_node[nfa.end_node.idx]
+        self._end_word = end // _WORD_BITS
+        self._end_bit = np.uint64(1 << (end % _WORD_BITS))
+
+    def _table_bytes(self, num_symbols):
+        num_chunks = self._num_words * _WORD_BITS // self._chunk_bits
+        return num_symbols * num_chunks * (1 << self._chunk_bits) * self._num_words * 8
+
+    def _mk_table(self, rows):
+        (num_symbols, num_states, num_words) = rows.shape
+        cb = self._chunk_bits
+        self._num_chunks = num_states // cb
+        rows = rows.reshape(num_symbols, self._num_chunks, cb, num_words)
+
+        # filled a bit at a time: the chunk values with bit j set are the
+        # ones below 1 << j, plus row j of the chunk
+        table = np.zeros((num_symbols, self._num_chunks, 1 << cb, num_words), dtype=np.uint64)
+        for j in range(cb):
+            table[:, :, 1 << j:2 << j] = table[:, :, :1 << j] | rows[:, :, j, None]
+
+        # flattened so a lookup is a single np.take over
+        # (symbol * num_chunks + chunk) << chunk_bits | chunk value
+        return table.reshape(-1, num_words)
+
+    def _chunks(self, states):
+        chunks = states.view(np.uint8)
+        if self._chunk_bits == 8:
+            return chunks
+
+        cb = self._chunk_bits
+        shifts = np.arange(0, 8, cb, dtype=np.uint8)
+        chunks = (chunks[:, :, None] >> shifts) & np.uint8((1 << cb) - 1)
+        return chunks.reshape(len(states), -1)
+
+    def _run_block(self, symbols):
+        (num_rows, num_steps) = symbols.shape
+        chunk_ids = np.arange(self._num_chunks)[None, :]
+
+        states = np.repeat(self._start[None, :], num_rows, axis=0)
+        for t in range(num_steps):
+            rows = (symbols[:, t, None] * self._num_chunks + chunk_ids) << self._chunk_bits
+            lookup = np.take(self._table, rows + self._chunks(states), axis=0)
+            states = lookup[:, 0]
+            for k in range(1, self._num_chunks):
+                states |= lookup[:, k]
+
+        return (states[:, self._end_word] & self._end_bit) != 0
+
+    def match_codes(self, codes, lengths):
+        codes = np.asarray(codes)
+        lengths = np.asarray(lengths)
+        matched = np.zeros(len(codes), dtype=bool)
+
+        # similar lengths go in the same block so little work is spent on
+        # padding
+        order = np.argsort(lengths, kind="stable")
+        for lo in range(0, len(order), _ROWS_PER_BLOCK):
+            rows = order[lo:lo + _ROWS_PER_BLOCK]
+            maxlen = int(lengths[rows[-1]])
+
+            symbols = self._symbol_of_code[codes[rows, :maxlen]]
+            symbols[np.arange(maxlen)[None, :] >= lengths[rows, None]] = self._pad_symbol
+            matched[rows] = self._run_block(symbols)
+
+        return matched
+
+    def match_batch(self, strings):
+        return self.match_codes(*encode_strings(strings))
+
+    def match(self, s):
+        return bool(self.match_batch([s])[0])
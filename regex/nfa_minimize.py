@@ -0,0 +1,181 @@
+import collections
+
+from .nfa_dfa import subset_moves
+
+
+# A partial DFA over ascii codes: missing transitions go to an implicit dead
+# state.
+class DFA:
+    def __init__(self, start, accepting, delta):
+        assert len(accepting) == len(delta)
+        assert start is None or 0 <= start < len(delta)
+
+        self._start = start
+        self._accepting = accepting
+        self._delta = delta
+
+    @property
+    def numstates(self):
+        return len(self._delta)
+
+    # None when the language is empty
+    @property
+    def start(self):
+        return self._start
+
+    # list of bool, one per state
+    @property
+    def accepting(self):
+        return self._accepting
+
+    # list of {code: state}, one per state
+    @property
+    def delta(self):
+        return self._delta
+
+    @property
+    def alphabet(self):
+        return sorted(set(c for d in self._delta for c in d))
+
+    def __str__(self):
+        return "start: %s\naccepting: %s\n%s" % (self._start, self._accepting, self._delta)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def dfa_from_nfa(nfa):
+    (start_set, moves) = subset_moves(nfa)
+    end = nfa.end_node.idx
+
+    ids = {start_set: 0}
+    sets = [start_set]
+    delta = []
+
+    for nodes in sets:
+        out = collections.defaultdict(set)
+        for i in nodes:
+            for (c, succs) in moves[i].items():
+                out[c].update(succs)
+
+        d = {}
+        for c in sorted(out):
+            target = frozenset(out[c])
+            if target not in ids:
+                ids[target] = len(sets)
+                sets.append(target)
+            d[c] = ids[target]
+        delta.append(d)
+
+    return DFA(0, [end in s for s in sets], delta)
+
+
+# Hopcroft's partition refinement. States that cannot reach an accepting
+# state are dropped, so the result is the unique minimal partial DFA.
+def dfa_minimize(dfa):
+    alphabet = dfa.alphabet
+    n = dfa.numstates
+    # complete the DFA with an explicit dead state n
+    dead = n
+
+    preds = dict((c, [[] for _ in range(n + 1)]) for c in alphabet)
+    for (q, d) in enumerate(dfa.delta):
+        for c in alphabet:
+            preds[c][d.get(c, dead)].append(q)
+    for c in alphabet:
+        preds[c][dead].append(dead)
+
+    final = set(q for q in range(n) if dfa.accepting[q])
+    nonfinal = set(range(n + 1)) - final
+    blocks = [b for b in (final, nonfinal) if b]
+    block_of = [0] * (n + 1)
+    for (i, b) in enumerate(blocks):
+        for q in b:
+            block_of[q] = i
+
+    work = set(range(len(blocks)))
+    while work:
+        splitter = list(blocks[work.pop()])
+        for c in alphabet:
+            hit = collections.defaultdict(set)
+            for q in splitter:
+                for p in preds[c][q]:
+                    hit[block_of[p]].add(p)
+
+            for (i, inside) in hit.items():
+                if len(inside) == len(blocks[i]):
+                    continue
+
+                blocks[i] -= inside
+                j = len(blocks)
+                blocks.append(inside)
+                for q in inside:
+                    block_of[q] = j
+
+                if i in work or len(inside) <= len(blocks[i]):
+                    work.add(j)
+                else:
+                    work.add(i)
+
+    dead_block = block_of[dead]
+    live = [i for i in range(len(blocks)) if i != dead_block]
+    new_id = dict((b, k) for (k, b) in enumerate(live))
+
+    accepting = [False] * len(live)
+    delta = [None] * len(live)
+    for (b, k) in new_id.items():
+        q = next(iter(blocks[b]))
+        accepting[k] = q < n and dfa.accepting[q]
+        delta[k] = dict((c, new_id[block_of[t]])
+                        for (c, t) in dfa.delta[q].items()
+                        if block_of[t] != dead_block)
+
+    start = None
+    if dfa.start is not None and block_of[dfa.start] != dead_block:
+        start = new_id[block_of[dfa.start]]
+    return DFA(start, accepting, delta)
+
+
+# Renumber states in BFS order from the start state, following symbols in
+# increasing order. Two minimal DFAs for the same language come out
+# identical.
+def dfa_canonical(dfa):
+    if dfa.start is None:
+        return DFA(None, [], [])
+
+    order = {dfa.start: 0}
+    queue = [dfa.start]
+    for q in queue:
+        for c in sorted(dfa.delta[q]):
+            t = dfa.delta[q][c]
+            if t not in order:
+                order[t] = len(queue)
+                queue.append(t)
+
+    accepting = [dfa.accepting[q] for q in queue]
+    delta = [dict((c, order[t]) for (c, t) in sorted(dfa.delta[q].items()))
+             for q in queue]
+    return DFA(0, accepting, delta)
+
+
+def minimal_dfa_from_nfa(nfa):
+    return dfa_canonical(dfa_minimize(dfa_from_nfa(nfa)))
+
+
+# Hashable description of the language of an NFA: equal signatures iff the
+# NFAs accept the same strings.
+def canonical_signature(nfa):
+    dfa = minimal_dfa_from_nfa(nfa)
+    return tuple((acc, tuple(sorted(d.items())))
+                 for (acc, d) in zip(dfa.accepting, dfa.delta))
+
+
+# True when the NFAs accept the same strings, by their signatures. That is
+# a determinization of each, exponential in the worst case, but kept on the
+# NFA, so comparing one against many costs one each. An NFA without a start
+# or end node has no language to compare, and is equivalent to none.
+def nfa_equivalent(a, b):
+    if a.start_node is None or a.end_node is None or \
+            b.start_node is None or b.end_node is None:
+        return False
+    return a.signature == b.signature
@@ -0,0 +1,117 @@
+import numpy as np
+
+from .nfa import NFA
+from .nfa_dfa import LazyDFA, subset_moves
+from .nfa_match import encode_strings
+from .regex_nfa_convert import nfa_from_regex
+
+# DFA states kept in the cache of a MultiPatternMatcher before it is
+# flushed. The start state of a union tracks a node per pattern, so states
+# are bigger, and more of them are worth keeping, than for one pattern.
+DEFAULT_MAX_MULTI_STATES = 1 << 16
+
+
+# The NFAs side by side in one, node ids shifted, and no start or end node
+# set. Returns (nfa, start node of each, end node of each).
+def nfa_union(nfas):
+    sizes = np.array([n.numnodes for n in nfas], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    edges = np.concatenate([n.edge_array for n in nfas] + [np.zeros((0, 3), dtype=np.int32)])
+    shift = np.repeat(offsets[:-1], [n.numedges for n in nfas]).astype(np.int32)
+    edges[:, 0] += shift
+    edges[:, 2] += shift
+
+    for n in nfas:
+        assert n.start_node is not None and n.end_node is not None, \
+            "NFA has no start or end node"
+    starts = offsets[:-1] + [n.start_node.idx for n in nfas]
+    ends = offsets[:-1] + [n.end_node.idx for n in nfas]
+    return (NFA.from_edge_array(int(offsets[-1]), edges), starts, ends)
+
+
+# Matches strings against many patterns in one pass over each string, in
+# the style of Hyperscan: a LazyDFA of the union of the patterns' NFAs,
+# whose states know which patterns accept in them. A string matches the
+# patterns of the state it ends in.
+#
+# Patterns are Regex objects or NFAs, and are numbered by their position.
+# Like the single pattern LazyDFA, this gives up on the DFA if its cache
+# keeps thrashing, and then matches the patterns one by one.
+class MultiPatternMatcher(LazyDFA):
+    def __init__(self, patterns, max_states=DEFAULT_MAX_MULTI_STATES):
+        assert max_states is None or max_states >= 2
+        self._nfas = [p if isinstance(p, NFA) else nfa_from_regex(p) for p in patterns]
+        (self._nfa, starts, ends) = nfa_union(self._nfas)
+        self._pattern_of = dict(zip(ends.tolist(), range(len(ends))))
+        self._init_states(subset_moves(self._nfa, starts.tolist(), ends.tolist()),
+                          ends.tolist(), max_states)
+
+    @property
+    def num_patterns(self):
+        return len(self._nfas)
+
+    def _clear(self):
+        # the patterns accepting in each state, sorted
+        self._state_ids = []
+        LazyDFA._clear(self)
+
+    def _intern(self, nodes):
+        idx = LazyDFA._intern(self, nodes)
+        if idx == len(self._state_ids):
+            ids = sorted(self._pattern_of[j] for j in self._ends.intersection(nodes))
+            self._state_ids.append(np.array(ids, dtype=np.int64))
+        return idx
+
+    # (indptr, ids): string i matches patterns ids[indptr[i]:indptr[i + 1]],
+    # in increasing order
+    def match_ids_codes(self, codes, lengths):
+        codes = np.asarray(codes)
+        lengths = np.asarray(lengths)
+
+        if self._nfa_matcher is None:
+            states = self._final_states(codes, lengths)
+            if states is not None:
+                return self._ids_of_states(states)
+            self._nfa_matcher = _EachPattern(self._nfas)
+
+        return self._nfa_matcher.match_ids_codes(codes, lengths)
+
+    def _ids_of_states(self, states):
+        sizes = np.array([len(ids) for ids in self._state_ids], dtype=np.int64)
+        first = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        flat = np.concatenate(self._state_ids)
+
+        counts = sizes[states]
+        indptr = np.zeros(len(states) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        at = np.repeat(first[states] - indptr[:-1], counts) + np.arange(indptr[-1])
+        return (indptr, flat[at])
+
+    def match_ids(self, strings):
+        (indptr, ids) = self.match_ids_codes(*encode_strings(strings))
+        return [ids[lo:hi] for (lo, hi) in zip(indptr[:-1].tolist(), indptr[1:].tolist())]
+
+    # bool (num strings, num patterns)
+    def match_matrix(self, strings):
+        (indptr, ids) = self.match_ids_codes(*encode_strings(strings))
+        out = np.zeros((len(strings), self.num_patterns), dtype=bool)
+        out[np.repeat(np.arange(len(strings)), np.diff(indptr)), ids] = True
+        return out
+
+    # True for the strings that match any pattern
+    def match_codes(self, codes, lengths):
+        return np.diff(self.match_ids_codes(codes, lengths)[0]) > 0
+
+
+# the fallback: one LazyDFA per pattern
+class _EachPattern:
+    def __init__(self, nfas):
+        self._matchers = [LazyDFA(n) for n in nfas]
+
+    def match_ids_codes(self, codes, lengths):
+        matched = np.array([m.match_codes(codes, lengths) for m in self._matchers],
+                           dtype=bool).reshape(len(self._matchers), len(codes))
+        (string, ids) = np.nonzero(matched.T)
+        indptr = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(string, minlength=len(codes)), out=indptr[1:])
+        return (indptr, ids)
@@ -0,0 +1,240 @@
+import numpy as np
+
+from .nfa import EdgeType
+from .nfa_dfa import LazyDFA
+from .nfa_match import NUM_SYMBOLS
+from .nfa_minimize import minimal_dfa_from_nfa
+from .nfa_sample import DEFAULT_MAX_LEN, NFASampler, decode_strings
+
+# Strings that are not in an NFA's language, close to ones that are. Two
+# sources of candidates:
+#
+#   mutate: strings sampled by NFASampler with num_mutations random edits
+#           each (a symbol substituted, inserted or deleted, or two adjacent
+#           ones swapped), then filtered through a LazyDFA of the NFA in one
+#           match_codes call per batch
+#   walk:   random walks over the complement of the minimal DFA, which at
+#           every step follow one of the DFA's transitions with probability
+#           follow_prob, and take any symbol of the alphabet otherwise. The
+#           DFA state a walk ends in says whether it is a negative, so
+#           nothing needs filtering.
+#
+# Symbols come from `alphabet`, by default the symbols of the NFA. A
+# language that holds every string over its alphabet has no negatives over
+# it; sampling gives up with a RuntimeError after _MAX_ROUNDS batches
+# without any, and a wider alphabet is needed.
+
+_SUBSTITUTE = 0
+_INSERT = 1
+_DELETE = 2
+_SWAP = 3
+
+_MAX_ROUNDS = 20
+
+
+class NegativeSampler:
+    def __init__(self, nfa, max_len=DEFAULT_MAX_LEN, alphabet=None, mutate_fraction=0.5,
+                 num_mutations=1, follow_prob=0.9, stop_prob=None):
+        assert 0 <= mutate_fraction <= 1 and num_mutations >= 1 and 0 <= follow_prob <= 1
+
+        if alphabet is None:
+            label = nfa.edges[1]
+            alphabet = np.unique(label[label > EdgeType._EPSILON_EDGE_VAL])
+        else:
+            alphabet = np.unique(np.frombuffer(alphabet.encode("ascii"), dtype=np.uint8))
+        assert len(alphabet) > 0, "no alphabet to build strings from"
+        self._alphabet = alphabet.astype(np.uint8)
+
+        self._max_len = max_len
+        self._mutate_fraction = mutate_fraction
+        self._num_mutations = num_mutations
+        self._follow_prob = follow_prob
+        # by default walks are about as long as the DFA has states
+        self._stop_prob = stop_prob
+
+        self._matcher = LazyDFA(nfa)
+        self._positives = NFASampler(nfa, max_len) if mutate_fraction > 0 else None
+        if mutate_fraction < 1:
+            self._mk_dfa_tables(nfa)
+
+    # the DFA as a (states + 1, NUM_SYMBOLS) table, with a dead state last,
+    # and its transitions on alphabet symbols in CSR form
+    def _mk_dfa_tables(self, nfa):
+        dfa = minimal_dfa_from_nfa(nfa)
+        n = dfa.numstates
+        dead = n
+        table = np.full((n + 1, NUM_SYMBOLS), dead, dtype=np.int64)
+        in_alphabet = np.zeros(NUM_SYMBOLS, dtype=bool)
+        in_alphabet[self._alphabet] = True
+
+        (src, code) = ([], [])
+        for (q, d) in enumerate(dfa.delta):
+            for (c, t) in sorted(d.items()):
+                table[q, c] = t
+                if in_alphabet[c]:
+                    src.append(q)
+                    code.append(c)
+
+        self._table = table
+        self._dfa_start = dead if dfa.start is None else dfa.start
+        self._accepting = np.array(list(dfa.accepting) + [False])
+        self._moves = np.array(code, dtype=np.uint8)
+        self._moves_indptr = np.zeros(n + 2, dtype=np.int64)
+        np.cumsum(np.bincount(np.array(src, dtype=np.int64), minlength=n + 1),
+                  out=self._moves_indptr[1:])
+        if self._stop_prob is None:
+            self._stop_prob = 1.0 / (2 + n)
+
+    @property
+    def max_len(self):
+        return self._max_len
+
+    # (codes, lengths) of num_strings negatives, in the layout of
+    # nfa_match.encode_strings. rng is a numpy Generator, or a seed for one.
+    def sample_codes(self, num_strings, rng=None):
+        rng = np.random.default_rng(rng)
+        num_mutated = int(round(num_strings * self._mutate_fraction))
+        parts = []
+        if num_mutated > 0:
+            parts.append(self._collect(self._mutated, num_mutated, rng))
+        if num_strings > num_mutated:
+            parts.append(self._collect(self._walks, num_strings - num_mutated, rng))
+        return _concat_codes(parts)
+
+    def sample(self, num_strings, rng=None):
+        return decode_strings(*self.sample_codes(num_strings, rng))
+
+    # num_strings negatives from batches of candidates
+    def _collect(self, candidates, num_strings, rng):
+        parts = []
+        found = 0
+        rounds_without = 0
+        while found < num_strings:
+            # a little more than what is missing, as some are rejected
+            (codes, lengths) = candidates(max(64, 2 * (num_strings - found)), rng)
+            if len(lengths) == 0:
+                rounds_without += 1
+                if rounds_without == _MAX_ROUNDS:
+                    raise RuntimeError("no negatives over alphabet %r in %s tries" %
+                                       (self._alphabet.tobytes().decode("ascii"),
+                                        _MAX_ROUNDS))
+                continue
+            rounds_without = 0
+            take = min(len(lengths), num_strings - found)
+            parts.append((codes[:take], lengths[:take]))
+            found += take
+        return _concat_codes(parts)
+
+    def _mutated(self, num_strings, rng):
+        (codes, lengths) = self._positives.sample_codes(num_strings, rng)
+        for _ in range(self._num_mutations):
+            (codes, lengths) = mutate_codes(codes, lengths, self._alphabet, rng)
+
+        keep = lengths <= self._max_len
+        keep[keep] = ~self._matcher.match_codes(codes[keep], lengths[keep])
+        return (codes[keep], lengths[keep])
+
+    def _walks(self, num_strings, rng):
+        codes = np.zeros((num_strings, self._max_len), dtype=np.uint8)
+        lengths = np.full(num_strings, self._max_len, dtype=np.int64)
+        final = np.empty(num_strings, dtype=np.int64)
+        state = np.full(num_strings, self._dfa_start, dtype=np.int64)
+        live = np.arange(num_strings)
+        for t in range(self._max_len):
+            stop = rng.random(len(live)) < self._stop_prob
+            lengths[live[stop]] = t
+            final[live[stop]] = state[stop]
+            (live, state) = (live[~stop], state[~stop])
+            if len(live) == 0:
+                break
+
+            (lo, hi) = (self._moves_indptr[state], self._moves_indptr[state + 1])
+            follow = (rng.random(len(live)) < self._follow_prob) & (hi > lo)
+            pick = rng.random(len(live))
+            c = self._alphabet[(pick * len(self._alphabet)).astype(np.int64)]
+            c[follow] = self._moves[lo[follow] +
+                                    (pick[follow] * (hi - lo)[follow]).astype(np.int64)]
+
+            codes[live, t] = c
+            state = self._table[state, c]
+        final[live] = state
+
+        keep = ~self._accepting[final]
+        return (codes[keep], lengths[keep])
+
+
+# One random edit of every string: a symbol from `alphabet` substituted or
+# inserted, a symbol deleted, or two adjacent symbols swapped, at a random
+# position. Strings too short for an edit get an insertion instead. Returns
+# (codes, lengths), one column wider than codes.
+def mutate_codes(codes, lengths, alphabet, rng):
+    (m, width) = codes.shape
+    alphabet = np.asarray(alphabet, dtype=np.uint8)
+    op = rng.integers(0, 4, size=m)
+    op[(lengths < 1) & ((op == _SUBSTITUTE) | (op == _DELETE))] = _INSERT
+    op[(lengths < 2) & (op == _SWAP)] = _INSERT
+
+    # insertions can go after the last symbol, swaps not at the last one
+    span = lengths + (op == _INSERT) - (op == _SWAP)
+    pos = (rng.random(m) * span).astype(np.int64)
+    symbol = alphabet[rng.integers(0, len(alphabet), size=m)]
+
+    # out[:, j] = codes[:, source[:, j]], with source j moved by the edit
+    j = np.arange(width + 1, dtype=np.int32)[None, :]
+    p = pos.astype(np.int32)[:, None]
+    op_ = op[:, None]
+    source = ((op_ == _DELETE) & (j >= p)).astype(np.int32)
+    source -= (op_ == _INSERT) & (j > p)
+    swap = op_ == _SWAP
+    source += swap & (j == p)
+    source -= swap & (j == p + 1)
+    source += j
+
+    padded = np.zeros((m, width + 2), dtype=np.uint8)
+    padded[:, :width] = codes
+    out = np.take_along_axis(padded, source, axis=1)
+
+    put = (op == _SUBSTITUTE) | (op == _INSERT)
+    out[np.flatnonzero(put), pos[put]] = symbol[put]
+    new_lengths = lengths + (op == _INSERT) - (op == _DELETE)
+    out[np.arange(width + 1)[None, :] >= new_lengths[:, None]] = 0
+    return (out, new_lengths)
+
+
+def _concat_codes(parts):
+    if not parts:
+        return (np.zeros((0, 0), dtype=np.uint8), np.zeros(0, dtype=np.int64))
+    width = max(c.shape[1] for (c, _) in parts)
+    codes = np.zeros((sum(len(l) for (_, l) in parts), width), dtype=np.uint8)
+    lo = 0
+    for (c, l) in parts:
+        codes[lo:lo + len(l), :c.shape[1]] = c
+        lo += len(l)
+    lengths = np.concatenate([l for (_, l) in parts])
+    return (codes[:, :int(lengths.max()) if len(lengths) else 0], lengths)
+
+
+# Labelled training strings: positives from NFASampler and negatives from
+# NegativeSampler, negative_ratio of them negative, shuffled together.
+class LabelledSampler:
+    def __init__(self, nfa, max_len=DEFAULT_MAX_LEN, negative_ratio=0.5, **negative_args):
+        assert 0 <= negative_ratio <= 1
+        self._positives = NFASampler(nfa, max_len)
+        self._negatives = NegativeSampler(nfa, max_len, **negative_args)
+        self._negative_ratio = negative_ratio
+
+    # (codes, lengths, labels), labels True for the strings in the language
+    def sample_codes(self, num_strings, rng=None):
+        rng = np.random.default_rng(rng)
+        num_negative = int(round(num_strings * self._negative_ratio))
+        (codes, lengths) = _concat_codes(
+            [self._positives.sample_codes(num_strings - num_negative, rng),
+             self._negatives.sample_codes(num_negative, rng)])
+        labels = np.arange(num_strings) < num_strings - num_negative
+
+        order = rng.permutation(num_strings)
+        return (codes[order], lengths[order], labels[order])
+
+    def sample(self, num_strings, rng=None):
+        (codes, lengths, labels) = self.sample_codes(num_strings, rng)
+        return (decode_strings(codes, lengths), labels)
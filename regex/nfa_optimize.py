@@ -0,0 +1,171 @@
+import collections
+
+import numpy as np
+
+from .nfa import NFA, EdgeType
+from .nfa_match import epsilon_closures
+
+# Shrinks the NFAs that Thompson's construction makes, without changing
+# their language:
+#
+#   1. epsilon edges are removed: a node gets the symbol edges of every
+#      node in its epsilon closure, and accepts if its closure has the end
+#   2. the accepting nodes are replaced by a single new end node: every
+#      edge into an accepting node also gets a copy into the end node. If
+#      the empty string is in the language the start node has an epsilon
+#      edge to it, the only epsilon edge left.
+#   3. nodes that can't be reached from the start, or can't reach the end,
+#      are dropped
+#   4. nodes with the same outgoing edges are merged, and so are nodes with
+#      the same incoming edges, until nothing changes. The latter is what
+#      folds the chain of a literal run into one node per character.
+#   5. nodes are renumbered in BFS order from the start node
+#
+# A 16 character literal goes from 32 nodes to 17.
+
+
+# The epsilon free NFA of step 1, over the nodes of `nfa`:
+# (start, accepting, src, label, dest) where accepting is a bool array with
+# one entry per node, and the edges are all symbol edges, without
+# duplicates.
+def eps_free(nfa):
+    assert nfa.start_node is not None and nfa.end_node is not None, \
+        "NFA has no start or end node"
+
+    n = nfa.numnodes
+    closures = epsilon_closures(nfa)
+    lengths = np.array([len(c) for c in closures], dtype=np.int64)
+    # (q, p) for every p in the closure of q
+    q = np.repeat(np.arange(n, dtype=np.int64), lengths)
+    p = np.fromiter((j for c in closures for j in c), dtype=np.int64, count=int(lengths.sum()))
+
+    accepting = np.zeros(n, dtype=bool)
+    accepting[q[p == nfa.end_node.idx]] = True
+
+    # every symbol edge of p, for every (q, p)
+    (src, label, dest) = nfa.edges
+    on_symbol = label > EdgeType._EPSILON_EDGE_VAL
+    order = np.argsort(src[on_symbol], kind="stable")
+    (sym_label, sym_dest) = (label[on_symbol][order], dest[on_symbol][order])
+    degree = np.bincount(src[on_symbol], minlength=n)
+    indptr = np.concatenate([[0], np.cumsum(degree)])
+
+    counts = degree[p]
+    first = np.repeat(indptr[p] - np.cumsum(counts) + counts, counts)
+    idx = first + np.arange(int(counts.sum()))
+    rows = _unique_edges(np.repeat(q, counts), sym_label[idx], sym_dest[idx])
+    return (nfa.start_node.idx, accepting) + rows
+
+
+def _unique_edges(src, label, dest):
+    keys = np.unique((src.astype(np.int64) << 40) | (label.astype(np.int64) << 32) |
+                     dest.astype(np.int64))
+    return ((keys >> 40).astype(np.int32), ((keys >> 32) & 0xff).astype(np.int32),
+            (keys & 0xffffffff).astype(np.int32))
+
+
+def _reach(n, roots, src, dest):
+    succs = [[] for _ in range(n)]
+    for (s, d) in zip(src.tolist(), dest.tolist()):
+        succs[s].append(d)
+
+    seen = np.zeros(n, dtype=bool)
+    todo = list(roots)
+    seen[todo] = True
+    while todo:
+        for j in succs[todo.pop()]:
+            if not seen[j]:
+                seen[j] = True
+                todo.append(j)
+    return seen
+
+
+# keeps the edges between nodes that are reachable from start and can reach
+# end. The node ids don't change.
+def _trim(n, start, end, src, label, dest):
+    live = _reach(n, [start], src, dest) & _reach(n, [end], dest, src)
+    keep = live[src] & live[dest]
+    return (src[keep], label[keep], dest[keep])
+
+
+# One round of merging nodes with the same outgoing (or, with incoming, the
+# same incoming) edges. Start and end are never merged, and nodes without
+# edges (the ones merged away by earlier rounds) are left alone. Returns the
+# representative of every node.
+def _merge_round(n, start, end, src, label, dest, incoming):
+    (mine, other) = (dest, src) if incoming else (src, dest)
+    order = np.lexsort((other, label, mine))
+    edges = collections.defaultdict(list)
+    for (m, c, o) in zip(mine[order].tolist(), label[order].tolist(), other[order].tolist()):
+        edges[m].append((c, o))
+
+    rep = np.arange(n)
+    seen = {}
+    for (i, e) in edges.items():
+        if i != start and i != end:
+            rep[i] = seen.setdefault(tuple(e), i)
+    return rep
+
+
+def _merge(n, start, end, src, label, dest):
+    changed = True
+    while changed:
+        changed = False
+        for incoming in (False, True):
+            rep = _merge_round(n, start, end, src, label, dest, incoming)
+            if (rep != np.arange(n)).any():
+                changed = True
+                (src, label, dest) = _unique_edges(rep[src], label, rep[dest])
+    return (src, label, dest)
+
+
+# BFS order from start, following edges by (label, dest). Returns the new id
+# of every node, -1 for the ones not reached, and the number reached.
+def bfs_order(n, start, src, label, dest):
+    order = np.lexsort((dest, label, src))
+    succs = [[] for _ in range(n)]
+    for (s, d) in zip(src[order].tolist(), dest[order].tolist()):
+        succs[s].append(d)
+
+    new_id = np.full(n, -1, dtype=np.int64)
+    new_id[start] = 0
+    queue = [start]
+    for i in queue:
+        for j in succs[i]:
+            if new_id[j] < 0:
+                new_id[j] = len(queue)
+                queue.append(j)
+    return (new_id, len(queue))
+
+
+def nfa_optimize(nfa):
+    (start, accepting, src, label, dest) = eps_free(nfa)
+
+    n = len(accepting)
+    end = n
+    into_end = accepting[dest]
+    src = np.concatenate([src, src[into_end]])
+    label = np.concatenate([label, label[into_end]])
+    dest = np.concatenate([dest, np.full(int(into_end.sum()), end, dtype=dest.dtype)])
+    if accepting[start]:
+        src = np.append(src, start).astype(np.int32)
+        label = np.append(label, EdgeType._EPSILON_EDGE_VAL).astype(np.int32)
+        dest = np.append(dest, end).astype(np.int32)
+    n += 1
+
+    (src, label, dest) = _trim(n, start, end, src, label, dest)
+    (src, label, dest) = _merge(n, start, end, src, label, dest)
+
+    (new_id, numnodes) = bfs_order(n, start, src, label, dest)
+    if new_id[end] < 0:
+        # empty language: keep an unreachable end node
+        new_id[end] = numnodes
+        numnodes += 1
+
+    return NFA.from_edges(numnodes, new_id[src], label, new_id[dest],
+                          new_id[start], new_id[end])
+
+
+# (nodes before, nodes after) for each NFA
+def optimize_report(nfas):
+    return [(n.numnodes, nfa_optimize(n).numnodes) for n in nfas]
@@ -0,0 +1,122 @@
+import numpy as np
+
+from .nfa_optimize import eps_free
+
+# Longest string a sampler generates unless told otherwise.
+DEFAULT_MAX_LEN = 64
+
+# number of walks advanced together. Bounds the per step temporaries.
+_WALKS_PER_BLOCK = 1 << 16
+
+_INF = np.iinfo(np.int64).max // 2
+
+
+# Samples strings of an NFA's language by random walks on its epsilon free
+# form (nfa_optimize.eps_free), many walks at once with numpy.
+#
+# At every node a walk takes one of the outgoing edges, or stops if the node
+# accepts, uniformly at random with stopping weighted by stop_weight. Every
+# walk ends in an accepting node within max_len symbols: the walk only takes
+# edges into nodes from which an accepting node is still reachable within
+# the symbols left. The number of such edges, for every node and every
+# number of symbols left, is a table built once, and the edges of each node
+# are sorted by how far their destination is from accepting, so the allowed
+# ones are a prefix and a step is one gather per walk.
+#
+# Strings with many paths through the NFA are more likely than others; the
+# distribution is over walks, not uniform over strings.
+class NFASampler:
+    def __init__(self, nfa, max_len=DEFAULT_MAX_LEN, stop_weight=1.0):
+        assert max_len >= 0 and stop_weight > 0
+
+        (start, accepting, src, label, dest) = eps_free(nfa)
+        n = len(accepting)
+        dist = _distance_to_accepting(n, accepting, src, dest)
+        if dist[start] > max_len:
+            raise RuntimeError("NFA has no string of at most %s symbols" % (max_len, ))
+
+        # edges of every node, nearest to accepting first
+        need = dist[dest] + 1
+        keep = need <= max_len
+        (src, label, dest, need) = (src[keep], label[keep], dest[keep], need[keep])
+        order = np.lexsort((label, need, src))
+        self._label = label[order].astype(np.uint8)
+        self._dest = dest[order].astype(np.int64)
+        self._indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self._indptr[1:])
+
+        # allowed[i, r]: edges of node i a walk with r symbols left can take
+        self._max_need = int(need.max()) if len(need) > 0 else 0
+        allowed = np.zeros((n, self._max_need + 1), dtype=np.int64)
+        np.add.at(allowed, (src[order], need[order]), 1)
+        self._allowed = np.cumsum(allowed, axis=1)
+
+        self._start = start
+        self._accepting = accepting
+        self._max_len = max_len
+        self._stop_weight = float(stop_weight)
+
+    @property
+    def max_len(self):
+        return self._max_len
+
+    # (codes, lengths) of num_strings strings, in the layout of
+    # nfa_match.encode_strings: codes is uint8 (num_strings, max length)
+    # padded with 0. rng is a numpy Generator, or a seed for one.
+    def sample_codes(self, num_strings, rng=None):
+        rng = np.random.default_rng(rng)
+        codes = np.zeros((num_strings, self._max_len), dtype=np.uint8)
+        lengths = np.zeros(num_strings, dtype=np.int64)
+        for lo in range(0, num_strings, _WALKS_PER_BLOCK):
+            hi = min(lo + _WALKS_PER_BLOCK, num_strings)
+            self._walk(codes[lo:hi], lengths[lo:hi], rng)
+        return (codes[:, :int(lengths.max()) if num_strings > 0 else 0], lengths)
+
+    def sample(self, num_strings, rng=None):
+        return decode_strings(*self.sample_codes(num_strings, rng))
+
+    def _walk(self, codes, lengths, rng):
+        live = np.arange(len(codes))
+        state = np.full(len(codes), self._start, dtype=np.int64)
+        for t in range(self._max_len + 1):
+            left = min(self._max_len - t, self._max_need)
+            num_edges = self._allowed[state, left]
+            stop = self._stop_weight * self._accepting[state]
+
+            pick = rng.random(len(live)) * (num_edges + stop)
+            done = pick >= num_edges
+            lengths[live[done]] = t
+
+            go = ~done
+            (live, state, pick) = (live[go], state[go], pick[go])
+            if len(live) == 0:
+                return
+            edge = self._indptr[state] + pick.astype(np.int64)
+            codes[live, t] = self._label[edge]
+            state = self._dest[edge]
+        assert False, "walks longer than max_len"
+
+
+def _distance_to_accepting(n, accepting, src, dest):
+    preds = [[] for _ in range(n)]
+    for (s, d) in zip(src.tolist(), dest.tolist()):
+        preds[d].append(s)
+
+    dist = np.full(n, _INF, dtype=np.int64)
+    queue = np.flatnonzero(accepting).tolist()
+    dist[queue] = 0
+    for i in queue:
+        for j in preds[i]:
+            if dist[j] == _INF:
+                dist[j] = dist[i] + 1
+                queue.append(j)
+    return dist
+
+
+# inverse of nfa_match.encode_strings, for ascii codes
+def decode_strings(codes, lengths):
+    mask = np.arange(codes.shape[1])[None, :] < lengths[:, None]
+    text = codes[mask].tobytes().decode("ascii")
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return [text[lo:hi] for (lo, hi) in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
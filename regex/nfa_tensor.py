@@ -0,0 +1,116 @@
+import numpy as np
+
+from .nfa import EdgeType, adj_tensor_from_nfas
+from .nfa_match import encode_strings
+
+# Runs batches of (NFA, string) pairs on the adjacency encoding of
+# adj_tensor_from_nfas, as batched matrix products: one pair per row of the
+# batch, the NFA of row b given by adj[b] with start node start[b] and end
+# node end[b], the string by row b of (codes, lengths) from
+# nfa_match.encode_strings.
+#
+# The state of a row is a vector over nodes. With E the epsilon edges and
+# M_c the edges labelled c, as (num_nodes, num_nodes) matrices, the epsilon
+# closure is the fixed point C of C = min(1, C @ C) from C = min(1, I + E),
+# reached by squaring in about log2(longest epsilon path) steps, and
+#
+#   state_0     = C[start]
+#   state_t+1   = min(1, state_t @ M_c @ C)     c the symbol at t
+#   accepted    = state_len[end]
+#
+# M_c is picked from adj for every row and step, so nothing per symbol is
+# built ahead. A row whose start or end is unknown (-1) accepts nothing.
+#
+# adj can be hard, the uint8 label tensor of adj_tensor_from_nfas, or soft,
+# a float (batch, num_nodes, num_nodes, NUM_SYMBOLS) tensor of label
+# probabilities, label l of cell (i, j) at [:, i, j, l] (0 is no edge, 1
+# epsilon, the rest symbol codes), e.g. a model's softmax over labels. Hard
+# tensors give 0 / 1; soft ones a score in [0, 1] that is a product and sum
+# of the probabilities, clipped, so it is differentiable almost everywhere.
+
+
+def _is_soft(adj):
+    return adj.ndim == 4
+
+
+# bool (batch, num_nodes, num_nodes) for hard adj, float for soft
+def epsilon_closures(adj):
+    n = adj.shape[1]
+    if _is_soft(adj):
+        closure = np.minimum(1, adj[..., EdgeType._EPSILON_EDGE_VAL] + np.eye(n, dtype=adj.dtype))
+        square = lambda c: np.minimum(1, c @ c)
+    else:
+        closure = (adj == EdgeType._EPSILON_EDGE_VAL) | np.eye(n, dtype=bool)
+        # float32 matmul is far faster than bool, and exact for counts < 2^24
+        square = lambda c: (c.astype(np.float32) @ c.astype(np.float32)) > 0
+
+    for _ in range(max(1, n).bit_length()):
+        squared = square(closure)
+        if np.array_equal(squared, closure):
+            break
+        closure = squared
+    return closure
+
+
+def _one_hot_rows(nodes, n, dtype):
+    nodes = np.asarray(nodes, dtype=np.int64)
+    out = np.zeros((len(nodes), n), dtype=dtype)
+    known = nodes >= 0
+    out[np.flatnonzero(known), nodes[known]] = 1
+    return out
+
+
+# (batch, ) acceptance of the pairs: bool for hard adj, float scores for
+# soft
+def run_nfa_tensors(adj, start, end, codes, lengths):
+    adj = np.asarray(adj)
+    codes = np.asarray(codes)
+    lengths = np.asarray(lengths)
+    (batch, n) = adj.shape[:2]
+    assert len(codes) == batch and len(lengths) == batch and len(start) == batch \
+        and len(end) == batch, "one string, start and end per NFA"
+
+    # longest strings first, so the rows still running are a prefix and
+    # slices rather than copies. Soft tensors are big, and are gathered from
+    # in place.
+    order = np.argsort(-lengths, kind="stable")
+    (codes, lengths) = (codes[order], lengths[order])
+    (start, end) = (np.asarray(start)[order], np.asarray(end)[order])
+    if not _is_soft(adj):
+        adj = adj[order]
+
+    dtype = adj.dtype if _is_soft(adj) else np.float32
+    closure = epsilon_closures(adj).astype(dtype)
+    if _is_soft(adj):
+        closure = closure[order]
+
+    # states as (batch, 1, num_nodes) rows, for batched matmul
+    state = _one_hot_rows(start, n, dtype)[:, None, :] @ closure
+    for t in range(codes.shape[1]):
+        k = int(np.count_nonzero(lengths > t))
+        if k == 0:
+            break
+        c = codes[:k, t]
+        if _is_soft(adj):
+            moves = adj[order[:k], :, :, c]
+        else:
+            moves = (adj[:k] == c[:, None, None]).astype(dtype)
+        state[:k] = np.minimum(1, (state[:k] @ moves) @ closure[:k])
+        # codes 0 and 1 are the None and epsilon labels, not symbols; a
+        # string with one (say a non ascii char, see encode_strings) can't
+        # match
+        state[:k][c <= EdgeType._EPSILON_EDGE_VAL] = 0
+    state = state[:, 0, :]
+
+    accept = np.empty(batch, dtype=dtype)
+    accept[order] = (state * _one_hot_rows(end, n, dtype)).sum(axis=1)
+    return accept if _is_soft(adj) else accept > 0
+
+
+# run_nfa_tensors on NFA objects, nfas[i] against strings[i]
+def run_nfas(nfas, strings, num_nodes):
+    adj = adj_tensor_from_nfas(nfas, num_nodes)
+    start = [-1 if n.start_node is None else n.start_node.idx for n in nfas]
+    end = [-1 if n.end_node is None else n.end_node.idx for n in nfas]
+    return run_nfa_tensors(adj, start, end, *encode_strings(strings))
+
@@ -0,0 +1,18 @@
+import collections
+import concurrent.futures
+
+DEFAULT_QUEUE_SIZE = 16
+
+
+# map(fn, items) on a pool of worker processes, keeping at most maxsize
+# items in flight and yielding results in input order. fn and the items
+# must be picklable.
+def parallel_map(fn, items, num_workers=None, maxsize=DEFAULT_QUEUE_SIZE):
+    with concurrent.futures.ProcessPoolExecutor(num_workers) as pool:
+        in_flight = collections.deque()
+        for x in items:
+            in_flight.append(pool.submit(fn, x))
+            if len(in_flight) >= maxsize:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
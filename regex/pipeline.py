@@ -0,0 +1,199 @@
+import functools
+import queue
+import random
+import threading
+
+import numpy as np
+
+from . import regex_nfa_convert
+from .corpus import DEFAULT_MK_REGEX
+from .dataset import Batch
+from .nfa import adj_tensor_from_nfas, nfa_prune
+from .nfa_dedup import nfa_fingerprints
+from .nfa_optimize import nfa_optimize
+from .nfa_order import nfa_relabel
+from .parallel import DEFAULT_QUEUE_SIZE, parallel_map
+
+# Lazy stages for going from random regexes to training batches. Every
+# stage is a generator over the previous one, so they compose by plain
+# function application:
+#
+#   samples = sample_regexes(rng)
+#   samples = compile_nfas(samples)
+#   samples = prune_nfas(samples, num_nodes)
+#   samples = dedup_nfas(samples, FingerprintIndex("seen.fpi"))
+#   samples = shuffle_buffer(samples, 10000, rng)
+#   batches = encode_batches(batch(samples, 256), num_nodes)
+#   batches = background(batches, maxsize=4)
+#
+# Nothing is produced until the consumer asks for it, and every stage holds
+# a bounded number of items, so memory does not grow with the number of
+# batches drawn. Samples travel as (regex, nfa) pairs and are only encoded
+# into a dense tensor once they are batched, so a shuffle buffer holds
+# compact NFAs rather than num_nodes^2 matrices.
+
+
+def sample_regexes(rng, mk_regex=DEFAULT_MK_REGEX, count=None):
+    n = 0
+    while count is None or n < count:
+        yield mk_regex(rng=rng)
+        n += 1
+
+
+def _compile(r, optimize=False, order=None):
+    n = regex_nfa_convert.nfa_from_regex(r)
+    if optimize:
+        n = nfa_optimize(n)
+    if order is not None:
+        n = nfa_relabel(n, order)
+    return (r, n)
+
+
+# with optimize, the NFAs go through nfa_optimize.nfa_optimize, which
+# leaves them with well under half the nodes. With order ("bfs" or "rcm",
+# see nfa_order) their nodes are renumbered into a canonical order, which
+# for "rcm" keeps the adjacency matrices banded.
+def compile_nfas(regexes, num_workers=None, optimize=False, order=None):
+    f = functools.partial(_compile, optimize=optimize, order=order)
+    if num_workers is None:
+        return map(f, regexes)
+    return parallel_map(f, regexes, num_workers)
+
+
+# drops None edges and unused nodes, and the samples that don't fit in
+# num_nodes
+def prune_nfas(samples, num_nodes):
+    for (r, n) in samples:
+        n = nfa_prune(n)
+        if n.numnodes <= num_nodes:
+            yield (r, n)
+
+
+# drops the samples whose NFA's fingerprint (nfa_dedup.nfa_fingerprints)
+# is already in `index`, a nfa_dedup.FingerprintIndex, and adds the others.
+# Samples are fingerprinted chunk_size at a time.
+def dedup_nfas(samples, index, chunk_size=1024):
+    for chunk in batch(samples, chunk_size):
+        new = index.add_many(nfa_fingerprints([n for (_, n) in chunk]))
+        for (sample, keep) in zip(chunk, new.tolist()):
+            if keep:
+                yield sample
+
+
+def shuffle_buffer(items, size, rng):
+    assert size > 0
+    buf = []
+    for item in items:
+        if len(buf) < size:
+            buf.append(item)
+            continue
+        i = rng.randrange(size)
+        yield buf[i]
+        buf[i] = item
+
+    rng.shuffle(buf)
+    yield from buf
+
+
+def batch(items, batch_size, drop_last=False):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == batch_size:
+            yield chunk
+            chunk = []
+    if chunk and not drop_last:
+        yield chunk
+
+
+# lists of (regex, nfa) -> dataset.Batch, the same type ShardedDataset
+# hands out, with the adjacency tensors filled in one vectorised pass
+def encode_batches(chunks, num_nodes):
+    for chunk in chunks:
+        nfas = [n for (_, n) in chunk]
+        nodes = np.array([(n.start_node.idx if n.start_node is not None else -1,
+                           n.end_node.idx if n.end_node is not None else -1)
+                          for n in nfas], dtype=np.int32).reshape(-1, 2)
+
+        texts = [str(r).encode("ascii") for (r, _) in chunk]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in texts], out=offsets[1:])
+
+        yield Batch(adj_tensor_from_nfas(nfas, num_nodes), nodes,
+                    np.frombuffer(b"".join(texts), dtype=np.uint8), offsets)
+
+
+_DONE = object()
+
+class _Failed:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+# Runs `items` in a background thread, at most maxsize items ahead of the
+# consumer. numpy releases the GIL in the heavy parts, so this overlaps
+# data production with whatever the consumer does with a batch.
+def background(items, maxsize=DEFAULT_QUEUE_SIZE):
+    q = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(x):
+        while not stop.is_set():
+            try:
+                q.put(x, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        it = iter(items)
+        try:
+            for x in it:
+                if not put(x):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failed(e))
+        finally:
+            # shut down worker pools and the like in this thread, rather
+            # than whenever the stage happens to be garbage collected
+            if hasattr(it, "close"):
+                it.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            x = q.get()
+            if x is _DONE:
+                return
+            if isinstance(x, _Failed):
+                raise x.exc
+            yield x
+    finally:
+        stop.set()
+        thread.join()
+
+
+# The whole pipeline with the usual settings: an endless stream of
+# dataset.Batch, produced in a background thread (and compiled in worker
+# processes when num_workers is given). With dedup_index, a
+# nfa_dedup.FingerprintIndex, NFAs already in the index are skipped.
+def training_batches(batch_size, num_nodes, seed=None, mk_regex=DEFAULT_MK_REGEX,
+                     shuffle_size=10000, num_workers=None, prefetch=4, optimize=False,
+                     order=None, dedup_index=None):
+    # separate streams, so how far the sampler runs ahead of the shuffle
+    # buffer does not change the batches
+    rng = random.Random(seed)
+    sample_rng = random.Random(rng.getrandbits(64))
+    shuffle_rng = random.Random(rng.getrandbits(64))
+
+    samples = sample_regexes(sample_rng, mk_regex)
+    samples = compile_nfas(samples, num_workers, optimize, order)
+    samples = prune_nfas(samples, num_nodes)
+    if dedup_index is not None:
+        samples = dedup_nfas(samples, dedup_index)
+    samples = shuffle_buffer(samples, shuffle_size, shuffle_rng)
+    batches = encode_batches(batch(samples, batch_size, drop_last=True), num_nodes)
+    return background(batches, prefetch)
@@ -1,9 +1,81 @@
+import os
 import random
 import string
+import threading
+import weakref
+
+# Regex nodes are hash-consed: building a node that is structurally equal to
+# a live one returns the live one. Equal subexpressions therefore share
+# memory and compile once, equality is identity, and the structural hash is
+# computed once, bottom up, when a node is created. Nodes are immutable.
+#
+# Literals live in a table of their own. Other nodes are looked up by their
+# class and the identity of their children, packed into one int key (see
+# _intern): a node keeps its children alive, so the ids of a live node's
+# children are never reused. The table holds weak references, a node is
+# dropped from it when nothing else refers to it.
+_interned = weakref.WeakValueDictionary()
+_interned_lock = threading.Lock()
+
+# a child forked while another thread held the lock would never see it
+# released
+def _reset_interned_lock():
+    global _interned_lock
+    _interned_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_interned_lock)
+
+# Text form of a regex: literals as themselves, (r1|r2), r1r2 and <r>* , with
+# a backslash in front of literals that are one of these characters (the
+# space is what follows the * of a star). regex_parse reads it back.
+METACHARS = "\\()|<>* "
+
+_escaped = dict((c, "\\" + c) for c in METACHARS)
+
+# r2 is None for stars. The key is the two ids (each below 2^64) and the
+# class's _tag; an int is smaller than a tuple, which adds up over millions
+# of nodes. Lookups don't take the lock, only creating a node does.
+def _intern(cls, r1, r2, structural_hash, size):
+    key = (id(r1) << 64 | id(r2)) << 2 | cls._tag
+    r = _interned.get(key)
+    if r is not None:
+        return r
+
+    with _interned_lock:
+        r = _interned.get(key)
+        if r is not None:
+            return r
+
+        r = object.__new__(cls)
+        r._r1 = r1
+        r._r2 = r2
+        r._hash = structural_hash
+        r._size = size
+        _interned[key] = r
+        return r
+
 
 class Regex:
-    def generate_text(self, cost):
-        raise NotImplementedError
+    __slots__ = ("_hash", "_size", "__weakref__")
+
+    # A random string of the language: ors pick a side, stars repeat between
+    # 0 and cost times.
+    def generate_text(self, cost, rng=random):
+        out = []
+        todo = [self]
+        while todo:
+            r = todo.pop()
+            cls = type(r)
+            if cls is RegexASCII:
+                out.append(str(r.char))
+            elif cls is RegexOr:
+                todo.append(r.r1 if rng.getrandbits(1) == 0 else r.r2)
+            elif cls is RegexSequence:
+                todo.append(r.r2)
+                todo.append(r.r1)
+            else:
+                todo.extend([r.r] * rng.randint(0, cost))
+        return "".join(out)
 
     def make_nfa(self):
         raise NotImplementedError
@@ -11,114 +83,351 @@ class Regex:
     def to_int(self):
         raise NotImplementedError
 
+    # number of nodes in the tree, counting shared subtrees once per use
+    @property
+    def size(self):
+        return self._size
+
+    def __hash__(self):
+        return self._hash
+
+    def __str__(self):
+        out = []
+        todo = [self]
+        while todo:
+            r = todo.pop()
+            cls = type(r)
+            if cls is str:
+                out.append(r)
+            elif cls is RegexASCII:
+                out.append(_escaped.get(r.char, r.char))
+            elif cls is RegexOr:
+                todo.extend([")", r.r2, "|", r.r1, "("])
+            elif cls is RegexSequence:
+                todo.extend([r.r2, r.r1])
+            else:
+                todo.extend([">* ", r.r, "<"])
+        return "".join(out)
+
     def __repr__(self):
         return self.__str__()
 
+    # pickled as a flat postorder listing rather than nested calls, which
+    # would hit the recursion limit on deep regexes
+    def __reduce__(self):
+        return (_from_postorder, (_postorder(self), ))
+
 class RegexASCII(Regex):
-    def __init__(self, c):
-        self._c = c
+    __slots__ = ("_c", )
+
+    _literals = {}
+
+    def __new__(cls, c):
+        r = RegexASCII._literals.get(c)
+        if r is not None:
+            return r
+
+        r = object.__new__(cls)
+        r._c = c
+        r._hash = hash((cls.__name__, c))
+        r._size = 1
+        return RegexASCII._literals.setdefault(c, r)
+
+    def __reduce__(self):
+        return (RegexASCII, (self._c, ))
 
     @property
     def char(self):
         return self._c
 
     def __str__(self):
-        return str(self._c)
-
-    def generate_text(self, cost):
-        return str(self._c)
+        return _escaped.get(self._c, self._c)
 
 class RegexOr(Regex):
-    def __init__(self, r1, r2):
+    __slots__ = ("_r1", "_r2")
+    _tag = 0
+
+    def __new__(cls, r1, r2):
         assert isinstance(r1, Regex)
         assert isinstance(r2, Regex), "%s is not a regex" % (r2, )
 
-        self.r1 = r1
-        self.r2 = r2
+        return _intern(cls, r1, r2, hash((cls.__name__, r1._hash, r2._hash)),
+                       1 + r1._size + r2._size)
 
-    def __str__(self):
-        return "(%s|%s)" % (self.r1, self.r2)
+    @property
+    def r1(self):
+        return self._r1
 
-    def generate_text(self, cost):
-        if random.getrandbits(1) == 0:
-            return self.r1.generate_text(cost)
-        else:
-            return self.r2.generate_text(cost)
+    @property
+    def r2(self):
+        return self._r2
 
 class RegexSequence(Regex):
-    def __init__(self, r1, r2):
+    __slots__ = ("_r1", "_r2")
+    _tag = 1
+
+    def __new__(cls, r1, r2):
         assert isinstance(r1, Regex)
         assert isinstance(r2, Regex), "%s is not a regex" % (r2, )
 
-        self.r1 = r1
-        self.r2 = r2
+        return _intern(cls, r1, r2, hash((cls.__name__, r1._hash, r2._hash)),
+                       1 + r1._size + r2._size)
 
-    def __str__(self):
-        return "%s%s" % (self.r1, self.r2)
+    @property
+    def r1(self):
+        return self._r1
 
-    def generate_text(self, cost):
-        return self.r1.generate_text(cost) + self.r2.generate_text(cost)
+    @property
+    def r2(self):
+        return self._r2
 
 
 class StarRegex(Regex):
-    def __init__(self, r):
+    __slots__ = ("_r1", "_r2")
+    _tag = 2
+
+    def __new__(cls, r):
         assert isinstance(r, Regex)
-        self.r = r
+        return _intern(cls, r, None, hash((cls.__name__, r._hash)), 1 + r._size)
 
-    def __str__(self):
-        return "<%s>* " % self.r
+    @property
+    def r(self):
+        return self._r1
+
+
+# Postorder listing of a regex: literals as their char, operators as one of
+# the codes below.
+_OR = 0
+_SEQ = 1
+_STAR = 2
+
+def _postorder(regex):
+    out = []
+    todo = [(regex, False)]
+    while todo:
+        (r, children_done) = todo.pop()
+        cls = type(r)
+        if cls is RegexASCII:
+            out.append(r.char)
+        elif children_done:
+            out.append(_STAR if cls is StarRegex else _OR if cls is RegexOr else _SEQ)
+        else:
+            todo.append((r, True))
+            if cls is StarRegex:
+                todo.append((r.r, False))
+            else:
+                todo.append((r.r2, False))
+                todo.append((r.r1, False))
+    return out
+
+def _from_postorder(items):
+    built = []
+    for x in items:
+        if x == _STAR:
+            built.append(StarRegex(built.pop()))
+        elif x == _OR or x == _SEQ:
+            r2 = built.pop()
+            r1 = built.pop()
+            built.append(RegexOr(r1, r2) if x == _OR else RegexSequence(r1, r2))
+        else:
+            built.append(RegexASCII(x))
+    assert len(built) == 1
+    return built[0]
 
-    def generate_text(self, cost):
-        n = random.randint(0, cost)
 
-        "".join([r.generate_text() for _ in range(n)])
 
+def _mk_ascii_chunk(min_ascii_in_chunk, max_ascii_in_chunk, rng):
+    chars = string.ascii_letters + string.digits + string.punctuation
+    asciis = [RegexASCII(rng.choice(chars)) for _ in range(rng.randint(min_ascii_in_chunk, max_ascii_in_chunk))]
 
+    assert len(asciis) > 0
+    if len(asciis) == 1:
+        return asciis[0]
 
-def regex_mk_random(num_ors, num_stars, num_seq, min_ascii_in_chunk, max_ascii_in_chunk):
-    assert min_ascii_in_chunk > 0
-    assert max_ascii_in_chunk > 0
-    assert max_ascii_in_chunk >= min_ascii_in_chunk
+    assert len(asciis) >= 2
+    seq = RegexSequence(asciis[0], asciis[1])
+    asciis = asciis[2:]
 
-    if num_ors == 0 and num_stars == 0 and num_seq == 0:
-        chars = string.ascii_letters + string.digits + string.punctuation
-        asciis = [RegexASCII(random.choice(chars)) for _ in range(random.randint(min_ascii_in_chunk, max_ascii_in_chunk))]
+    for x in asciis:
+        seq = RegexSequence(seq, x)
 
-        assert len(asciis) > 0
-        if len(asciis) == 1:
-            return asciis[0]
-        
-        assert len(asciis) >= 2
-        seq = RegexSequence(asciis[0], asciis[1])
-        asciis = asciis[2:]
+    return seq
 
-        for x in asciis:
-            seq = RegexSequence(seq, x)
 
-        return seq
-    
-    choices = []
-    if num_ors > 0:
-        choices.append(RegexOr(regex_mk_random(num_ors - 1, num_stars, num_seq, min_ascii_in_chunk, max_ascii_in_chunk),
-                               regex_mk_random(num_ors - 1, num_stars, num_seq, min_ascii_in_chunk, max_ascii_in_chunk)))
+_BUILD = 0
+_MK_OR = 1
+_MK_SEQ = 2
+_MK_STAR = 3
 
-    if num_stars > 0:
-        choices.append(StarRegex(regex_mk_random(num_ors, num_stars - 1, num_seq, min_ascii_in_chunk, max_ascii_in_chunk)))
+# rng is anything with the interface of the random module, e.g. a
+# random.Random for reproducible streams.
+def regex_mk_random(num_ors, num_stars, num_seq, min_ascii_in_chunk, max_ascii_in_chunk, rng=random):
+    assert min_ascii_in_chunk > 0
+    assert max_ascii_in_chunk > 0
+    assert max_ascii_in_chunk >= min_ascii_in_chunk
+
+    if num_ors == 0 and num_stars == 0 and num_seq == 0:
+        return _mk_ascii_chunk(min_ascii_in_chunk, max_ascii_in_chunk, rng)
+
+    # pick the constructor first, and only build the subtrees it needs. Built
+    # with an explicit stack, left subtree first, which draws from rng in the
+    # same order as building it recursively would.
+    built = []
+    todo = [(_BUILD, num_ors, num_stars, num_seq)]
+    while todo:
+        (op, ors, stars, seqs) = todo.pop()
+
+        if op == _MK_STAR:
+            # the child is pruned already, so this is all regex_prune would do
+            r = built.pop()
+            built.append(r if isinstance(r, StarRegex) else StarRegex(r))
+            continue
+        elif op == _MK_OR or op == _MK_SEQ:
+            r2 = built.pop()
+            r1 = built.pop()
+            built.append(RegexOr(r1, r2) if op == _MK_OR else RegexSequence(r1, r2))
+            continue
+
+        if ors == 0 and stars == 0 and seqs == 0:
+            built.append(_mk_ascii_chunk(min_ascii_in_chunk, max_ascii_in_chunk, rng))
+            continue
+
+        choices = []
+        if ors > 0:
+            choices.append(_MK_OR)
+        if stars > 0:
+            choices.append(_MK_STAR)
+        if seqs > 0:
+            choices.append(_MK_SEQ)
+
+        choice = rng.choice(choices)
+        todo.append((choice, ors, stars, seqs))
+        if choice == _MK_OR:
+            todo.append((_BUILD, ors - 1, stars, seqs))
+            todo.append((_BUILD, ors - 1, stars, seqs))
+        elif choice == _MK_STAR:
+            todo.append((_BUILD, ors, stars - 1, seqs))
+        else:
+            todo.append((_BUILD, ors, stars, seqs - 1))
+            todo.append((_BUILD, ors, stars, seqs - 1))
+
+    assert len(built) == 1
+    return built[0]
+
+
+# Number of regex shapes with exactly n operators (Or, Star, Sequence)
+# above the literal chunks, with no star directly under a star (those are
+# what regex_prune removes). _SHAPE_COUNTS[n] = (all shapes, star rooted).
+_SHAPE_COUNTS = [(1, 0)]
+
+def _shape_counts(n):
+    while len(_SHAPE_COUNTS) <= n:
+        m = len(_SHAPE_COUNTS)
+        (total, stars) = _SHAPE_COUNTS[m - 1]
+        new_stars = total - stars
+        pairs = sum(_SHAPE_COUNTS[k][0] * _SHAPE_COUNTS[m - 1 - k][0] for k in range(m))
+        _SHAPE_COUNTS.append((new_stars + 2 * pairs, new_stars))
+    return _SHAPE_COUNTS[n]
+
+
+# Size of the left operand of an Or / Sequence with n operators. The split
+# k has weight count(k) * count(n - 1 - k), which is concentrated at both
+# ends, so try the ends first.
+def _pick_split(n, rng):
+    (total, stars) = _SHAPE_COUNTS[n]
+    r = rng.randrange((total - stars) // 2)
+    for i in range(n):
+        k = i // 2 if i % 2 == 0 else n - 1 - i // 2
+        r -= _SHAPE_COUNTS[k][0] * _SHAPE_COUNTS[n - 1 - k][0]
+        if r < 0:
+            return k
+    raise RuntimeError("should not reach here, unreachable branch!")
+
+
+# Draws a regex uniformly among all shapes with exactly `size` operators,
+# then fills the leaves with literal chunks like regex_mk_random. Only the
+# drawn shape is built, so the cost is linear in the size of the result
+# (plus a one-off table of shape counts), instead of exponential in it.
+def regex_mk_random_sized(size, min_ascii_in_chunk, max_ascii_in_chunk, rng=random):
+    assert size >= 0
+    assert min_ascii_in_chunk > 0
+    assert max_ascii_in_chunk >= min_ascii_in_chunk
+    _shape_counts(size)
+
+    built = []
+    todo = [(_BUILD, size, True)]
+    while todo:
+        (op, n, star_ok) = todo.pop()
+
+        if op == _MK_STAR:
+            built.append(StarRegex(built.pop()))
+            continue
+        elif op == _MK_OR or op == _MK_SEQ:
+            r2 = built.pop()
+            r1 = built.pop()
+            built.append(RegexOr(r1, r2) if op == _MK_OR else RegexSequence(r1, r2))
+            continue
+
+        if n == 0:
+            built.append(_mk_ascii_chunk(min_ascii_in_chunk, max_ascii_in_chunk, rng))
+            continue
+
+        (total, stars) = _SHAPE_COUNTS[n]
+        if not star_ok:
+            r = stars + rng.randrange(total - stars)
+        else:
+            r = rng.randrange(total)
 
-    if num_seq > 0:
-        choices.append(RegexSequence(regex_mk_random(num_ors, num_stars, num_seq - 1, min_ascii_in_chunk, max_ascii_in_chunk),
-                                     regex_mk_random(num_ors, num_stars, num_seq - 1, min_ascii_in_chunk, max_ascii_in_chunk)))
+        if r < stars:
+            todo.append((_MK_STAR, n, True))
+            todo.append((_BUILD, n - 1, False))
+        else:
+            op = _MK_OR if r - stars < (total - stars) // 2 else _MK_SEQ
+            k = _pick_split(n, rng)
+            todo.append((op, n, True))
+            todo.append((_BUILD, n - 1 - k, True))
+            todo.append((_BUILD, k, True))
 
-    return regex_prune(random.choice(choices))
+    assert len(built) == 1
+    return built[0]
 
 
+# Drops stars directly under stars. Subtrees that don't change are returned
+# as they are rather than rebuilt, and shared subtrees are pruned once.
 def regex_prune(regex):
-    if isinstance(regex, RegexASCII):
-        return regex
-    elif isinstance(regex, StarRegex):
-        if isinstance(regex.r, StarRegex):
-            return regex_prune(regex.r)
+    pruned = {}
+    todo = [regex]
+    while todo:
+        r = todo[-1]
+        if id(r) in pruned:
+            todo.pop()
+            continue
+
+        cls = type(r)
+        if cls is RegexASCII:
+            pruned[id(r)] = r
+            todo.pop()
+            continue
+
+        children = (r.r, ) if cls is StarRegex else (r.r1, r.r2)
+        missing = [c for c in children if id(c) not in pruned]
+        if missing:
+            todo.extend(missing)
+            continue
+
+        todo.pop()
+        if cls is StarRegex:
+            c = pruned[id(r.r)]
+            # a pruned star never has a star under it
+            if isinstance(c, StarRegex):
+                pruned[id(r)] = c
+            else:
+                pruned[id(r)] = r if c is r.r else StarRegex(c)
         else:
-            return StarRegex(regex_prune(regex.r))
-    elif isinstance(regex, RegexSequence) or isinstance(regex, RegexOr):
-        return RegexSequence(regex_prune(regex.r1), regex_prune(regex.r2))
+            (r1, r2) = (pruned[id(r.r1)], pruned[id(r.r2)])
+            if r1 is r.r1 and r2 is r.r2:
+                pruned[id(r)] = r
+            else:
+                pruned[id(r)] = cls(r1, r2)
+
+    return pruned[id(regex)]
@@ -1,84 +1,202 @@
-from recurrent.regex import *
-from recurrent.nfa import *
-
-def _nfa_from_regex_ascii(r, nfa):
-    assert isinstance(r, RegexASCII)
-    start = nfa.mk_node()
-    end = nfa.mk_node()
-    nfa.connect(start, EdgeType.mk_ascii_edge(r.char), end)
-    return (start, end)
-
-
-def _nfa_from_regex_or(r, nfa):
-    assert isinstance(r, RegexOr)
-    
-    (s1, e1) = _nfa_from_regex(r.r1, nfa)
-    (s2, e2) = _nfa_from_regex(r.r2, nfa)
-
-    sor = nfa.mk_node()
-    eor = nfa.mk_node()
-
-    nfa.connect(sor, EdgeType.mk_epsilon_edge(), s1)
-    nfa.connect(sor, EdgeType.mk_epsilon_edge(), s2)
-
-    nfa.connect(e1, EdgeType.mk_epsilon_edge(), eor)
-    nfa.connect(e2, EdgeType.mk_epsilon_edge(), eor)
-
-    return (sor, eor)
-
-def _nfa_from_regex_sequence(r, nfa):
-    assert isinstance(r, RegexSequence)
-
-    (s1, e1) = _nfa_from_regex(r.r1, nfa)
-    (s2, e2) = _nfa_from_regex(r.r2, nfa)
-
-    nfa.connect(e1, EdgeType.mk_epsilon_edge(), s2)
-    # replace_old_nfa_node(nfa, e1, s2)
-
-    return (s1, e2)
-
-#     s -<whatever>-> end
-#     ^               |
-#     |               eps
-#     eps             |
-#     |               |
-# in->nodestar <------*
-#     |
-#     |
-#     v
-#    out
-def _nfa_from_regex_star(star, nfa):
-    assert isinstance(star, StarRegex)
-
-    (s, e) = _nfa_from_regex(star.r, nfa)
-
-    nodestar = nfa.mk_node()
-    nfa.connect(nodestar, EdgeType.mk_none_edge(), s)
-    nfa.connect(e, EdgeType.mk_epsilon_edge(), nodestar)
-
-    return (nodestar, nodestar)
-
-def _nfa_from_regex(r, nfa):
+import collections
+
+import numpy as np
+
+from .lru import LRUCache
+from .regex import *
+from .nfa import *
+
+# Compiled NFA fragments are kept for at most this many edges in total.
+DEFAULT_CACHE_EDGES = 1 << 20
+
+# Pasting a fragment costs a few numpy calls, which is more than building a
+# handful of edges by hand, so smaller subtrees are never cached.
+_MIN_CACHED_EDGES = 16
+
+# Most subtrees of random regexes are never seen twice. A subtree is only
+# compiled into a fragment the second time it comes up; the ones seen once
+# are remembered in a table of at most this many entries.
+_MAX_CANDIDATES = 1 << 16
+
+
+# The Thompson construction of a subtree only touches the nodes and edges it
+# creates, and those are numbered contiguously. So the NFA of a subtree can be
+# stored relative to its first node and edge, and pasted at any offset into
+# another NFA, giving exactly what compiling it again would have given.
+class _Fragment:
+    __slots__ = ("numnodes", "edges", "start", "end")
+
+    # edges: (num edges, 3) array of src / label / dest rows
+    def __init__(self, numnodes, edges, start, end):
+        self.numnodes = numnodes
+        self.edges = edges
+        self.start = start
+        self.end = end
+
+# LRU cache from Regex to _Fragment, bounded by the total number of cached
+# edges. Regexes are hash-consed, so a lookup is a dict probe on identity.
+class CompileCache(LRUCache):
+    def __init__(self, max_edges=DEFAULT_CACHE_EDGES):
+        LRUCache.__init__(self, max_edges, size=_fragment_edges)
+        self._candidates = collections.OrderedDict()
+
+    # edges of all the cached fragments
+    @property
+    def num_edges(self):
+        return self.size
+
+    # True if r has been looked up before, i.e. if its fragment is worth
+    # building
+    def admit(self, r):
+        with self._lock:
+            if r in self._candidates:
+                del self._candidates[r]
+                return True
+            self._candidates[r] = None
+            if len(self._candidates) > _MAX_CANDIDATES:
+                self._candidates.popitem(last=False)
+            return False
+
+    def clear(self):
+        LRUCache.clear(self)
+        with self._lock:
+            self._candidates.clear()
+
+
+def _fragment_edges(frag):
+    return len(frag.edges)
+
+
+COMPILE_CACHE = CompileCache()
+
+_VISIT = 0
+_FINISH = 1
+
+# EdgeType ints of the literals seen so far
+_labels = {}
+
+def _label(c):
+    label = _labels.get(c)
+    if label is None:
+        label = _labels[c] = EdgeType.mk_ascii_edge(c).to_int
+    return label
+
+
+# Thompson's construction with an explicit stack, so the depth of the regex
+# is not limited by the recursion limit (left-deep chains of literals are
+# as deep as they are long). Edges are collected in lists and turned into an
+# NFA once at the end.
+#
+# A subtree is compiled when it is popped with _VISIT; its children are
+# pushed after a _FINISH entry, which pops their (start, end) nodes off
+# `built` and links them up. Nodes are numbered in the order they are made:
+# the left child's, the right child's, then the parent's own.
+#
+#   r1 | r2:  sor -eps-> s1 ... e1 -eps-> eor
+#             sor -eps-> s2 ... e2 -eps-> eor
+#
+#   r1 r2:    s1 ... e1 -eps-> s2 ... e2
+#
+#   r*:       s -<whatever>-> end
+#             ^               |
+#             |               eps
+#             eps             |
+#             |               |
+#         in->nodestar <------*
+#             |
+#             v
+#            out
+def _compile(root, cache):
+    eps = EdgeType._EPSILON_EDGE_VAL
+    (src, label, dest) = ([], [], [])
+    numnodes = 0
+
+    built = []
+    todo = [(_VISIT, root, None)]
+    while todo:
+        (op, r, mark) = todo.pop()
+        cls = type(r)
+
+        if op == _VISIT:
+            if cls is RegexASCII:
+                src.append(numnodes)
+                label.append(_label(r.char))
+                dest.append(numnodes + 1)
+                built.append((numnodes, numnodes + 1))
+                numnodes += 2
+                continue
+
+            # Ors and stars are where generated regexes repeat themselves;
+            # caching the links of literal chains would cost more than it
+            # saves
+            if cache is not None and (cls is not RegexSequence or r is root):
+                frag = cache.get(r)
+                if frag is not None:
+                    edges = (frag.edges + np.array([numnodes, 0, numnodes],
+                                                   dtype=frag.edges.dtype)).T.tolist()
+                    src.extend(edges[0])
+                    label.extend(edges[1])
+                    dest.extend(edges[2])
+                    built.append((numnodes + frag.start, numnodes + frag.end))
+                    numnodes += frag.numnodes
+                    continue
+                mark = (numnodes, len(src))
+
+            todo.append((_FINISH, r, mark))
+            if cls is StarRegex:
+                todo.append((_VISIT, r.r, None))
+            elif cls is RegexOr or cls is RegexSequence:
+                todo.append((_VISIT, r.r2, None))
+                todo.append((_VISIT, r.r1, None))
+            else:
+                raise RuntimeError("should not reach here, unreachable branch!")
+            continue
+
+        if cls is RegexSequence:
+            (s2, e2) = built.pop()
+            (s1, e1) = built.pop()
+            src.append(e1)
+            label.append(eps)
+            dest.append(s2)
+            built.append((s1, e2))
+        elif cls is RegexOr:
+            (s2, e2) = built.pop()
+            (s1, e1) = built.pop()
+            (sor, eor) = (numnodes, numnodes + 1)
+            numnodes += 2
+            src.extend([sor, sor, e1, e2])
+            label.extend([eps, eps, eps, eps])
+            dest.extend([s1, s2, eor, eor])
+            built.append((sor, eor))
+        else:
+            (s, e) = built.pop()
+            nodestar = numnodes
+            numnodes += 1
+            src.extend([nodestar, e])
+            label.extend([eps, eps])
+            dest.extend([s, nodestar])
+            built.append((nodestar, nodestar))
+
+        if mark is not None:
+            (first_node, first_edge) = mark
+            if len(src) - first_edge >= _MIN_CACHED_EDGES and cache.admit(r):
+                edges = np.array([src[first_edge:], label[first_edge:], dest[first_edge:]],
+                                 dtype=np.int32).T
+                edges -= np.array([first_node, 0, first_node], dtype=np.int32)
+                (start, end) = built[-1]
+                cache.put(r, _Fragment(numnodes - first_node, np.ascontiguousarray(edges),
+                                       start - first_node, end - first_node))
+
+    assert len(built) == 1
+    (start, end) = built[0]
+    return (numnodes, src, label, dest, start, end)
+
+
+# cache: a CompileCache, or None to compile from scratch
+def nfa_from_regex(r, cache=COMPILE_CACHE):
     assert isinstance(r, Regex)
-    assert isinstance(nfa, NFA)
-
-    if isinstance(r, RegexASCII):
-        return _nfa_from_regex_ascii(r, nfa)
-    elif isinstance(r, RegexOr):
-        return _nfa_from_regex_or(r, nfa)
-    elif isinstance(r, RegexSequence):
-        return _nfa_from_regex_sequence(r, nfa)
-    elif isinstance(r, StarRegex):
-        return _nfa_from_regex_star(r, nfa)
-    else:
-        raise RuntimeError("should not reach here, unreachable branch!")
-
-def nfa_from_regex(r):
-    nfa = NFA()
-    (start, end) = _nfa_from_regex(r, nfa)
-    nfa.start_node = start
-    nfa.end_node = end
-    return nfa
+    (numnodes, src, label, dest, start, end) = _compile(r, cache)
+    return NFA.from_edges(numnodes, src, label, dest, start, end)
 
 
 def regex_from_nfa(n):
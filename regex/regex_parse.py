@@ -0,0 +1,247 @@
+import re
+import string
+
+from .lru import LRUCache
+from .regex import RegexASCII, RegexOr, RegexSequence, StarRegex
+from .regex_nfa_convert import nfa_from_regex
+
+# Text -> Regex, in one left to right pass with an explicit stack of open
+# groups, so nesting depth is not limited by the recursion limit. Two
+# syntaxes:
+#
+#   repo:  what str(Regex) prints. Literals, \c for a literal metacharacter
+#          (any of regex.METACHARS), (r1|r2) and <r>* , where the space after
+#          the * is optional. A group may have any number of alternatives,
+#          or just one.
+#   posix: the usual subset. Literals, \c for any literal c, (...) groups,
+#          r1|r2 with the lowest precedence, postfix * and + and character
+#          classes like [a-z_]. The regex AST has no empty regex, so ?,
+#          {n,m}, empty alternatives and empty groups are errors, as are the
+#          anchors, . and negated classes.
+#
+# In both, literals are ASCII letters, digits and punctuation, the symbols
+# an NFA edge can have; any other character, say a space or a control
+# character, is an error.
+#
+# Sequences are built left nested and alternatives left to right, like
+# regex_mk_random builds them. str(Regex) doesn't show how sequences nest, so
+# parse_regex(str(r)) can be a different node than r, but it prints the same
+# and compiles to the same nodes and edges (in another edge order).
+SYNTAXES = ("repo", "posix")
+
+# Patterns whose NFAs are kept by the default cache.
+DEFAULT_CACHE_PATTERNS = 1 << 16
+
+
+class RegexParseError(RuntimeError):
+    def __init__(self, message, pattern, pos):
+        RuntimeError.__init__(self, "%s at position %s of %r" % (message, pos, pattern))
+        self._pattern = pattern
+        self._pos = pos
+
+    @property
+    def pattern(self):
+        return self._pattern
+
+    @property
+    def pos(self):
+        return self._pos
+
+
+_LITERAL = 0
+_ESCAPE = 1
+_OPEN = 2
+_OPEN_STAR = 3
+_ALT = 4
+_CLOSE = 5
+_CLOSE_STAR = 6
+_STAR = 7
+_PLUS = 8
+_CLASS = 9
+_UNSUPPORTED = 10
+
+# character -> token, for the characters that aren't literals
+_TOKENS = {
+    "repo": {"\\": _ESCAPE, "(": _OPEN, "<": _OPEN_STAR, "|": _ALT, ")": _CLOSE,
+             ">": _CLOSE_STAR, "*": _UNSUPPORTED},
+    "posix": {"\\": _ESCAPE, "(": _OPEN, "|": _ALT, ")": _CLOSE, "*": _STAR, "+": _PLUS,
+              "[": _CLASS, "]": _UNSUPPORTED, "?": _UNSUPPORTED, "{": _UNSUPPORTED,
+              "}": _UNSUPPORTED, ".": _UNSUPPORTED, "^": _UNSUPPORTED, "$": _UNSUPPORTED},
+}
+
+# the next character that isn't a literal
+_SPECIAL = dict((syntax, re.compile("[%s]" % re.escape("".join(tokens))))
+                for (syntax, tokens) in _TOKENS.items())
+
+# the characters a literal can be: the ones EdgeType.mk_ascii_edge has a
+# label for. No space, control characters or non-ASCII.
+_literals = dict((c, RegexASCII(c))
+                 for c in string.ascii_letters + string.digits + string.punctuation)
+
+
+def _literal(pattern, i):
+    r = _literals.get(pattern[i])
+    if r is None:
+        raise RegexParseError("invalid character %r" % (pattern[i], ), pattern, i)
+    return r
+
+
+# the alternatives of a group, with `seq` the last one
+def _alternatives(pattern, alts, seq, i):
+    if seq is None:
+        raise RegexParseError("empty regex" if not alts else "empty alternative", pattern, i)
+    if not alts:
+        return seq
+    r = alts[0]
+    for a in alts[1:]:
+        r = RegexOr(r, a)
+    return RegexOr(r, seq)
+
+
+# [...] starting at i. Returns (regex, index after the ]).
+def _char_class(pattern, i):
+    start = i
+    i += 1
+    if i < len(pattern) and pattern[i] == "^":
+        raise RegexParseError("negated character classes are not supported", pattern, i)
+
+    chars = []
+    while True:
+        if i >= len(pattern):
+            raise RegexParseError("unterminated character class", pattern, start)
+        c = pattern[i]
+        if c == "]":
+            break
+        if c == "\\":
+            i += 1
+            if i >= len(pattern):
+                raise RegexParseError("trailing backslash", pattern, i - 1)
+            c = pattern[i]
+        if i + 2 < len(pattern) and pattern[i + 1] == "-" and pattern[i + 2] != "]":
+            hi = pattern[i + 2]
+            if hi < c:
+                raise RegexParseError("bad range %s-%s" % (c, hi), pattern, i)
+            chars.extend(chr(j) for j in range(ord(c), ord(hi) + 1))
+            i += 3
+        else:
+            chars.append(c)
+            i += 1
+
+    if not chars:
+        raise RegexParseError("empty character class", pattern, start)
+    r = None
+    for c in dict.fromkeys(chars):
+        lit = _literals.get(c)
+        if lit is None:
+            raise RegexParseError("invalid character %r" % (c, ), pattern, start)
+        r = lit if r is None else RegexOr(r, lit)
+    return (r, i + 1)
+
+
+def parse_regex(pattern, syntax="repo"):
+    tokens = _TOKENS.get(syntax)
+    if tokens is None:
+        raise RuntimeError("unknown regex syntax: %s" % (syntax, ))
+    special = _SPECIAL[syntax]
+
+    # the group being parsed: its alternatives so far, the sequence of the
+    # current alternative without its last atom, and the last atom, which
+    # the postfix operators apply to. Enclosing groups wait on the stack as
+    # (their closing token, position of the group they wait on, alts, seq).
+    (alts, seq, atom) = ([], None, None)
+    stack = []
+    closer = None
+
+    n = len(pattern)
+    i = 0
+    while i < n:
+        c = pattern[i]
+        token = tokens.get(c, _LITERAL)
+
+        if token == _LITERAL:
+            # the whole run of literals at once
+            m = special.search(pattern, i + 1)
+            end = n if m is None else m.start()
+            for c in pattern[i:end]:
+                if atom is not None:
+                    seq = atom if seq is None else RegexSequence(seq, atom)
+                atom = _literals.get(c)
+                if atom is None:
+                    _literal(pattern, pattern.index(c, i))
+            i = end
+            continue
+        elif token == _ESCAPE or token == _CLASS:
+            if atom is not None:
+                seq = atom if seq is None else RegexSequence(seq, atom)
+            if token == _CLASS:
+                (atom, i) = _char_class(pattern, i)
+                continue
+            i += 1
+            if i == n:
+                raise RegexParseError("trailing backslash", pattern, i - 1)
+            atom = _literal(pattern, i)
+        elif token == _STAR or token == _PLUS:
+            if atom is None:
+                raise RegexParseError("nothing to repeat", pattern, i)
+            atom = StarRegex(atom) if token == _STAR else RegexSequence(atom, StarRegex(atom))
+        elif token == _OPEN or token == _OPEN_STAR:
+            if atom is not None:
+                seq = atom if seq is None else RegexSequence(seq, atom)
+            stack.append((closer, i, alts, seq))
+            closer = _CLOSE if token == _OPEN else _CLOSE_STAR
+            (alts, seq, atom) = ([], None, None)
+        elif token == _ALT:
+            if atom is not None:
+                seq = atom if seq is None else RegexSequence(seq, atom)
+            if seq is None:
+                raise RegexParseError("empty alternative", pattern, i)
+            alts.append(seq)
+            (seq, atom) = (None, None)
+        elif token == _CLOSE or token == _CLOSE_STAR:
+            if token != closer:
+                raise RegexParseError("unmatched %r" % (c, ), pattern, i)
+            if atom is not None:
+                seq = atom if seq is None else RegexSequence(seq, atom)
+            r = _alternatives(pattern, alts, seq, i)
+            if token == _CLOSE_STAR:
+                if pattern[i + 1:i + 2] != "*":
+                    raise RegexParseError("expected * after >", pattern, i + 1)
+                r = StarRegex(r)
+                i += 1
+                if pattern[i + 1:i + 2] == " ":
+                    i += 1
+            (closer, _, alts, seq) = stack.pop()
+            atom = r
+        else:
+            raise RegexParseError("unsupported %r" % (c, ), pattern, i)
+        i += 1
+
+    if stack:
+        raise RegexParseError("unclosed group", pattern, stack[-1][1])
+    if atom is not None:
+        seq = atom if seq is None else RegexSequence(seq, atom)
+    return _alternatives(pattern, alts, seq, n)
+
+
+# LRU cache of at most max_patterns entries, from (syntax, pattern) to the
+# compiled NFA for compile_pattern.
+class PatternCache(LRUCache):
+    def __init__(self, max_patterns=DEFAULT_CACHE_PATTERNS):
+        LRUCache.__init__(self, max_patterns)
+
+
+PATTERN_CACHE = PatternCache()
+
+
+# The NFA of a pattern. Cached NFAs are shared between callers, and must
+# not be modified.
+def compile_pattern(pattern, syntax="repo", cache=PATTERN_CACHE):
+    if cache is None:
+        return nfa_from_regex(parse_regex(pattern, syntax))
+
+    key = (syntax, pattern)
+    nfa = cache.get(key)
+    if nfa is None:
+        nfa = nfa_from_regex(parse_regex(pattern, syntax))
+        cache.put(key, nfa)
+    return nfa
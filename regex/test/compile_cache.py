@@ -0,0 +1,51 @@
+import gc
+import pickle
+import random
+import weakref
+
+from regex import *
+from regex.regex import RegexASCII, RegexOr, RegexSequence, StarRegex
+from regex.regex_nfa_convert import COMPILE_CACHE, CompileCache
+
+# structurally equal regexes are the same object
+a = RegexOr(RegexSequence(RegexASCII("a"), RegexASCII("b")), StarRegex(RegexASCII("c")))
+b = RegexOr(RegexSequence(RegexASCII("a"), RegexASCII("b")), StarRegex(RegexASCII("c")))
+assert a is b and hash(a) == hash(b)
+assert RegexOr(RegexASCII("a"), RegexASCII("b")) is not RegexOr(RegexASCII("b"), RegexASCII("a"))
+assert a.size == 6
+
+# the intern table doesn't keep nodes alive, and a node built again after
+# the first died is a new one
+dead = weakref.ref(RegexOr(RegexASCII("x"), RegexASCII("y")))
+gc.collect()
+assert dead() is None
+assert str(RegexOr(RegexASCII("x"), RegexASCII("y"))) == "(x|y)"
+assert RegexOr(RegexSequence(RegexASCII("a"), RegexASCII("b")), StarRegex(RegexASCII("c"))) is a
+
+# and across pickling
+assert pickle.loads(pickle.dumps(a)) is a
+assert pickle.loads(pickle.dumps([a, a.r2])) == [a, a.r2]
+
+# a cached compile gives the same NFA, down to the node numbering. Fragments
+# are built the second time a subtree comes up and used from the third on.
+rng = random.Random(0)
+regexes = [regex.regex_mk_random_sized(12, 1, 3, rng) for _ in range(200)]
+regexes += regexes[:50] * 2
+
+COMPILE_CACHE.clear()
+cached = [regex_nfa_convert.nfa_from_regex(r) for r in regexes]
+assert COMPILE_CACHE.hits >= 50
+
+for (r, n) in zip(regexes, cached):
+    m = regex_nfa_convert.nfa_from_regex(r, cache=None)
+    assert n.numnodes == m.numnodes
+    assert n.start_node == m.start_node and n.end_node == m.end_node
+    assert all((x == y).all() for (x, y) in zip(n.edges, m.edges))
+
+# the cache is bounded by the number of edges it holds
+small = CompileCache(max_edges=300)
+for _ in range(2):
+    for r in regexes[:20]:
+        regex_nfa_convert.nfa_from_regex(r, cache=small)
+assert 0 < len(small) < 20 and small.num_edges <= 300
+assert small.get(regexes[0]) is None and small.get(regexes[19]) is not None
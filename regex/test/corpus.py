@@ -0,0 +1,37 @@
+import functools
+import os
+import tempfile
+
+from regex import *
+from regex.corpus import generate_corpus
+
+def corpus_files(d):
+    out = {}
+    for name in sorted(os.listdir(d)):
+        with open(os.path.join(d, name), "rb") as f:
+            out[name] = f.read()
+    return out
+
+def build(seed, num_workers, **kwargs):
+    with tempfile.TemporaryDirectory() as d:
+        shards = list(generate_corpus(d, 120, 100, seed=seed, shard_size=50,
+                                      num_workers=num_workers, **kwargs))
+        assert sorted(shards) == [(0, 50), (1, 50), (2, 20)]
+        return corpus_files(d)
+
+# the same seed gives the same files, bit for bit, whatever the number of
+# workers
+one = build(7, 1)
+assert sorted(one) == sorted(["index.json"] + ["shard-%05d.%s" % (i, ext) for i in range(3)
+                                               for ext in ("adj.npy", "nodes.npy", "regex.bin",
+                                                           "regex_offsets.npy")])
+assert build(7, 1) == one
+assert build(7, 3) == one
+
+# another seed gives other regexes
+other = build(8, 1)
+assert other["shard-00000.regex.bin"] != one["shard-00000.regex.bin"]
+
+# and so does any picklable mk_regex, here regex_mk_random
+mk = functools.partial(regex.regex_mk_random, 2, 1, 2, 1, 3)
+assert build(7, 1, mk_regex=mk) == build(7, 2, mk_regex=mk)
@@ -0,0 +1,47 @@
+import tempfile
+
+import numpy as np
+
+from regex import *
+from regex.corpus import generate_corpus, mk_samples, shard_rng
+from regex.dataset import ShardedDataset, write_index
+from regex.nfa_minimize import nfa_equivalent
+
+with tempfile.TemporaryDirectory() as d:
+    shards = sorted(generate_corpus(d, 250, 100, seed=5, shard_size=100, num_workers=1))
+    assert shards == [(0, 100), (1, 100), (2, 50)]
+
+    ds = ShardedDataset(d)
+    assert len(ds) == 250 and ds.num_shards == 3 and ds.num_nodes == 100
+
+    # shard 1 holds exactly what its own random stream generates
+    (regexes, nfas) = mk_samples(shard_rng(5, 1), 100, 100)
+    b = ds.batch(100, 200)
+    assert isinstance(b.adj, np.memmap), "batch inside a shard is not a view"
+    assert b.regexes == [str(r) for r in regexes]
+    assert [str(r) for r in b.parsed_regexes] == b.regexes
+    assert (b.adj == nfa.adj_tensor_from_nfas(nfas, 100)).all()
+    for (i, n) in enumerate(nfas[:10]):
+        decoded = nfa.nfa_from_adjacency_matrix(b.adj[i], b.start_nodes[i], b.end_nodes[i])
+        assert nfa_equivalent(decoded, n)
+
+    # across shards
+    b = ds.batch(90, 110)
+    assert len(b) == 20 and b.regexes[10:] == [str(r) for r in regexes[:10]]
+    assert (b.adj[10:] == ds.batch(100, 110).adj).all()
+
+    seen = []
+    for batch in ds.iter_batches(32, shuffle=True, seed=1):
+        assert len(batch) <= 32
+        seen += batch.regexes
+    assert sorted(seen) == sorted(ds.batch(0, 250).regexes)
+    assert sum(len(b) for b in ds.iter_batches(32, drop_last=True)) == 96 + 96 + 32
+
+# an empty dataset hands out empty batches
+with tempfile.TemporaryDirectory() as d:
+    write_index(d, 50, [])
+    ds = ShardedDataset(d)
+    b = ds.batch(0, 0)
+    assert len(ds) == 0 and len(b) == 0 and b.adj.shape == (0, 50, 50)
+    assert b.regexes == [] and len(b.start_nodes) == 0
+    assert list(ds.iter_batches(8)) == []
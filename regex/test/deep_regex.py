@@ -0,0 +1,41 @@
+import pickle
+import random
+import sys
+
+from regex import *
+from regex.regex import RegexASCII, RegexOr, RegexSequence, StarRegex
+
+# far deeper than the recursion limit
+DEPTH = 20 * sys.getrecursionlimit()
+
+r = RegexASCII("a")
+for i in range(1, DEPTH):
+    r = RegexSequence(r, RegexASCII("ab"[i % 2]))
+assert r.size == 2 * DEPTH - 1
+
+text = "ab" * (DEPTH // 2)
+assert str(r) == text
+assert r.generate_text(3) == text
+assert pickle.loads(pickle.dumps(r)) is r
+assert regex.regex_prune(r) is r
+
+n = regex_nfa_convert.nfa_from_regex(r)
+assert n.numnodes == 2 * DEPTH and n.numedges == 2 * DEPTH - 1
+(src, label, dest) = n.edges
+assert "".join(chr(c) for c in label[label > 1].tolist()) == text
+
+# stars of stars are pruned however deep they are
+s = RegexASCII("c")
+for _ in range(DEPTH):
+    s = StarRegex(s)
+s = RegexOr(s, r)
+pruned = regex.regex_prune(s)
+assert isinstance(pruned.r1, StarRegex) and pruned.r1.r is RegexASCII("c")
+assert pruned.r2 is r
+
+# generate_text draws from its rng, and stars repeat up to cost times
+star = StarRegex(RegexOr(RegexASCII("x"), RegexASCII("y")))
+texts = [star.generate_text(4, random.Random(i)) for i in range(200)]
+assert all(len(t) <= 4 and set(t) <= set("xy") for t in texts)
+assert len(set(len(t) for t in texts)) == 5
+assert star.generate_text(4, random.Random(3)) == star.generate_text(4, random.Random(3))
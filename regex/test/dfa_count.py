@@ -0,0 +1,79 @@
+import collections
+import itertools
+import os
+import random
+import signal
+
+import numpy as np
+
+from regex import *
+from regex.nfa import NFA
+from regex.nfa_match import NFAMatcher
+from regex.dfa_count import COUNTER_CACHE, DFACounter, dfa_counter
+from regex.lru import LRUCache
+from regex.regex_parse import parse_regex
+
+def compile(pattern):
+    return regex_nfa_convert.nfa_from_regex(parse_regex(pattern))
+
+# the counts, the listing and unranking agree with brute force
+for pattern in ["(a|b)<(c|dd)>* ", "<(ab|a)>* b", "((a|b)|c)<a>* ", "ab(c|<a>* )"]:
+    n = compile(pattern)
+    c = DFACounter(n, 6)
+    m = NFAMatcher(n)
+    alphabet = sorted(set(pattern) - set("()|<>* "))
+    brute = [[s for s in map("".join, itertools.product(alphabet, repeat=l)) if m.match(s)]
+             for l in range(7)]
+    assert [c.count(l) for l in range(7)] == [len(b) for b in brute], pattern
+    listed = list(c.strings())
+    assert listed == [s for b in brute for s in b] and c.total == len(listed)
+    assert [c.unrank(k) for k in range(c.total)] == listed
+    assert list(c.strings(3)) == [s for b in brute[:4] for s in b]
+
+# samples are uniform over the strings
+c = dfa_counter("(a|b)<(c|dd)>* ", 6)
+counts = collections.Counter(c.sample(40000, 0))
+assert len(counts) == c.total == 40
+assert min(counts.values()) > 800 and max(counts.values()) < 1200
+
+# counts beyond int64 are exact
+c = dfa_counter("<(a|b|c)>* ", 100)
+assert c.total == (3 ** 101 - 1) // 2 and c.count(100) == 3 ** 100
+texts = c.sample(500, 1)
+assert NFAMatcher(compile("<(a|b|c)>* ")).match_batch(texts).all()
+assert np.mean([len(t) for t in texts]) > 98
+assert c.unrank(c.total - 1) == "c" * 100 and c.unrank(0) == ""
+
+# random regexes
+rng = random.Random(0)
+for i in range(30):
+    r = regex.regex_mk_random(2, 2, 2, 1, 3, rng)
+    c = dfa_counter(r, 20)
+    (codes, lengths) = c.sample_codes(300, i)
+    assert lengths.max() <= 20
+    assert NFAMatcher(regex_nfa_convert.nfa_from_regex(r)).match_codes(codes, lengths).all()
+
+# an empty language has nothing to sample
+c = DFACounter(NFA.from_edges(2, [], [], [], 0, 1), 5)
+assert c.total == 0 and list(c.strings()) == []
+try:
+    c.sample(1)
+    assert False, "sampled an empty language"
+except RuntimeError:
+    pass
+
+# tables are built once per pattern and length
+cache = LRUCache(4)
+a = dfa_counter("(a|b)", 5, cache=cache)
+assert dfa_counter("(a|b)", 5, cache=cache) is a
+assert dfa_counter(parse_regex("(a|b)"), 5, cache=cache) is not a
+assert dfa_counter("(a|b)", 6, cache=cache) is not a and len(cache) == 3
+
+# a child forked while the cache is locked can still use it
+with COUNTER_CACHE._lock:
+    pid = os.fork()
+    if pid == 0:
+        signal.alarm(10)
+        dfa_counter("(a|b)", 5)
+        os._exit(0)
+assert os.waitpid(pid, 0)[1] == 0
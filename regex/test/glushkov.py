@@ -0,0 +1,50 @@
+import random
+
+from regex import *
+from regex.glushkov import MAX_POSITIONS, ShiftAndMatcher, glushkov, regex_matcher
+from regex.nfa_dfa import LazyDFA
+from regex.regex_parse import parse_regex
+from regex.test.util import gen_text
+
+random.seed(0)
+
+# (a|b)*c: positions a=1, b=2, c=3
+(codes, follow, last) = glushkov(parse_regex("<(a|b)>* c"))
+assert codes == [ord("a"), ord("b"), ord("c")]
+assert follow == [0b1110, 0b1110, 0b1110, 0]
+assert last == 0b1000
+# a nullable regex accepts in the initial state
+assert glushkov(parse_regex("<a>* "))[2] == 0b11
+
+for _ in range(50):
+    r = regex.regex_mk_random(2, 1, 1, 1, 3)
+    n = regex_nfa_convert.nfa_from_regex(r)
+    alphabet = sorted(set(str(r)) - set("()|<>* ")) + ["z"]
+    strings = ["".join(random.choice(alphabet) for _ in range(random.randint(0, 12)))
+               for _ in range(300)]
+    strings += [gen_text(r) for _ in range(50)]
+
+    expected = list(LazyDFA(n).match_batch(strings))
+    m = ShiftAndMatcher(r)
+    assert list(m.match_batch(strings)) == expected, "mismatch on %s" % (r, )
+    assert m.match(strings[-1]) == expected[-1]
+    assert isinstance(regex_matcher(r), ShiftAndMatcher)
+
+# more positions than a word holds: glushkov refuses, regex_matcher falls
+# back to a LazyDFA
+big = "|".join("ab" for _ in range(MAX_POSITIONS // 2 + 1))
+try:
+    ShiftAndMatcher(parse_regex(big))
+    assert False, "built a matcher past MAX_POSITIONS"
+except RuntimeError:
+    pass
+assert isinstance(regex_matcher(big), LazyDFA)
+assert list(regex_matcher(big).match_batch(["ab", "a", ""])) == [True, False, False]
+
+# exactly MAX_POSITIONS positions still fit, the last in the top bit
+exact = "<%s>* z" % ("".join("ab"[i % 2] for i in range(MAX_POSITIONS - 1)), )
+m = regex_matcher(exact)
+assert isinstance(m, ShiftAndMatcher) and m.num_positions == MAX_POSITIONS
+word = "".join("ab"[i % 2] for i in range(MAX_POSITIONS - 1))
+assert list(m.match_batch(["z", word + "z", word * 3 + "z", word, word[1:] + "z"])) == \
+    [True, True, True, False, False]
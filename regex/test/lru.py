@@ -0,0 +1,24 @@
+from regex.lru import LRUCache
+
+# bounded by the number of entries
+cache = LRUCache(2)
+cache.put("a", 1)
+cache.put("b", 2)
+assert cache.get("a") == 1
+cache.put("c", 3)
+assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+assert len(cache) == 2 and (cache.hits, cache.misses) == (3, 1)
+
+# or by the sizes of the values; putting a key again replaces its value
+cache = LRUCache(10, size=len)
+cache.put("a", "xxxx")
+cache.put("b", "xxxx")
+cache.put("a", "xx")
+assert cache.size == 6
+cache.put("c", "xxxxx")
+assert cache.get("b") is None and cache.size == 7
+cache.put("d", "x" * 11)
+assert cache.get("d") is None and len(cache) == 2
+
+cache.clear()
+assert len(cache) == 0 and cache.size == 0
@@ -0,0 +1,80 @@
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from regex import *
+from regex.nfa_dedup import FingerprintIndex, nfa_fingerprint, nfa_fingerprints
+from regex.nfa_order import nfa_relabel
+from regex.pipeline import dedup_nfas
+
+random.seed(0)
+
+regexes = [regex.regex_mk_random(3, 1, 1, 1, 3) for _ in range(300)]
+nfas = [regex_nfa_convert.nfa_from_regex(r) for r in regexes]
+fps = nfa_fingerprints(nfas)
+assert fps.dtype == np.uint64 and len(fps) == len(nfas)
+assert [nfa_fingerprint(n) for n in nfas[:20]] == fps[:20].tolist()
+
+# renumbering the nodes keeps the fingerprint
+for n in nfas[:50]:
+    for order in ("bfs", "rcm"):
+        assert nfa_fingerprint(nfa_relabel(n, order)) == nfa_fingerprint(n)
+
+# the same structure gives the same fingerprint, and different structures
+# different ones: here every distinct str(regex) compiles to a different NFA
+by_text = {}
+for (r, fp) in zip(regexes, fps.tolist()):
+    by_text.setdefault(str(r), set()).add(fp)
+assert all(len(s) == 1 for s in by_text.values())
+assert len(set(fps.tolist())) == len(by_text)
+
+# start and end nodes are part of the structure
+n = regex_nfa_convert.nfa_from_regex(regex.RegexASCII("a"))
+m = nfa.NFA.from_edge_array(n.numnodes, n.edge_array.copy(), n.end_node.idx, n.start_node.idx)
+assert nfa_fingerprint(n) != nfa_fingerprint(m)
+
+with tempfile.TemporaryDirectory() as d:
+    path = os.path.join(d, "seen.fpi")
+    index = FingerprintIndex(path, capacity=16)
+    new = index.add_many(fps)
+    assert new.sum() == len(by_text) == len(index)
+    # the first of every duplicate is the new one
+    assert [fps[:i + 1].tolist().count(fp) == 1 for (i, fp) in enumerate(fps.tolist())] == \
+        new.tolist()
+    assert index.capacity > 16 and index.contains_many(fps).all()
+    assert not index.add_many(fps).any()
+    assert index.add(0) and 0 in index and not index.add(1)
+    index.close()
+
+    # reopened from disk
+    with FingerprintIndex(path) as index:
+        assert len(index) == len(by_text) + 1 and index.contains_many(fps).all()
+        assert not index.contains_many(np.arange(2, 1000, dtype=np.uint64)).any()
+
+        # a stream that comes back through the stage keeps only the new NFAs
+        more = [regex.regex_mk_random(3, 1, 1, 1, 3) for _ in range(100)]
+        samples = list(zip(regexes + more, nfas + [regex_nfa_convert.nfa_from_regex(r)
+                                                   for r in more]))
+        kept = list(dedup_nfas(iter(samples), index, chunk_size=64))
+        assert {str(r) for (r, _) in kept} == {str(r) for r in more} - set(by_text)
+        assert len(kept) == len({str(r) for (r, _) in kept})
+
+    with open(path, "r+b") as f:
+        f.write(b"garbage!")
+    try:
+        FingerprintIndex(path)
+        assert False, "opened a corrupt index"
+    except RuntimeError:
+        pass
+
+# many random fingerprints, with repeats, through a growing index
+with tempfile.TemporaryDirectory() as d:
+    keys = np.random.default_rng(0).integers(0, 1 << 20, size=200000).astype(np.uint64)
+    with FingerprintIndex(os.path.join(d, "big.fpi"), capacity=1024) as index:
+        new = np.concatenate([index.add_many(keys[lo:lo + 10000])
+                              for lo in range(0, len(keys), 10000)])
+        assert new.sum() == len(np.unique(keys)) == len(index)
+        (_, first) = np.unique(keys, return_index=True)
+        assert np.flatnonzero(new).tolist() == sorted(first.tolist())
@@ -0,0 +1,26 @@
+import random
+
+from regex import *
+from regex.nfa_dfa import LazyDFA
+from regex.nfa_match import NFAMatcher
+from regex.test.util import gen_text
+
+random.seed(0)
+
+for _ in range(20):
+    r = regex.regex_mk_random(2, 1, 1, 1, 3)
+    n = regex_nfa_convert.nfa_from_regex(r)
+
+    alphabet = sorted(set(str(r)) - set("()|<>* ")) + ["z"]
+    strings = ["".join(random.choice(alphabet) for _ in range(random.randint(0, 12)))
+               for _ in range(300)]
+    strings += [gen_text(r) for _ in range(50)]
+
+    expected = list(NFAMatcher(n).match_batch(strings))
+    assert list(LazyDFA(n).match_batch(strings)) == expected, "mismatch on %s" % (r, )
+
+    # a cache too small to hold the DFA has to flush, and eventually gives
+    # up on determinizing
+    dfa = LazyDFA(n, max_states=2)
+    for _ in range(5):
+        assert list(dfa.match_batch(strings)) == expected, "mismatch on %s" % (r, )
@@ -0,0 +1,60 @@
+import os
+import random
+import re
+import tempfile
+
+from regex import *
+from regex.nfa_dot import dot_source, write_dot, write_dots
+from regex.nfa_io import NFAFile, write_nfas
+
+random.seed(0)
+
+nfas = [regex_nfa_convert.nfa_from_regex(regex.regex_mk_random(2, 1, 1, 1, 3))
+        for _ in range(20)]
+
+_EDGE = re.compile(r'^\t(\d+) -> (\d+) \[xlabel="((?:[^"\\]|\\.)*)"\]$')
+_NODE = re.compile(r'^\t(\d+)( \[.*\])?$')
+
+for n in nfas:
+    text = dot_source(n)
+    assert text.startswith("// NFA\ndigraph {\n") and text.endswith("}\n")
+
+    (edges, nodes, attrs) = ([], set(), {})
+    for line in text.split("\n"):
+        m = _EDGE.match(line)
+        if m:
+            label = m.group(3).replace('\\"', '"').replace("\\\\", "\\")
+            edges.append((int(m.group(1)), label, int(m.group(2))))
+            continue
+        m = _NODE.match(line)
+        if m:
+            nodes.add(int(m.group(1)))
+            if m.group(2):
+                attrs[int(m.group(1))] = m.group(2)
+
+    assert nodes == set(range(n.numnodes))
+    assert edges == [(c.src.idx, str(c.edge), c.dest.idx) for c in n.connections]
+    assert "doublecircle" in attrs[n.start_node.idx]
+    assert "filled" in attrs[n.end_node.idx]
+
+# labels that need escaping
+n = nfa.NFA.from_edges(3, [0, 1], [ord('"'), ord("\\")], [1, 2])
+assert '0 -> 1 [xlabel="\\""]' in dot_source(n)
+assert '1 -> 2 [xlabel="\\\\"]' in dot_source(n)
+# and no start or end node
+assert "doublecircle" not in dot_source(n) and "filled" not in dot_source(n)
+
+with tempfile.TemporaryDirectory() as d:
+    path = os.path.join(d, "one.dot")
+    write_dot(nfas[0], path)
+    with open(path) as f:
+        assert f.read() == dot_source(nfas[0])
+
+    # batch mode, from a file of NFAs, in worker processes and in this one
+    write_nfas(os.path.join(d, "nfas.bin"), nfas)
+    for num_workers in (None, 2):
+        paths = [os.path.join(d, "%s_%d.dot" % (num_workers, i)) for i in range(len(nfas))]
+        assert write_dots(NFAFile(os.path.join(d, "nfas.bin")), paths, num_workers) == paths
+        for (n, p) in zip(nfas, paths):
+            with open(p) as f:
+                assert f.read() == dot_source(n)
@@ -0,0 +1,76 @@
+import os
+import pickle
+import random
+import tempfile
+
+import numpy as np
+
+from regex import *
+from regex.nfa import NFA, EdgeType
+from regex.nfa_io import NFAFile, NFAWriter, nfa_from_bytes, nfa_to_bytes, write_nfas
+
+def same(a, b):
+    return (a.numnodes, a.edge_array.tolist(), a.start_node, a.end_node) == \
+        (b.numnodes, b.edge_array.tolist(), b.start_node, b.end_node)
+
+rng = random.Random(0)
+nfas = [regex_nfa_convert.nfa_from_regex(regex.regex_mk_random(2, 2, 2, 1, 4, rng))
+        for _ in range(200)]
+nfas.append(NFA())
+nfas.append(NFA.from_edges(3, [0], [EdgeType.mk_ascii_edge("a").to_int], [2], start=0))
+
+for n in nfas:
+    buf = nfa_to_bytes(n)
+    assert len(buf) == 16 + 16 + 12 * n.numedges
+    assert same(nfa_from_bytes(buf), n)
+
+# the edges are a view into the buffer, and the NFA copies them before
+# changing anything
+n = nfas[0]
+buf = bytearray(nfa_to_bytes(n))
+loaded = nfa_from_bytes(buf)
+assert np.shares_memory(loaded.edge_array, np.frombuffer(buf, dtype=np.uint8))
+loaded.connect_many([], [], [])
+loaded.connect_idx(0, EdgeType.mk_epsilon_edge().to_int, 1)
+assert loaded.numedges == n.numedges + 1 and same(nfa_from_bytes(buf), n)
+
+for bad in [b"", b"not an nfa at all, no", nfa_to_bytes(n).replace(b"\x01\0\0\0", b"\x09\0\0\0", 1)]:
+    try:
+        nfa_from_bytes(bad)
+        assert False, "loaded %r" % (bad[:20], )
+    except RuntimeError:
+        pass
+
+with tempfile.TemporaryDirectory() as d:
+    path = os.path.join(d, "nfas.bin")
+    with NFAWriter(path) as w:
+        for (i, n) in enumerate(nfas):
+            assert w.write(n) == i
+    f = NFAFile(path)
+    assert len(f) == len(nfas)
+    assert all(same(a, b) for (a, b) in zip(f, nfas))
+    for i in [0, 57, len(nfas) - 1, -1]:
+        assert same(f[i], nfas[i])
+    assert f[3] == nfas[3] and np.shares_memory(f[3].edge_array, f._buf)
+    try:
+        f[len(nfas)]
+        assert False
+    except IndexError:
+        pass
+
+    # smaller than pickle
+    assert os.path.getsize(path) < len(pickle.dumps(nfas))
+
+    # a writer that was never closed leaves a file without an index
+    w = NFAWriter(path)
+    w.write(nfas[0])
+    w._file.flush()
+    try:
+        NFAFile(path)
+        assert False, "opened a file without an index"
+    except RuntimeError:
+        pass
+    w.close()
+
+    write_nfas(path, [])
+    assert len(NFAFile(path)) == 0 and list(NFAFile(path)) == []
@@ -0,0 +1,54 @@
+import random
+import re as pyre
+
+import numpy as np
+
+from regex import *
+from regex.nfa_match import NFAMatcher
+from regex.test.util import gen_text, to_python_re
+
+random.seed(0)
+
+r = regex.RegexSequence(regex.StarRegex(regex.RegexOr(regex.RegexASCII("a"),
+                                                      regex.RegexASCII("b"))),
+                        regex.RegexASCII("c"))
+m = NFAMatcher(regex_nfa_convert.nfa_from_regex(r))
+assert list(m.match_batch(["c", "abac", "ab", "", "abca", "bbbbbbbc"])) == \
+    [True, True, False, False, False, True]
+
+for _ in range(20):
+    r = regex.regex_mk_random(2, 1, 1, 1, 3)
+    m = NFAMatcher(regex_nfa_convert.nfa_from_regex(r))
+    pattern = pyre.compile(to_python_re(r))
+
+    alphabet = sorted(set(str(r)) - set("()|<>* ")) + ["z"]
+    strings = ["".join(random.choice(alphabet) for _ in range(random.randint(0, 12)))
+               for _ in range(300)]
+    strings += [gen_text(r) for _ in range(50)]
+
+    expected = [pattern.fullmatch(s) is not None for s in strings]
+    assert list(m.match_batch(strings)) == expected, "mismatch on %s" % (r, )
+
+# a wide alternation, thousands of nodes, builds its tables quickly
+words = ["".join(random.choice("abcdefgh") for _ in range(random.randint(2, 6)))
+         for _ in range(300)]
+r = regex.RegexASCII("x")
+for w in words:
+    lit = regex.RegexASCII(w[0])
+    for c in w[1:]:
+        lit = regex.RegexSequence(lit, regex.RegexASCII(c))
+    r = regex.RegexOr(r, lit)
+m = NFAMatcher(regex_nfa_convert.nfa_from_regex(r))
+pattern = pyre.compile(to_python_re(r))
+strings = words[:100] + ["x", "", "hhhhhhh", words[0] + "a"]
+assert list(m.match_batch(strings)) == [pattern.fullmatch(s) is not None for s in strings]
+
+# tables that can't fit in the cap are an error, not a silently huge table
+n = 5000
+chain = nfa.NFA.from_edges(n + 1, np.arange(n), ord("a") + np.arange(n) % 26,
+                           np.arange(1, n + 1), 0, n)
+try:
+    NFAMatcher(chain)
+    assert False, "tables over the cap were built"
+except RuntimeError:
+    pass
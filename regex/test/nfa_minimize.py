@@ -0,0 +1,64 @@
+import random
+
+from regex import *
+from regex.regex import RegexASCII, RegexOr, RegexSequence, StarRegex
+from regex.nfa_match import NFAMatcher
+from regex.nfa_minimize import minimal_dfa_from_nfa, nfa_equivalent
+
+def compile(r):
+    return regex_nfa_convert.nfa_from_regex(r)
+
+a = RegexASCII("a")
+b = RegexASCII("b")
+
+assert nfa_equivalent(compile(RegexOr(a, b)), compile(RegexOr(b, a)))
+assert nfa_equivalent(compile(RegexSequence(a, StarRegex(a))),
+                      compile(RegexSequence(StarRegex(a), a)))
+assert nfa_equivalent(compile(StarRegex(StarRegex(a))), compile(StarRegex(a)))
+assert nfa_equivalent(compile(StarRegex(RegexOr(a, b))),
+                      compile(StarRegex(RegexSequence(StarRegex(a), StarRegex(b)))))
+
+assert not nfa_equivalent(compile(RegexSequence(a, b)), compile(RegexSequence(b, a)))
+assert not nfa_equivalent(compile(StarRegex(a)), compile(RegexSequence(a, StarRegex(a))))
+
+# == is the same nodes and edges, not the same language
+assert compile(RegexOr(a, b)) == compile(RegexOr(a, b))
+assert compile(RegexOr(a, b)) != compile(RegexOr(b, a))
+
+# no start or end node is no language, and compares without asserting
+empty = nfa.NFA()
+empty.mk_node()
+assert not nfa_equivalent(empty, compile(a)) and empty != compile(a)
+
+assert minimal_dfa_from_nfa(compile(StarRegex(a))).numstates == 1
+assert len(set(compile(r).signature for r in [RegexOr(a, b), RegexOr(b, a), a])) == 2
+
+# relabelling and rebuilding the NFA must not change the signature
+random.seed(0)
+for _ in range(20):
+    r = regex.regex_mk_random(2, 1, 1, 1, 3)
+    n = compile(r)
+
+    perm = list(range(n.numnodes))
+    random.shuffle(perm)
+    shuffled = nfa.NFA()
+    nodes = [shuffled.mk_node() for _ in range(n.numnodes)]
+    for c in sorted(n.connections, key=lambda c: random.random()):
+        shuffled.connect(nodes[perm[c.src.idx]], c.edge, nodes[perm[c.dest.idx]])
+    shuffled.start_node = nodes[perm[n.start_node.idx]]
+    shuffled.end_node = nodes[perm[n.end_node.idx]]
+
+    assert nfa_equivalent(n, shuffled), "relabelled NFA differs: %s" % (r, )
+    assert n.signature == shuffled.signature
+
+    # the minimal DFA accepts what the NFA accepts
+    dfa = minimal_dfa_from_nfa(n)
+    alphabet = [chr(c) for c in dfa.alphabet] + ["z"]
+    strings = ["".join(random.choice(alphabet) for _ in range(random.randint(0, 8)))
+               for _ in range(200)]
+    for (s, expected) in zip(strings, NFAMatcher(n).match_batch(strings)):
+        q = dfa.start
+        for ch in s:
+            if q is not None:
+                q = dfa.delta[q].get(ord(ch))
+        assert (q is not None and dfa.accepting[q]) == expected
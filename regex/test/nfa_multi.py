@@ -0,0 +1,39 @@
+import random
+
+import numpy as np
+
+from regex import *
+from regex.nfa_dfa import LazyDFA
+from regex.nfa_multi import MultiPatternMatcher
+from regex.test.util import gen_text
+
+random.seed(0)
+
+for _ in range(10):
+    regexes = [regex.regex_mk_random(2, 1, 1, 1, 3) for _ in range(random.randint(1, 30))]
+    nfas = [regex_nfa_convert.nfa_from_regex(r) for r in regexes]
+
+    alphabet = sorted(set("".join(map(str, regexes))) - set("()|<>* ")) + ["z"]
+    strings = ["".join(random.choice(alphabet) for _ in range(random.randint(0, 12)))
+               for _ in range(300)]
+    strings += [gen_text(random.choice(regexes)) for _ in range(100)]
+
+    expected = np.array([LazyDFA(n).match_batch(strings) for n in nfas]).T
+    m = MultiPatternMatcher(regexes)
+    assert m.num_patterns == len(regexes)
+    assert (m.match_matrix(strings) == expected).all()
+    assert [list(ids) for ids in m.match_ids(strings)] == \
+        [list(np.flatnonzero(row)) for row in expected]
+    assert list(m.match_batch(strings)) == list(expected.any(axis=1))
+    assert not m.gave_up
+
+    # NFAs work as patterns too, and a cache too small for the DFA falls
+    # back to matching the patterns one by one
+    m = MultiPatternMatcher(nfas, max_states=2)
+    for _ in range(5):
+        assert (m.match_matrix(strings) == expected).all()
+    assert m.gave_up
+
+m = MultiPatternMatcher([])
+assert m.match_matrix(["", "a"]).shape == (2, 0)
+assert list(m.match_batch(["", "a"])) == [False, False]
@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+
+from regex import *
+from regex.nfa_dfa import LazyDFA
+from regex.nfa_match import NFAMatcher, encode_strings
+from regex.nfa_negative import LabelledSampler, NegativeSampler, mutate_codes
+from regex.nfa_sample import decode_strings
+from regex.regex_parse import compile_pattern
+
+# every kind of edit, and nothing else
+rng = np.random.default_rng(0)
+(codes, lengths) = encode_strings(["abcd"] * 2000)
+edited = decode_strings(*mutate_codes(codes, lengths, np.frombuffer(b"x", np.uint8), rng))
+subs = set("abcd"[:i] + "x" + "abcd"[i + 1:] for i in range(4))
+inserts = set("abcd"[:i] + "x" + "abcd"[i:] for i in range(5))
+deletes = set("abcd"[:i] + "abcd"[i + 1:] for i in range(4))
+swaps = set(["bacd", "acbd", "abdc"])
+assert set(edited) == subs | inserts | deletes | swaps
+(codes, lengths) = encode_strings(["", "a"] * 50)
+edited = decode_strings(*mutate_codes(codes, lengths, np.frombuffer(b"x", np.uint8), rng))
+assert set(edited) <= {"x", "xa", "ax", "", "a"}
+
+# negatives are never in the language, from either source
+n = compile_pattern("(ab|c)<d>* e")
+m = NFAMatcher(n)
+for fraction in (0.0, 0.5, 1.0):
+    s = NegativeSampler(n, 20, mutate_fraction=fraction)
+    texts = s.sample(3000, 1)
+    assert len(texts) == 3000 and not m.match_batch(texts).any()
+    assert max(len(t) for t in texts) <= 20 and set("".join(texts)) <= set("abcde")
+
+# with one mutation, every negative is one edit away from the language
+def edits(t, alphabet):
+    out = [t[:i] + c + t[i + 1:] for i in range(len(t)) for c in alphabet]
+    out += [t[:i] + c + t[i:] for i in range(len(t) + 1) for c in alphabet]
+    out += [t[:i] + t[i + 1:] for i in range(len(t))]
+    out += [t[:i] + t[i + 1] + t[i] + t[i + 2:] for i in range(len(t) - 1)]
+    return out
+
+for t in NegativeSampler(n, 20, mutate_fraction=1.0).sample(200, 2):
+    assert m.match_batch(edits(t, "abcde")).any(), t
+
+# a language with every string over its alphabet needs a wider one
+try:
+    NegativeSampler(compile_pattern("<(a|b)>* "), 10).sample(10, 0)
+    assert False, "found negatives of (a|b)*"
+except RuntimeError:
+    pass
+texts = NegativeSampler(compile_pattern("<(a|b)>* "), 10, alphabet="abc").sample(100, 0)
+assert all("c" in t for t in texts)
+
+# labels are right, and the ratio is what was asked for
+rng = random.Random(0)
+for i in range(10):
+    n = regex_nfa_convert.nfa_from_regex(regex.regex_mk_random(2, 2, 2, 1, 4, rng))
+    (codes, lengths, labels) = LabelledSampler(n, 60, negative_ratio=0.3).sample_codes(2000, i)
+    assert (LazyDFA(n).match_codes(codes, lengths) == labels).all()
+    assert labels.sum() == 1400
+
+(texts, labels) = LabelledSampler(compile_pattern("abc"), 10).sample(100, 0)
+assert [t == "abc" for t in texts] == labels.tolist()
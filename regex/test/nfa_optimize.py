@@ -0,0 +1,60 @@
+import random
+
+from regex import *
+from regex.regex import RegexASCII, RegexOr, RegexSequence, StarRegex
+from regex.nfa import EdgeType
+from regex.nfa_match import NFAMatcher
+from regex.nfa_minimize import nfa_equivalent
+from regex.nfa_optimize import eps_free, nfa_optimize, optimize_report
+from regex.pipeline import compile_nfas
+
+def compile(r):
+    return regex_nfa_convert.nfa_from_regex(r)
+
+def literal(s):
+    r = RegexASCII(s[0])
+    for c in s[1:]:
+        r = RegexSequence(r, RegexASCII(c))
+    return r
+
+# a literal run folds into one node per character, plus the end
+n = compile(literal("abcdefghijklmnop"))
+o = nfa_optimize(n)
+assert (n.numnodes, o.numnodes) == (32, 17)
+assert nfa_equivalent(o, n) and o.start_node.idx == 0
+assert (o.edges[1] > EdgeType._EPSILON_EDGE_VAL).all()
+
+# the empty string keeps its one epsilon edge, from start to end
+o = nfa_optimize(compile(StarRegex(RegexOr(literal("ab"), literal("c")))))
+(src, label, dest) = o.edges
+eps = label == EdgeType._EPSILON_EDGE_VAL
+assert eps.sum() == 1 and src[eps][0] == o.start_node.idx and dest[eps][0] == o.end_node.idx
+m = NFAMatcher(o)
+assert m.match("") and m.match("abcab") and not m.match("ac")
+
+# eps_free is over the nodes of the original NFA
+n = compile(RegexSequence(RegexASCII("a"), StarRegex(RegexASCII("b"))))
+(start, accepting, src, label, dest) = eps_free(n)
+assert start == n.start_node.idx and len(accepting) == n.numnodes
+assert accepting[n.end_node.idx] and not accepting[start]
+assert (label > EdgeType._EPSILON_EDGE_VAL).all()
+
+# the language never changes, and the NFA never grows
+rng = random.Random(0)
+regexes = [regex.regex_mk_random_sized(8, 1, 5, rng) for _ in range(100)]
+regexes += [regex.regex_mk_random(2, 1, 1, 1, 3, rng) for _ in range(50)]
+nfas = [compile(r) for r in regexes]
+report = optimize_report(nfas)
+for (r, n, (before, after)) in zip(regexes, nfas, report):
+    o = nfa_optimize(n)
+    assert nfa_equivalent(o, n), str(r)
+    assert before == n.numnodes and after == o.numnodes <= n.numnodes
+
+    texts = [r.generate_text(2, rng) for _ in range(10)]
+    assert NFAMatcher(o).match_batch(texts).all(), str(r)
+
+assert sum(a for (_, a) in report) < 0.5 * sum(b for (b, _) in report)
+
+# and the pipeline can hand out optimized NFAs
+for (r, o) in compile_nfas(regexes[:10], optimize=True):
+    assert nfa_equivalent(o, compile(r)) and o.numnodes < compile(r).numnodes
@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+
+from regex import *
+from regex.regex import RegexASCII, RegexSequence, StarRegex
+from regex.nfa import (NFA, adj_banded_from_nfas, adj_tensor_from_nfas, nfa_bandwidth,
+                       nfas_from_adj_tensor)
+from regex.nfa_match import NFAMatcher
+from regex.nfa_minimize import nfa_equivalent
+from regex.nfa_optimize import nfa_optimize
+from regex.nfa_order import bandwidth_report, nfa_relabel
+from regex.pipeline import compile_nfas
+
+def compile(r):
+    return regex_nfa_convert.nfa_from_regex(r)
+
+rng = random.Random(0)
+regexes = [regex.regex_mk_random_sized(8, 1, 5, rng) for _ in range(100)]
+regexes += [regex.regex_mk_random(2, 1, 1, 1, 3, rng) for _ in range(50)]
+nfas = [compile(r) for r in regexes]
+nfas += [nfa_optimize(n) for n in nfas[:50]]
+
+# relabeling keeps the language and the edges, and starts bfs at 0
+for n in nfas:
+    for order in ("bfs", "rcm"):
+        o = nfa_relabel(n, order)
+        assert nfa_equivalent(o, n) and (o.numnodes, o.numedges) == (n.numnodes, n.numedges)
+        assert sorted(o.edges[1].tolist()) == sorted(n.edges[1].tolist())
+    assert nfa_relabel(n, "bfs").start_node.idx == 0
+
+# the order only depends on the shape where there are no ties: a chain
+# built back to front comes out the same as one built front to back
+chain = NFA.from_edges(5, [4, 3, 2, 1], [97, 98, 99, 100], [3, 2, 1, 0], 4, 0)
+for order in ("bfs", "rcm"):
+    o = nfa_relabel(chain, order)
+    assert nfa_bandwidth(o) == 1
+    assert o.edges[1].tolist() == [97, 98, 99, 100]
+
+# a literal after a long star: the star's back edge spans the whole body in
+# construction order, but rcm keeps everything near the diagonal
+body = RegexASCII("a")
+for c in "bcdefghijklmnop":
+    body = RegexSequence(body, RegexASCII(c))
+n = compile(RegexSequence(StarRegex(body), RegexASCII("z")))
+assert nfa_bandwidth(n) > 20 and nfa_bandwidth(nfa_relabel(n, "rcm")) <= 3
+
+report = bandwidth_report(nfas)
+assert sum(r for (_, _, r) in report) < 0.5 * sum(c for (c, _, _) in report)
+
+# banded round trip
+relabeled = [nfa_relabel(n, "rcm") for n in nfas]
+num_nodes = max(n.numnodes for n in relabeled)
+bw = max(nfa_bandwidth(n) for n in relabeled)
+band = adj_banded_from_nfas(relabeled, num_nodes, bw)
+assert band.shape == (len(nfas), num_nodes, 2 * bw + 1)
+dense = adj_tensor_from_nfas(relabeled, num_nodes)
+for (b, d) in zip(nfas_from_adj_tensor(band, format="banded"),
+                  nfas_from_adj_tensor(dense)):
+    assert (b._edges == d._edges).all()
+    assert (b._start_idx, b._end_idx) == (d._start_idx, d._end_idx)
+
+out = np.full(band.shape, 7, dtype=np.uint8)
+assert (adj_banded_from_nfas(relabeled, num_nodes, bw, out=out) == band).all()
+
+try:
+    adj_banded_from_nfas(relabeled, num_nodes, bw - 1)
+    assert False, "expected a RuntimeError"
+except RuntimeError:
+    pass
+
+# and the pipeline can hand out relabeled NFAs
+for (r, o) in compile_nfas(regexes[:10], order="rcm"):
+    assert nfa_equivalent(o, compile(r))
+    texts = [r.generate_text(2, rng) for _ in range(5)]
+    assert NFAMatcher(o).match_batch(texts).all()
@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+
+from regex import *
+from regex.nfa_match import NFAMatcher, encode_strings
+from regex.nfa_optimize import nfa_optimize
+from regex.nfa_sample import NFASampler, decode_strings
+from regex.regex_parse import parse_regex
+
+def compile(pattern):
+    return regex_nfa_convert.nfa_from_regex(parse_regex(pattern))
+
+# every sample matches, and none is longer than max_len
+rng = random.Random(0)
+for i in range(60):
+    n = regex_nfa_convert.nfa_from_regex(regex.regex_mk_random(2, 2, 2, 1, 4, rng))
+    for (nfa, max_len) in [(n, 40), (nfa_optimize(n), 200)]:
+        (codes, lengths) = NFASampler(nfa, max_len).sample_codes(500, i)
+        assert lengths.max() <= max_len and codes.shape[1] == lengths.max()
+        assert NFAMatcher(n).match_codes(codes, lengths).all()
+
+# the cap is met by steering, not by cutting strings short
+texts = NFASampler(compile("<ab>* c"), max_len=5).sample(2000, 0)
+assert set(texts) == {"c", "abc", "ababc"}
+
+texts = NFASampler(compile("<a>* "), max_len=0).sample(10, 0)
+assert texts == [""] * 10
+
+try:
+    NFASampler(compile("abcdef"), max_len=3)
+    assert False, "sampled a regex with no short enough string"
+except RuntimeError:
+    pass
+
+# choices are uniform, and stop_weight makes strings shorter or longer
+texts = NFASampler(compile("(a|b)")).sample(10000, 1)
+assert 4500 < texts.count("a") < 5500 and set(texts) == {"a", "b"}
+short = NFASampler(compile("<x>* "), 1000, stop_weight=4.0).sample_codes(10000, 0)[1]
+long = NFASampler(compile("<x>* "), 1000, stop_weight=0.25).sample_codes(10000, 0)[1]
+assert abs(short.mean() - 0.25) < 0.05 and abs(long.mean() - 4.0) < 0.3
+
+# the same seed gives the same strings
+s = NFASampler(compile("(a|b<c>* )d"))
+assert s.sample(100, 7) == s.sample(100, np.random.default_rng(7))
+
+strings = ["", "abc", "x" * 30, "(a|b)"]
+assert decode_strings(*encode_strings(strings)) == strings
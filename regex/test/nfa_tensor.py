@@ -0,0 +1,83 @@
+import random
+
+import numpy as np
+
+from regex import *
+from regex.nfa import EdgeType, adj_tensor_from_nfas
+from regex.nfa_dfa import LazyDFA
+from regex.nfa_match import NUM_SYMBOLS, encode_strings
+from regex.nfa_tensor import epsilon_closures, run_nfa_tensors, run_nfas
+from regex.test.util import gen_text
+
+random.seed(0)
+
+NUM_NODES = 80
+
+regexes = []
+while len(regexes) < 60:
+    r = regex.regex_mk_random(2, 1, 1, 1, 3)
+    if regex_nfa_convert.nfa_from_regex(r).numnodes <= NUM_NODES:
+        regexes.append(r)
+nfas = [regex_nfa_convert.nfa_from_regex(r) for r in regexes]
+
+# every NFA against strings of its own and random ones
+for _ in range(5):
+    strings = []
+    for r in regexes:
+        alphabet = sorted(set(str(r)) - set("()|<>* ")) + ["z"]
+        strings.append(gen_text(r) if random.random() < 0.5 else
+                       "".join(random.choice(alphabet) for _ in range(random.randint(0, 10))))
+    expected = [LazyDFA(n).match(s) for (n, s) in zip(nfas, strings)]
+    assert list(run_nfas(nfas, strings, NUM_NODES)) == expected
+
+    # one-hot label probabilities give the same answers, as scores
+    adj = adj_tensor_from_nfas(nfas, NUM_NODES)
+    soft = np.eye(NUM_SYMBOLS, dtype=np.float64)[adj]
+    start = [n.start_node.idx for n in nfas]
+    end = [n.end_node.idx for n in nfas]
+    accept = run_nfa_tensors(soft, start, end, *encode_strings(strings))
+    assert accept.dtype == np.float64 and list(accept == 1) == expected
+    assert set(accept.tolist()) <= {0.0, 1.0}
+
+# closure of a hard tensor is reachability over epsilon edges
+closure = epsilon_closures(adj)
+for (n, c) in zip(nfas[:10], closure):
+    for i in range(n.numnodes):
+        reach = {i}
+        todo = [i]
+        while todo:
+            j = todo.pop()
+            for (s, l, d) in zip(*n.edges):
+                if s == j and l == EdgeType._EPSILON_EDGE_VAL and d not in reach:
+                    reach.add(d)
+                    todo.append(d)
+        assert set(np.flatnonzero(c[i])) == reach
+
+# soft scores move with the probability of an edge
+n = regex_nfa_convert.nfa_from_regex(regex.RegexASCII("a"))
+adj = np.eye(NUM_SYMBOLS)[adj_tensor_from_nfas([n], 4)]
+(src, label, dest) = n.edges
+(i, j) = (src[label == ord("a")][0], dest[label == ord("a")][0])
+for p in (0.0, 0.3, 1.0):
+    adj[0, i, j] = 0
+    adj[0, i, j, ord("a")] = p
+    adj[0, i, j, EdgeType._NONE_EDGE_VAL] = 1 - p
+    score = run_nfa_tensors(adj, [n.start_node.idx], [n.end_node.idx], *encode_strings(["a"]))
+    assert np.isclose(score[0], p)
+
+# unknown start or end accepts nothing
+assert not run_nfa_tensors(adj_tensor_from_nfas(nfas[:2], NUM_NODES), [-1, nfas[1].start_node.idx],
+                           [nfas[0].end_node.idx, -1], *encode_strings(["", ""])).any()
+
+# codes that aren't symbols (non ascii chars, \x00, \x01) are a dead step,
+# as in the matchers, rather than a match of the None or epsilon label
+n = regex_nfa_convert.nfa_from_regex(regex.RegexSequence(regex.RegexASCII("a"),
+                                                         regex.RegexASCII("b")))
+strings = ["éé", "aéb", "a\x00", "a\x01b", "\x01ab", "ab"]
+expected = [LazyDFA(n).match(s) for s in strings]
+assert expected == [False] * 5 + [True]
+assert list(run_nfas([n] * len(strings), strings, 8)) == expected
+soft = np.eye(NUM_SYMBOLS)[adj_tensor_from_nfas([n] * len(strings), 8)]
+accept = run_nfa_tensors(soft, [n.start_node.idx] * len(strings), [n.end_node.idx] * len(strings),
+                         *encode_strings(strings))
+assert list(accept == 1) == expected
@@ -0,0 +1,62 @@
+import itertools
+import random
+
+from regex import *
+from regex.nfa_minimize import nfa_equivalent
+from regex.pipeline import *
+
+def take(batches, n):
+    try:
+        return [(b.adj.copy(), b.regexes) for b in itertools.islice(batches, n)]
+    finally:
+        batches.close()
+
+# the same seed gives the same batches, with or without worker processes
+a = take(training_batches(16, 120, seed=3, shuffle_size=50), 5)
+b = take(training_batches(16, 120, seed=3, shuffle_size=50, num_workers=2), 5)
+assert [r for (_, r) in a] == [r for (_, r) in b]
+assert all((x == y).all() for ((x, _), (y, _)) in zip(a, b))
+assert all(adj.shape == (16, 120, 120) for (adj, _) in a)
+
+# every sample comes out of the shuffle buffer exactly once
+items = list(shuffle_buffer(range(1000), 64, random.Random(0)))
+assert sorted(items) == list(range(1000)) and items != list(range(1000))
+
+assert [len(c) for c in batch(range(10), 4)] == [4, 4, 2]
+assert [len(c) for c in batch(range(10), 4, drop_last=True)] == [4, 4]
+
+# errors in a background stage reach the consumer
+def broken():
+    yield 1
+    raise ValueError("broken stage")
+
+try:
+    list(background(broken()))
+    assert False, "error was swallowed"
+except ValueError:
+    pass
+
+# a consumer that stops early closes the stage behind the background thread
+closed = []
+def endless():
+    try:
+        while True:
+            yield 1
+    finally:
+        closed.append(True)
+
+stage = background(endless(), maxsize=2)
+next(stage)
+stage.close()
+assert closed == [True]
+
+# the NFAs in a batch are the ones compiled from its regexes
+rng = random.Random(1)
+samples = prune_nfas(compile_nfas(sample_regexes(rng, count=8)), 120)
+(chunk, ) = list(batch(samples, 8))
+(encoded, ) = list(encode_batches([chunk], 120))
+for (i, (r, n)) in enumerate(chunk):
+    assert encoded.regexes[i] == str(r)
+    decoded = nfa.nfa_from_adjacency_matrix(encoded.adj[i], encoded.start_nodes[i],
+                                            encoded.end_nodes[i])
+    assert nfa_equivalent(decoded, n)
@@ -1,15 +1,48 @@
-from recurrent import *
+from regex import *
+from regex.nfa_minimize import nfa_equivalent
 
 r = regex.regex_mk_random(2, 0, 1, 8, 8)
 n = regex_nfa_convert.nfa_from_regex(r)
 
 adj = nfa.adj_matrix_from_nfa(n, 200)
 
+batch = nfa.adj_tensor_from_nfas([n, n], 200)
+assert batch[1].tolist() == adj
+(b, src, dest, label) = nfa.adj_sparse_from_nfas([n], 200)
+assert sorted(zip(src.tolist(), dest.tolist(), label.tolist())) == \
+    sorted((i, j, adj[i][j]) for i in range(200) for j in range(200) if adj[i][j] != 0)
+
 n_new = nfa.nfa_from_adjacency_matrix(adj)
+assert (n_new.start_node, n_new.end_node) == (n.start_node, n.end_node)
 n_new = nfa.nfa_prune(n_new)
 
+# starting or ending under a star, the start and end are still found
+(a, b) = (regex.RegexASCII("a"), regex.RegexASCII("b"))
+for r_star in [regex.RegexSequence(regex.StarRegex(a), b),
+               regex.RegexSequence(b, regex.StarRegex(a)),
+               regex.RegexSequence(regex.StarRegex(regex.StarRegex(a)), regex.StarRegex(b))]:
+    n_star = regex_nfa_convert.nfa_from_regex(r_star)
+    n_star_new = nfa.nfa_from_adjacency_matrix(nfa.adj_matrix_from_nfa(n_star, 20))
+    assert (n_star_new.start_node, n_star_new.end_node) == (n_star.start_node, n_star.end_node)
+
+# a single star is ambiguous, every node is on the loop; pass them
+n_star = regex_nfa_convert.nfa_from_regex(regex.StarRegex(a))
+adj_star = nfa.adj_matrix_from_nfa(n_star, 20)
+n_star_new = nfa.nfa_from_adjacency_matrix(adj_star)
+assert (n_star_new.start_node, n_star_new.end_node) == (None, None)
+n_star_new = nfa.nfa_from_adjacency_matrix(adj_star, n_star.start_node.idx, n_star.end_node.idx)
+assert (n_star_new.start_node, n_star_new.end_node) == (n_star.start_node, n_star.end_node)
+n_star_new = nfa.nfas_from_adj_tensor(nfa.adj_tensor_from_nfas([n, n_star], 200),
+                                     starts=[None, n_star.start_node.idx],
+                                     ends=[None, n_star.end_node.idx])[1]
+assert (n_star_new.start_node, n_star_new.end_node) == (n_star.start_node, n_star.end_node)
+
+assert nfa_equivalent(nfa.nfas_from_adj_tensor(batch)[1], n)
+assert nfa_equivalent(nfa.nfas_from_adj_tensor(nfa.adj_sparse_from_nfas([n, n], 200, "csr"),
+                                               2, 200, "csr")[1], n)
+
 print("old:\n%s" % n)
 print("new:\n%s" % n_new)
 
 
-assert n == n_new, "NFA recovered from adj matrix not equal!"
\ No newline at end of file
+assert nfa_equivalent(n, n_new), "NFA recovered from adj matrix not equal!"
\ No newline at end of file
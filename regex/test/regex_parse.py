@@ -0,0 +1,83 @@
+import random
+import sys
+
+from regex import *
+from regex.regex import RegexASCII, RegexOr, RegexSequence, StarRegex
+from regex.nfa_match import NFAMatcher
+from regex.regex_parse import PatternCache, RegexParseError, compile_pattern, parse_regex
+
+def literal(s):
+    r = RegexASCII(s[0])
+    for c in s[1:]:
+        r = RegexSequence(r, RegexASCII(c))
+    return r
+
+def edges(n):
+    return sorted(map(tuple, n._edges.tolist()))
+
+# metacharacters are escaped, so every regex prints unambiguously
+r = RegexSequence(literal("a|*"), StarRegex(RegexOr(RegexASCII("<"), RegexASCII(">"))))
+assert str(r) == "a\\|\\*<(\\<|\\>)>* "
+assert parse_regex(str(r)) is r
+
+# random regexes round trip: the same text, and the same NFA up to edge order
+rng = random.Random(0)
+regexes = [regex.regex_mk_random(2, 2, 2, 1, 4, rng) for _ in range(200)]
+regexes += [regex.regex_mk_random_sized(10, 1, 5, rng) for _ in range(200)]
+for r in regexes:
+    p = parse_regex(str(r))
+    assert str(p) == str(r)
+    (a, b) = (regex_nfa_convert.nfa_from_regex(r), regex_nfa_convert.nfa_from_regex(p))
+    assert a.numnodes == b.numnodes and edges(a) == edges(b), str(r)
+
+# sequences come out left nested
+assert parse_regex("abc") is literal("abc")
+assert parse_regex("(a|b|c)") is RegexOr(RegexOr(RegexASCII("a"), RegexASCII("b")), RegexASCII("c"))
+assert parse_regex("<a>*b") is RegexSequence(StarRegex(RegexASCII("a")), RegexASCII("b"))
+
+# posix
+assert parse_regex("ab|c", "posix") is RegexOr(literal("ab"), RegexASCII("c"))
+assert parse_regex("a(b|c)*", "posix") is \
+    RegexSequence(RegexASCII("a"), StarRegex(RegexOr(RegexASCII("b"), RegexASCII("c"))))
+assert parse_regex("x+", "posix") is RegexSequence(RegexASCII("x"), StarRegex(RegexASCII("x")))
+assert parse_regex("<\\*>", "posix") is literal("<*>")
+m = NFAMatcher(compile_pattern("[a-c_]+(x|yz)*", "posix"))
+assert m.match("a_cb") and m.match("bxyzx") and not m.match("") and not m.match("dx")
+
+for (pattern, syntax, pos) in [("a|", "posix", 2), ("(ab", "posix", 0), ("ab)", "posix", 2),
+                               ("a?", "posix", 1), ("*a", "posix", 0), ("[^a]", "posix", 1),
+                               ("[ab", "posix", 0), ("ab\\", "repo", 2), ("<a>", "repo", 3),
+                               ("a*", "repo", 1), ("(a|b>* ", "repo", 4), ("()", "repo", 1),
+                               ("a\xe9", "repo", 1), ("a b", "posix", 1),
+                               ("a\\ b", "posix", 2), ("a\x01", "posix", 1),
+                               ("a <b>* ", "repo", 1), ("[a\x00]", "posix", 0),
+                               ("\t", "repo", 0)]:
+    try:
+        parse_regex(pattern, syntax)
+        assert False, "%r parsed" % (pattern, )
+    except RegexParseError as e:
+        assert (e.pattern, e.pos) == (pattern, pos), str(e)
+
+# characters without an edge label are parse errors, not failed asserts
+try:
+    compile_pattern("a b", "posix", cache=None)
+    assert False
+except RegexParseError as e:
+    assert "invalid character ' '" in str(e)
+
+# nesting is not limited by the recursion limit
+depth = 5 * sys.getrecursionlimit()
+r = parse_regex("(" * depth + "a" + ")" * depth, "posix")
+assert r is RegexASCII("a")
+r = parse_regex("<" * depth + "a" + ">* " * depth)
+assert r.size == depth + 1
+
+# the cache returns the same NFA until it is evicted
+cache = PatternCache(2)
+a = compile_pattern("(ab|c)", cache=cache)
+assert compile_pattern("(ab|c)", cache=cache) is a
+assert compile_pattern("(ab|c)", "posix", cache=cache) is not a
+compile_pattern("xy", cache=cache)
+assert len(cache) == 2 and compile_pattern("(ab|c)", cache=cache) is not a
+assert (cache.hits, cache.misses) == (1, 4)
+assert compile_pattern("(ab|c)", cache=None) == a
@@ -0,0 +1,30 @@
+import random
+
+from regex import *
+from regex.regex import RegexASCII, RegexOr, StarRegex
+
+# single character chunks, so every Sequence above a leaf is an operator
+def num_operators(r):
+    if isinstance(r, RegexASCII):
+        return 0
+    elif isinstance(r, StarRegex):
+        assert not isinstance(r.r, StarRegex)
+        return 1 + num_operators(r.r)
+    return 1 + num_operators(r.r1) + num_operators(r.r2)
+
+random.seed(0)
+for size in [0, 1, 2, 7, 40]:
+    for _ in range(50):
+        assert num_operators(regex.regex_mk_random_sized(size, 1, 1)) == size
+
+# one shape out of the 3 of size 1 is a star
+stars = sum(isinstance(regex.regex_mk_random_sized(1, 1, 1), StarRegex) for _ in range(3000))
+assert 850 < stars < 1150, stars
+
+# the same seed gives the same regex
+assert str(regex.regex_mk_random_sized(30, 2, 5, random.Random(7))) == \
+    str(regex.regex_mk_random_sized(30, 2, 5, random.Random(7)))
+
+# regex_prune keeps ors as ors
+r = regex.regex_prune(RegexOr(RegexASCII("a"), StarRegex(StarRegex(RegexASCII("b")))))
+assert isinstance(r, RegexOr) and isinstance(r.r2, StarRegex) and isinstance(r.r2.r, RegexASCII)
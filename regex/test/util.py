@@ -0,0 +1,27 @@
+import random
+import re as pyre
+
+from regex import *
+
+# helpers shared by the tests, kept out of the test modules so importing
+# them doesn't run a test
+
+def to_python_re(r):
+    if isinstance(r, regex.RegexASCII):
+        return pyre.escape(r.char)
+    elif isinstance(r, regex.RegexOr):
+        return "(?:%s|%s)" % (to_python_re(r.r1), to_python_re(r.r2))
+    elif isinstance(r, regex.RegexSequence):
+        return "%s%s" % (to_python_re(r.r1), to_python_re(r.r2))
+    elif isinstance(r, regex.StarRegex):
+        return "(?:%s)*" % (to_python_re(r.r), )
+
+def gen_text(r):
+    if isinstance(r, regex.RegexASCII):
+        return r.char
+    elif isinstance(r, regex.RegexOr):
+        return gen_text(random.choice([r.r1, r.r2]))
+    elif isinstance(r, regex.RegexSequence):
+        return gen_text(r.r1) + gen_text(r.r2)
+    elif isinstance(r, regex.StarRegex):
+        return "".join(gen_text(r.r) for _ in range(random.randint(0, 3)))